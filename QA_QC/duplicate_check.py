@@ -0,0 +1,382 @@
+"""
+Hash-based duplicate detection for consultant survey deliverables.
+
+Every record gets a 128-bit fingerprint (two 64-bit Polars hashes with different
+seeds) over all fields except the unique identifier. Records sharing a
+fingerprint are reported as one duplicate group (group id, member IDs, count),
+so no multi-column sort of the full table is needed. Only the fingerprints and
+IDs are kept between chunks, so sheets larger than memory can be checked chunk
+by chunk.
+
+Near-duplicates (records that differ only by a timestamp or a few answers) are
+found by blocking: only records sharing cheap keys such as route, direction,
+survey date and boarding/alighting stop are compared, with a vectorized Hamming
+or Jaccard similarity over their answers. near_duplicate_report collects only
+the blocking keys of a whole sheet and reads the records of shared blocks a
+batch at a time.
+"""
+
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+ID_COLUMN = "ID"
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Two seeds -> two independent 64-bit hashes = 128-bit row fingerprint
+FINGERPRINT_SEEDS = (0x5EED_0001, 0x5EED_0002)
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+
+# Record pairs compared per vectorized batch
+PAIR_BATCH_SIZE = 50_000
+
+SIMILARITY_METRICS = {"hamming", "jaccard"}
+
+
+def row_fingerprints(
+    df: pl.DataFrame,
+    check_cols: list[str],
+    id_col: str = ID_COLUMN,
+) -> pl.DataFrame:
+    """Compute the 128-bit fingerprint of each record over check_cols.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Survey records
+    check_cols : list[str]
+        Columns that define a duplicate (typically all except the ID)
+    id_col : str
+        Unique identifier column carried along with the fingerprint
+
+    Returns:
+    --------
+    pl.DataFrame
+        Columns id_col, fp_hi, fp_lo (UInt64)
+    """
+    row = pl.struct(check_cols)
+    return df.select(
+        pl.col(id_col),
+        row.hash(seed=FINGERPRINT_SEEDS[0]).alias("fp_hi"),
+        row.hash(seed=FINGERPRINT_SEEDS[1]).alias("fp_lo"),
+    )
+
+
+def iter_chunks(lf: pl.LazyFrame, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pl.DataFrame]:
+    """Collect a LazyFrame (e.g. a Parquet scan) in slices of chunk_size rows."""
+    n_rows = lf.select(pl.len()).collect().item()
+    for offset in range(0, n_rows, chunk_size):
+        yield lf.slice(offset, chunk_size).collect()
+
+
+def find_duplicate_groups(
+    chunks: Iterable[pl.DataFrame],
+    id_col: str = ID_COLUMN,
+    exclude_cols: list[str] | None = None,
+) -> pl.DataFrame:
+    """Find groups of records that are identical on all fields except the ID.
+
+    Parameters:
+    -----------
+    chunks : Iterable[pl.DataFrame]
+        Survey records, in one or more chunks with the same columns
+    id_col : str
+        Unique identifier column (excluded from the comparison)
+    exclude_cols : list[str] | None
+        Additional columns to ignore in the comparison
+
+    Returns:
+    --------
+    pl.DataFrame
+        One row per duplicate group with columns group_id, count, member_ids
+        (comma-separated IDs), first_row; ordered by first occurrence
+    """
+    excluded = {id_col, *(exclude_cols or [])}
+    columns = None
+    fingerprints = []
+    for chunk in chunks:
+        if id_col not in chunk.columns:
+            raise ValueError(f"Column '{id_col}' not found in the worksheet.")
+        if columns is None:
+            columns = chunk.columns
+        elif chunk.columns != columns:
+            raise ValueError("All chunks must have the same columns.")
+        check_cols = [col for col in chunk.columns if col not in excluded]
+        fingerprints.append(row_fingerprints(chunk, check_cols, id_col))
+
+    if not fingerprints:
+        return pl.DataFrame(
+            schema={"group_id": pl.UInt32, "count": pl.UInt32, "member_ids": pl.Utf8, "first_row": pl.UInt32}
+        )
+
+    return (
+        pl.concat(fingerprints)
+        .with_row_index("row")
+        .group_by("fp_hi", "fp_lo")
+        .agg(
+            pl.len().alias("count"),
+            pl.col(id_col).cast(pl.Utf8).str.join(", ").alias("member_ids"),
+            pl.col("row").min().alias("first_row"),
+        )
+        .filter(pl.col("count") > 1)
+        .sort("first_row")
+        .with_row_index("group_id", offset=1)
+        .select("group_id", "count", "member_ids", "first_row")
+    )
+
+
+def duplicate_report(
+    parquet_or_lf: str | Path | pl.LazyFrame,
+    id_col: str = ID_COLUMN,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> pl.DataFrame:
+    """Run find_duplicate_groups over a Parquet file or LazyFrame in chunks.
+
+    Parameters:
+    -----------
+    parquet_or_lf : str | Path | pl.LazyFrame
+        Parquet file (e.g. the cached copy of a sheet) or a LazyFrame over the records
+    id_col : str
+        Unique identifier column
+    chunk_size : int
+        Number of records fingerprinted per chunk
+
+    Returns:
+    --------
+    pl.DataFrame
+        Duplicate group report (see find_duplicate_groups)
+    """
+    lf = parquet_or_lf if isinstance(parquet_or_lf, pl.LazyFrame) else pl.scan_parquet(parquet_or_lf)
+    return find_duplicate_groups(iter_chunks(lf, chunk_size), id_col=id_col)
+
+
+def encode_answers(df: pl.DataFrame, columns: list[str]) -> np.ndarray:
+    """Encode answers as integer codes per column (0 = missing answer).
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Survey records
+    columns : list[str]
+        Answer columns to encode
+
+    Returns:
+    --------
+    np.ndarray
+        Array of shape (records, columns); equal answers get equal codes within a column
+    """
+    return (
+        df.select(pl.col(col).rank("dense").fill_null(0).cast(pl.UInt32) for col in columns)
+        .to_numpy()
+    )
+
+
+def block_pairs(df: pl.DataFrame, block_keys: list[str | pl.Expr]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the row positions of every record pair that shares all blocking keys.
+
+    Records with a missing blocking key are not paired.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Survey records
+    block_keys : list[str | pl.Expr]
+        Blocking keys: column names or Polars expressions (e.g. the date part of a timestamp)
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray]
+        Row positions (first, second) of each pair, first < second
+    """
+    key_exprs = [
+        (pl.col(key) if isinstance(key, str) else key).alias(f"_block_{i}")
+        for i, key in enumerate(block_keys)
+    ]
+    key_names = [f"_block_{i}" for i in range(len(block_keys))]
+    keyed = df.select(pl.int_range(pl.len(), dtype=pl.UInt32).alias("_row"), *key_exprs)
+    pairs = (
+        keyed.join(keyed, on=key_names, suffix="_other")
+        .filter(pl.col("_row") < pl.col("_row_other"))
+        .sort("_row", "_row_other")
+    )
+    return pairs["_row"].to_numpy(), pairs["_row_other"].to_numpy()
+
+
+def pair_similarity(left: np.ndarray, right: np.ndarray, metric: str = "hamming") -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized similarity of paired answer rows.
+
+    Parameters:
+    -----------
+    left, right : np.ndarray
+        Encoded answers (see encode_answers) of the two records of each pair
+    metric : str
+        "hamming": share of columns with equal answers (missing == missing);
+        "jaccard": equal answered columns / columns answered by either record
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray]
+        Similarity per pair, and the boolean (pairs, columns) array of equal answers
+    """
+    equal = left == right
+    if metric == "hamming":
+        return equal.mean(axis=1), equal
+    answered_left = left > 0
+    answered_right = right > 0
+    intersection = (equal & answered_left).sum(axis=1)
+    union = answered_left.sum(axis=1) + answered_right.sum(axis=1) - intersection
+    similarity = np.divide(intersection, union, out=np.ones(len(union)), where=union > 0)
+    return similarity, equal
+
+
+def find_near_duplicates(
+    df: pl.DataFrame,
+    block_keys: list[str | pl.Expr],
+    id_col: str = ID_COLUMN,
+    exclude_cols: list[str] | None = None,
+    threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    metric: str = "hamming",
+) -> pl.DataFrame:
+    """Flag record pairs within the same block whose answers are nearly identical.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Survey records
+    block_keys : list[str | pl.Expr]
+        Blocking keys, e.g. route, direction, survey date, boarding and alighting stop
+    id_col : str
+        Unique identifier column
+    exclude_cols : list[str] | None
+        Columns left out of the comparison (e.g. timestamps, weights)
+    threshold : float
+        Minimum similarity (0-1) for a pair to be flagged
+    metric : str
+        "hamming" or "jaccard" (see pair_similarity)
+
+    Returns:
+    --------
+    pl.DataFrame
+        One row per flagged pair with columns id_a, id_b, similarity, n_differences,
+        differing_columns; most similar pairs first
+    """
+    if metric not in SIMILARITY_METRICS:
+        raise ValueError(f"Unknown similarity metric '{metric}', expected one of {SIMILARITY_METRICS}")
+    if id_col not in df.columns:
+        raise ValueError(f"Column '{id_col}' not found in the worksheet.")
+
+    excluded = {id_col, *(exclude_cols or []), *(key for key in block_keys if isinstance(key, str))}
+    compare_cols = [col for col in df.columns if col not in excluded]
+    if not compare_cols:
+        raise ValueError("No columns left to compare after excluding the ID and blocking keys.")
+
+    codes = encode_answers(df, compare_cols)
+    first, second = block_pairs(df, block_keys)
+    compare_names = np.array(compare_cols)
+
+    flagged = {"row_a": [], "row_b": [], "similarity": [], "n_differences": [], "differing_columns": []}
+    for start in range(0, len(first), PAIR_BATCH_SIZE):
+        rows_a = first[start : start + PAIR_BATCH_SIZE]
+        rows_b = second[start : start + PAIR_BATCH_SIZE]
+        similarity, equal = pair_similarity(codes[rows_a], codes[rows_b], metric)
+        keep = similarity >= threshold
+        if not keep.any():
+            continue
+        differences = ~equal[keep]
+        flagged["row_a"].append(rows_a[keep])
+        flagged["row_b"].append(rows_b[keep])
+        flagged["similarity"].append(similarity[keep])
+        flagged["n_differences"].append(differences.sum(axis=1))
+        flagged["differing_columns"].extend(", ".join(compare_names[diff]) for diff in differences)
+
+    if not flagged["row_a"]:
+        return pl.DataFrame(
+            schema={
+                "id_a": df.schema[id_col],
+                "id_b": df.schema[id_col],
+                "similarity": pl.Float64,
+                "n_differences": pl.Int64,
+                "differing_columns": pl.Utf8,
+            }
+        )
+
+    ids = df[id_col]
+    return (
+        pl.DataFrame(
+            {
+                "id_a": ids.gather(np.concatenate(flagged["row_a"])),
+                "id_b": ids.gather(np.concatenate(flagged["row_b"])),
+                "similarity": np.concatenate(flagged["similarity"]).round(4),
+                "n_differences": np.concatenate(flagged["n_differences"]).astype(np.int64),
+                "differing_columns": flagged["differing_columns"],
+            }
+        )
+        .sort("similarity", descending=True, maintain_order=True)
+    )
+
+
+def near_duplicate_report(
+    parquet_or_lf: str | Path | pl.LazyFrame,
+    block_keys: list[str | pl.Expr],
+    id_col: str = ID_COLUMN,
+    exclude_cols: list[str] | None = None,
+    threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    metric: str = "hamming",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> pl.DataFrame:
+    """Run find_near_duplicates over a Parquet file or LazyFrame, a batch of blocks at a time.
+
+    Only the blocking keys of the whole sheet are collected. Records in blocks of
+    one can have no near-duplicate and are never read in full; the other blocks
+    are grouped into batches of about chunk_size records (a larger block is a
+    batch of its own), and each batch is collected and compared separately.
+
+    Parameters:
+    -----------
+    parquet_or_lf : str | Path | pl.LazyFrame
+        Parquet file (e.g. the cached copy of a sheet) or a LazyFrame over the records
+    block_keys, id_col, exclude_cols, threshold, metric :
+        See find_near_duplicates
+    chunk_size : int
+        Approximate number of records collected per batch
+
+    Returns:
+    --------
+    pl.DataFrame
+        Near-duplicate pairs (see find_near_duplicates)
+    """
+    lf = parquet_or_lf if isinstance(parquet_or_lf, pl.LazyFrame) else pl.scan_parquet(parquet_or_lf)
+    key_names = [f"_block_{i}" for i in range(len(block_keys))]
+    keys = (
+        lf.select(
+            pl.int_range(pl.len(), dtype=pl.UInt32).alias("_row"),
+            *((pl.col(key) if isinstance(key, str) else key).alias(name) for key, name in zip(block_keys, key_names)),
+        )
+        .drop_nulls(key_names)
+        .collect()
+    )
+
+    # batch number per record of every block with at least two records
+    blocks = (
+        keys.group_by(key_names)
+        .agg(pl.col("_row"))
+        .filter(pl.col("_row").list.len() > 1)
+        .sort(pl.col("_row").list.first())
+        .with_columns((pl.col("_row").list.len().cum_sum() // chunk_size).alias("_batch"))
+    )
+    batches = blocks.explode("_row").group_by("_batch", maintain_order=True).agg("_row")
+
+    results = []
+    for rows in batches["_row"]:
+        batch = lf.with_row_index("_row").filter(pl.col("_row").is_in(rows.implode())).drop("_row").collect()
+        results.append(
+            find_near_duplicates(batch, block_keys, id_col, exclude_cols, threshold, metric)
+        )
+    if not results:
+        # no block with two records: run on an empty frame for the validation and schema
+        return find_near_duplicates(lf.head(0).collect(), block_keys, id_col, exclude_cols, threshold, metric)
+    return pl.concat(results).sort("similarity", descending=True, maintain_order=True)
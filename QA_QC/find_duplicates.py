@@ -4,12 +4,30 @@ Purpose:
 This script is intended for quality control (QC) of consultant survey deliverables.
 It identifies duplicate records in the survey data based on all fields except the unique identifier (ID).
 
+Each record is fingerprinted (128-bit hash of all fields except ID) in chunks read
+from the Parquet cache of the sheet, so large deliverables are checked without a
+full sort and without holding the whole sheet in memory.
+
+Near-duplicate mode additionally flags pairs of records that share the same route,
+direction, survey date and boarding/alighting stops and whose answers are at least
+`near_duplicate_threshold` similar (e.g. double entries differing only by a timestamp).
+
 Outputs:
 - Total number of duplicate rows found, excluding ID.
-- Excel export of duplicate records when duplicates are found.
+- Excel export of the duplicate groups (group id, member IDs, count) when duplicates are found.
+- Excel export of near-duplicate pairs (IDs, similarity, differing columns) when near-duplicate mode is on.
 """
 
-import pandas as pd
+import sys
+from pathlib import Path
+
+import polars as pl
+
+# Shared Excel cache lives with the preprocessing scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "make-uniform" / "production" / "preprocess"))
+
+from duplicate_check import duplicate_report, near_duplicate_report  # noqa: E402
+from excel_cache import scan_excel_sheet  # noqa: E402
 
 # File path
 file_path = r"E:\Box\Modeling and Surveys\Surveys\Transit Passenger Surveys\Ongoing TPS\Individual Operator Efforts\AC Transit 2025 (OD Survey)\AC_Transit_MTC_ETC_Shared_Folder\Survey Databases\Final\od_20260318_ac-transit_weighted-secondary-weekend 1.xlsx"
@@ -17,38 +35,70 @@ file_path = r"E:\Box\Modeling and Surveys\Surveys\Transit Passenger Surveys\Ongo
 # Sheet name
 sheet_name = "OD_RESULTS"
 
-# Read Excel file
-df = pd.read_excel(file_path, sheet_name=sheet_name)
+# Records fingerprinted per chunk
+chunk_size = 100_000
+
+# Near-duplicate mode: records are only compared within blocks sharing these keys
+check_near_duplicates = True
+near_duplicate_block_keys = [
+    "ROUTE_DIRECTION",
+    pl.col("DATE_COMPLETED").cast(pl.Utf8).str.slice(0, 10),  # survey date without the time
+    "STOP_ON_CLNTID",
+    "STOP_OFF_CLNTID",
+]
+near_duplicate_exclude_cols = ["DATE_COMPLETED", "TIME_ON"]
+near_duplicate_threshold = 0.95
+near_duplicate_metric = "hamming"  # or "jaccard" (ignores unanswered questions)
+
+# Scan the sheet through the Parquet cache (only re-parsed when the workbook changes)
+lf = scan_excel_sheet(file_path, sheet_name=sheet_name)
 
 # Report row count
-num_rows = len(df)
+num_rows = lf.select(pl.len()).collect().item()
 print(f"Rows read from {sheet_name}: {num_rows:,}")
 
 # Verify ID column exists
-if "ID" not in df.columns:
+if "ID" not in lf.collect_schema().names():
     raise ValueError("Column 'ID' not found in the worksheet.")
 
-# Columns to use for duplicate check (everything except ID)
-check_cols = [col for col in df.columns if col != "ID"]
-
-# Find duplicate rows based on all columns except ID
-duplicate_mask = df.duplicated(subset=check_cols, keep=False)
-
-duplicates = df[duplicate_mask].sort_values(by=check_cols)
+# Group records that are identical on all columns except ID
+duplicate_groups = duplicate_report(lf, id_col="ID", chunk_size=chunk_size)
 
 # Results
-num_duplicate_rows = len(duplicates)
+num_duplicate_rows = duplicate_groups["count"].sum() if duplicate_groups.height else 0
 
 print(f"Total duplicate rows found (excluding ID): {num_duplicate_rows}")
 
 if num_duplicate_rows > 0:
-    print("\nDuplicate records:")
-    print(duplicates)
+    print(f"\nDuplicate groups: {duplicate_groups.height}")
+    print(duplicate_groups)
 
-    # Export duplicates
+    # Export duplicate groups
     output_file = file_path.replace(".xlsx", "_Check_duplicates.xlsx")
-    duplicates.to_excel(output_file, index=False)
+    duplicate_groups.to_pandas().to_excel(output_file, index=False)
 
-    print(f"\nDuplicates exported to:\n{output_file}")
+    print(f"\nDuplicate groups exported to:\n{output_file}")
 else:
-    print("No duplicate rows found.")
\ No newline at end of file
+    print("No duplicate rows found.")
+
+if check_near_duplicates:
+    # only records sharing a block with another record are read, a batch of blocks at a time
+    near_duplicates = near_duplicate_report(
+        lf,
+        block_keys=near_duplicate_block_keys,
+        id_col="ID",
+        exclude_cols=near_duplicate_exclude_cols,
+        threshold=near_duplicate_threshold,
+        metric=near_duplicate_metric,
+        chunk_size=chunk_size,
+    )
+
+    print(f"\nNear-duplicate pairs found (similarity >= {near_duplicate_threshold}): {near_duplicates.height}")
+
+    if near_duplicates.height > 0:
+        print(near_duplicates)
+
+        output_file = file_path.replace(".xlsx", "_Check_near_duplicates.xlsx")
+        near_duplicates.to_pandas().to_excel(output_file, index=False)
+
+        print(f"\nNear-duplicate pairs exported to:\n{output_file}")
@@ -0,0 +1,102 @@
+"""
+Find the nearest BART stations to each trip origin and destination of the BART 2024 survey.
+
+Python version of Find_Nearest_BART_Station_to_Destination.R and
+Find_Nearest_4_BART_Stations_to_Origin_Destination.R: all origins and
+destinations are snapped in one KD-tree query per column (see
+make-uniform/production/preprocess/nearest_stop.py) instead of a haversine
+distance to every station per trip. Writes the same two CSVs:
+
+* imputed_station_locations_SAS_250305_EditedMW_032125.csv - nearest station
+* imputed_trip_stations_top4.csv - nearest 4 stations, and whether the reported
+  entry/exit station is among them (TRUE, FALSE or MISSING)
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import polars as pl
+
+sys.path.insert(
+    0, str(Path(__file__).resolve().parents[1] / "make-uniform" / "production" / "preprocess")
+)
+
+from excel_cache import read_excel_sheet  # noqa: E402
+from nearest_stop import NearestStopIndex  # noqa: E402
+
+N_NEAREST = 4
+
+BART_STATIONS = Path("M:/Data/GIS layers/Transit_Stops/BART/BART_2024_Stops.csv")
+BART_FOLDER = (
+    Path(os.environ.get("USERPROFILE", Path.home()))
+    / "Box/Modeling and Surveys/Surveys/Transit Passenger Surveys/Ongoing TPS/Individual Operator Efforts"
+    / "BART 2024/BART MTC ETC RSG Project Folder/001_Working_Data_Files"
+)
+SURVEY_FILE = BART_FOLDER / "MTC-BART_OD_Study_SAS_250305_EditedMW_032125_Review1.xlsx"
+SURVEY_SHEET = "MTC-BART_OD_Study_SAS_250305_Ed"
+
+# Rename one or more station names, as needed
+STATION_RENAMES = {"Millbrae (Caltrain Transfer Platform)": "Millbrae"}
+
+
+def in_nearest(reported: str, nearest: list[str]) -> pl.Expr:
+    """TRUE/FALSE if the reported station is among the nearest ones, MISSING if either is null."""
+    return (
+        pl.when(pl.col(reported).is_null() | pl.col(nearest[0]).is_null())
+        .then(pl.lit("MISSING"))
+        .when(pl.any_horizontal(pl.col(reported).cast(pl.Utf8) == pl.col(col) for col in nearest))
+        .then(pl.lit("TRUE"))
+        .otherwise(pl.lit("FALSE"))
+    )
+
+
+def main() -> None:
+    stations = pl.read_csv(BART_STATIONS).with_columns(pl.col("stop_name").replace(STATION_RENAMES))
+    index = NearestStopIndex.from_gazetteer(stations)
+
+    trips = read_excel_sheet(SURVEY_FILE, sheet_name=SURVEY_SHEET)
+    trips = index.snap(
+        trips, "ORIGIN_ADDRESS_LAT", "ORIGIN_ADDRESS_LONG", k=N_NEAREST, prefix="origin"
+    )
+    trips = index.snap(
+        trips, "DESTIN_ADDRESS_LAT", "DESTIN_ADDRESS_LONG", k=N_NEAREST, prefix="destination"
+    )
+
+    origin_cols = [f"origin_{i}" for i in range(1, N_NEAREST + 1)]
+    destination_cols = [f"destination_{i}" for i in range(1, N_NEAREST + 1)]
+
+    nearest = trips.select(
+        "UNIQUE_IDENTIFIER",
+        "ORIGIN_ADDRESS_LAT",
+        "ORIGIN_ADDRESS_LONG",
+        "ENTRY_FNL_NUM",
+        pl.col("origin_1").alias("imputed_origin_station"),
+        "DESTIN_ADDRESS_LAT",
+        "DESTIN_ADDRESS_LONG",
+        "EXIT_STATION_TEXT",
+        pl.col("destination_1").alias("imputed_destination_station"),
+    )
+    nearest.write_csv(BART_FOLDER / "imputed_station_locations_SAS_250305_EditedMW_032125.csv")
+
+    top4 = trips.select(
+        "UNIQUE_IDENTIFIER",
+        "ORIGIN_ADDRESS_LAT",
+        "ORIGIN_ADDRESS_LONG",
+        "ENTRY_FNL_NUM",
+        pl.concat_str(origin_cols, separator=", ").alias("origin_nearest_stations"),
+        in_nearest("ENTRY_FNL_NUM", origin_cols).alias("entry_station_in_top4"),
+        "DESTIN_ADDRESS_LAT",
+        "DESTIN_ADDRESS_LONG",
+        "EXIT_STATION_TEXT",
+        pl.concat_str(destination_cols, separator=", ").alias("destination_nearest_stations"),
+        in_nearest("EXIT_STATION_TEXT", destination_cols).alias("exit_station_in_top4"),
+    )
+    top4.write_csv(BART_FOLDER / "imputed_trip_stations_top4.csv")
+    print(
+        f"Snapped {trips.height:,} trips to the nearest {N_NEAREST} of {len(index)} BART stations"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Geo-code point locations in a CSV to travel model zones (MAZ, TAZ, ...).
+
+Replaces the ArcGIS XY event layer / spatial join / SearchCursor workflow: the
+input CSV is read in chunks, the x/y columns of each chunk are looked up as
+NumPy arrays in a grid index of the zone layer (see requests/zone_index.py),
+the zone attributes are attached by position and the chunk is appended to the
+output CSV. No temporary files and no ArcGIS licence are needed, and memory use
+is bounded by the chunk size.
+
+Typical use (Travel Model Two MAZs, then Travel Model One TAZs):
+    geocode_csv("places.csv", "interim.csv", "mtctm2zonesv10.gdb", zone_layer="mazs",
+                x_field="x_coord", y_field="y_coord", keep_fields=keep_fields)
+    geocode_csv("interim.csv", "places_geocoded.csv", "CSV_TAZ.gdb", zone_layer="TAZs_DD",
+                x_field="x_coord", y_field="y_coord", keep_fields=keep_fields)
+"""
+
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+# Shared zone grid index lives with the data request scripts
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "requests"))
+
+from zone_index import DEFAULT_CELL_SIZE, ZoneGridIndex  # noqa: E402
+
+DEFAULT_CHUNK_SIZE = 500_000
+
+# Coordinates of the input points (x = longitude, y = latitude)
+WGS84 = "EPSG:4326"
+
+
+class ZoneGeocoder:
+    """Point-in-polygon lookup of zone attributes for arrays of points.
+
+    Parameters:
+    -----------
+    zones_gdf : gpd.GeoDataFrame
+        Zone polygons with their attributes (e.g. MAZ_ORIGINAL, TAZ1454)
+    cell_size : float
+        Grid cell edge length in meters (default: 250)
+    """
+
+    def __init__(self, zones_gdf: gpd.GeoDataFrame, cell_size: float = DEFAULT_CELL_SIZE) -> None:
+        zones_gdf = zones_gdf.reset_index(drop=True)
+        # nullable dtypes so integer zone IDs stay integers where points are unmatched
+        self.attributes = pd.DataFrame(zones_gdf.drop(columns=zones_gdf.geometry.name)).convert_dtypes()
+        if self.attributes.columns.empty:
+            raise ValueError("Zone layer has no attribute columns to attach.")
+
+        # the index only needs an ID column; positions map back to all attributes
+        zones_gdf = zones_gdf.assign(_zone_position=np.arange(len(zones_gdf)))
+        self.index = ZoneGridIndex.build(zones_gdf, "_zone_position", cell_size)
+
+    @classmethod
+    def from_file(
+        cls,
+        zone_path: str | Path,
+        zone_layer: str | None = None,
+        cell_size: float = DEFAULT_CELL_SIZE,
+    ) -> "ZoneGeocoder":
+        """Read a zone layer (shapefile, file geodatabase layer, GeoPackage, ...)."""
+        return cls(gpd.read_file(zone_path, layer=zone_layer), cell_size)
+
+    def geocode(self, x: np.ndarray, y: np.ndarray, source_crs: str = WGS84) -> pd.DataFrame:
+        """Return the attributes of the zone containing each point.
+
+        Parameters:
+        -----------
+        x, y : np.ndarray
+            Point coordinates in source_crs (longitude, latitude for WGS84)
+        source_crs : str
+            Coordinate reference system of the points (default: WGS84)
+
+        Returns:
+        --------
+        pd.DataFrame
+            Zone attributes aligned with the input points; missing where a point
+            is outside all zones or has no coordinates
+        """
+        positions = self.index.lookup_positions(
+            lat=pd.to_numeric(pd.Series(y), errors="coerce").to_numpy(dtype=np.float64),
+            lon=pd.to_numeric(pd.Series(x), errors="coerce").to_numpy(dtype=np.float64),
+            source_crs=source_crs,
+        )
+        # unmatched points (position -1) reindex to missing rows
+        return self.attributes.reindex(positions).reset_index(drop=True)
+
+
+def geocode_csv(
+    input_csv: str | Path,
+    output_csv: str | Path,
+    zone_path: str | Path,
+    x_field: str,
+    y_field: str,
+    keep_fields: list[str] | None = None,
+    zone_layer: str | None = None,
+    source_crs: str = WGS84,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    geocoder: ZoneGeocoder | None = None,
+) -> int:
+    """Attach zone attributes to every point of a CSV, streaming in chunks.
+
+    Parameters:
+    -----------
+    input_csv : str | Path
+        CSV with one point per row
+    output_csv : str | Path
+        CSV to write (input columns followed by the zone attributes)
+    zone_path : str | Path
+        Zone layer file or file geodatabase
+    x_field, y_field : str
+        Coordinate columns of input_csv
+    keep_fields : list[str] | None
+        Columns to write (input or zone attribute names); all columns if None
+    zone_layer : str | None
+        Layer name within zone_path (e.g. 'mazs' in a file geodatabase)
+    source_crs : str
+        Coordinate reference system of x_field/y_field (default: WGS84)
+    chunk_size : int
+        Number of input rows geocoded per chunk
+    geocoder : ZoneGeocoder | None
+        Prebuilt geocoder (zone_path/zone_layer are not read when given)
+
+    Returns:
+    --------
+    int
+        Number of rows written
+    """
+    if geocoder is None:
+        geocoder = ZoneGeocoder.from_file(zone_path, zone_layer)
+
+    rows_written = 0
+    for chunk in pd.read_csv(input_csv, chunksize=chunk_size):
+        for field in (x_field, y_field):
+            if field not in chunk.columns:
+                raise ValueError(f"Column '{field}' not found in {input_csv}")
+
+        zones = geocoder.geocode(chunk[x_field].to_numpy(), chunk[y_field].to_numpy(), source_crs)
+        # zone attributes with the same name as an input column get a suffix, as in a spatial join
+        zones.columns = [f"{col}_1" if col in chunk.columns else col for col in zones.columns]
+        zones.index = chunk.index
+        chunk = pd.concat([chunk, zones], axis=1)
+
+        if keep_fields is not None:
+            chunk = chunk[[col for col in chunk.columns if col in keep_fields]]
+
+        chunk.to_csv(output_csv, mode="w" if rows_written == 0 else "a", header=rows_written == 0, index=False)
+        rows_written += len(chunk)
+        print(f"  Geo-coded {rows_written:,} points ...")
+
+    return rows_written
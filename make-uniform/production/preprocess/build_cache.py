@@ -0,0 +1,185 @@
+"""Content-addressed cache of preprocessing stage outputs.
+
+A pipeline is split into stages (e.g. read, geocode, recode). Each stage's key
+is a hash of everything its output depends on: the key of the previous stage,
+the content hash of its input files, the source code of the functions (or
+modules) it runs and the constants it uses. A stage whose key matches a stored
+artifact is loaded from Parquet instead of recomputed, so editing one recode
+only reruns the recode stage and the stages after it.
+
+File content hashes are memoized by size and mtime, so unchanged workbooks and
+shapefiles are not re-hashed on every run.
+
+Typical use:
+    cache = StageCache("BART_2024")
+    survey_df = cache.stage("read", lambda: read(SURVEY_PATH), files=[SURVEY_PATH])
+    survey_df = cache.stage(
+        "geocode", lambda: geocode(survey_df), code=[geocode], params={"threshold": 80}
+    )
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+from collections.abc import Callable, Iterable, Mapping
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import polars as pl
+
+from cache_utils import (
+    CACHE_DIR,
+    atomic_replace,
+    atomic_write_text,
+    file_fingerprint,
+    read_sidecar,
+    temp_path_for,
+    write_sidecar,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_DIR = CACHE_DIR / "stages"
+
+# Bump to invalidate every stage artifact (e.g. after changing the key layout)
+CACHE_VERSION = 1
+
+HASH_MEMO_FILE = "file_hashes.json"
+
+
+def content_key(value: Any) -> str:
+    """Return the SHA-256 of a JSON-serializable value (keys sorted)."""
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def code_digest(code: Callable | ModuleType | str | Path) -> str:
+    """Return a hash of a function's or module's source code, or of a source file."""
+    if isinstance(code, (str, Path)):
+        return hashlib.sha256(Path(code).read_bytes()).hexdigest()
+    return hashlib.sha256(inspect.getsource(code).encode("utf-8")).hexdigest()
+
+
+class FileHashMemo:
+    """SHA-256 of files, memoized on disk by path, size and mtime.
+
+    Args:
+        memo_path: JSON file holding the memoized hashes
+    """
+
+    def __init__(self, memo_path: str | Path) -> None:
+        self.memo_path = Path(memo_path)
+        self._memo: dict[str, dict[str, Any]] = {}
+        if self.memo_path.exists():
+            try:
+                self._memo = json.loads(self.memo_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                logger.warning("Ignoring unreadable file hash memo: %s", self.memo_path)
+
+    def digest(self, path: str | Path) -> str:
+        """Return the content hash of a file, hashing only if it changed."""
+        current = file_fingerprint(path, with_hash=False)
+        cached = self._memo.get(current["path"])
+        if cached and cached["size"] == current["size"] and cached["mtime_ns"] == current["mtime_ns"]:
+            return cached["sha256"]
+
+        current = file_fingerprint(path)
+        self._memo[current["path"]] = current
+        self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.memo_path, json.dumps(self._memo, indent=2))
+        return current["sha256"]
+
+
+class StageCache:
+    """Chain of cached pipeline stages with content-addressed keys.
+
+    Args:
+        pipeline: Pipeline name (one cache subdirectory per pipeline)
+        cache_dir: Root directory of the stage cache
+        enabled: If False, every stage is computed and nothing is stored
+    """
+
+    def __init__(
+        self,
+        pipeline: str,
+        cache_dir: str | Path = STAGE_CACHE_DIR,
+        enabled: bool = True,
+    ) -> None:
+        self.pipeline = pipeline
+        self.cache_dir = Path(cache_dir) / pipeline
+        self.enabled = enabled
+        self.hashes = FileHashMemo(Path(cache_dir) / HASH_MEMO_FILE)
+        self.last_key: str | None = None
+
+    def key(
+        self,
+        stage: str,
+        files: Iterable[str | Path] = (),
+        code: Iterable[Callable | ModuleType | str | Path] = (),
+        params: Mapping[str, Any] | None = None,
+    ) -> str:
+        """Return the key of a stage following the last stage run on this cache."""
+        return content_key(
+            {
+                "version": CACHE_VERSION,
+                "pipeline": self.pipeline,
+                "stage": stage,
+                "upstream": self.last_key,
+                "files": {str(path): self.hashes.digest(path) for path in files},
+                "code": [code_digest(item) for item in code],
+                "params": dict(params or {}),
+            }
+        )
+
+    def artifact_path(self, stage: str, key: str) -> Path:
+        return self.cache_dir / f"{stage}-{key[:16]}.parquet"
+
+    def stage(
+        self,
+        stage: str,
+        compute: Callable[[], pl.DataFrame],
+        files: Iterable[str | Path] = (),
+        code: Iterable[Callable | ModuleType | str | Path] = (),
+        params: Mapping[str, Any] | None = None,
+    ) -> pl.DataFrame:
+        """Return a stage's output, from the cache if its inputs are unchanged.
+
+        Args:
+            stage: Stage name (e.g. "read", "geocode", "recode", "weight")
+            compute: Function computing the stage output
+            files: Input files read by the stage
+            code: Functions, modules or source files whose code the stage runs
+            params: Constants the output depends on (JSON-serializable)
+
+        Returns:
+            The stage output DataFrame
+        """
+        if not self.enabled:
+            return compute()
+
+        key = self.key(stage, files, code, params)
+        self.last_key = key
+        artifact = self.artifact_path(stage, key)
+
+        metadata = read_sidecar(artifact)
+        if metadata is not None and metadata.get("key") == key:
+            logger.info("Stage %s/%s unchanged, loading %s", self.pipeline, stage, artifact)
+            return pl.read_parquet(artifact)
+
+        logger.info("Stage %s/%s changed or not cached, computing", self.pipeline, stage)
+        df = compute()
+
+        # keep one artifact per stage: drop those of earlier keys
+        for stale in self.cache_dir.glob(f"{stage}-*.parquet*"):
+            stale.unlink(missing_ok=True)
+
+        tmp = temp_path_for(artifact)
+        try:
+            df.write_parquet(tmp)
+            atomic_replace(tmp, artifact)
+        finally:
+            tmp.unlink(missing_ok=True)
+        write_sidecar(artifact, {"key": key, "pipeline": self.pipeline, "stage": stage})
+        return df
@@ -0,0 +1,212 @@
+"""Shared helpers for the on-disk caches used by the preprocessors.
+
+Cached artifacts are written next to a JSON sidecar that records the
+fingerprint of the source they were built from. A cache entry is valid while
+the source size and mtime are unchanged; if only the mtime changed (e.g. the
+file was copied), the content hash is compared before rebuilding.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Local cache directory (next to the local output fallback used by the preprocessors)
+CACHE_DIR = Path(__file__).parent.parent / "output" / "cache"
+
+# Lock files not refreshed for this long are left over from a crashed writer;
+# a live holder refreshes its lock file every LOCK_REFRESH_SECONDS
+STALE_LOCK_SECONDS = 600
+LOCK_REFRESH_SECONDS = 30
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def file_sha256(path: str | Path) -> str:
+    """Return the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str | Path, *, with_hash: bool = True) -> dict[str, Any]:
+    """Return size, mtime and (optionally) content hash of a source file."""
+    path = Path(path)
+    stat = path.stat()
+    fingerprint = {
+        "path": str(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    if with_hash:
+        fingerprint["sha256"] = file_sha256(path)
+    return fingerprint
+
+
+def sidecar_path(artifact_path: str | Path) -> Path:
+    """Return the JSON sidecar path for a cached artifact."""
+    artifact_path = Path(artifact_path)
+    return artifact_path.with_name(artifact_path.name + ".json")
+
+
+def read_sidecar(artifact_path: str | Path) -> dict[str, Any] | None:
+    """Read the sidecar of a cached artifact, or None if missing or unreadable."""
+    path = sidecar_path(artifact_path)
+    if not path.exists() or not Path(artifact_path).exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        logger.warning("Ignoring unreadable cache sidecar: %s", path)
+        return None
+
+
+def write_sidecar(artifact_path: str | Path, metadata: dict[str, Any]) -> None:
+    """Atomically write the sidecar of a cached artifact."""
+    atomic_write_text(sidecar_path(artifact_path), json.dumps(metadata, indent=2))
+
+
+def source_unchanged(source_path: str | Path, cached_fingerprint: dict[str, Any]) -> bool:
+    """Check whether a source file still matches the fingerprint it was cached with.
+
+    Size and mtime are compared first; the (slow) content hash is only computed
+    when the mtime differs but the size does not.
+    """
+    current = file_fingerprint(source_path, with_hash=False)
+    if current["size"] != cached_fingerprint.get("size"):
+        return False
+    if current["mtime_ns"] == cached_fingerprint.get("mtime_ns"):
+        return True
+    cached_hash = cached_fingerprint.get("sha256")
+    return cached_hash is not None and file_sha256(source_path) == cached_hash
+
+
+def atomic_replace(tmp_path: str | Path, final_path: str | Path) -> None:
+    """Move a fully written temporary file into place."""
+    os.replace(tmp_path, final_path)
+
+
+def _new_file_mode() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def temp_path_for(final_path: str | Path) -> Path:
+    """Return a unique temporary path in the same directory as final_path.
+
+    The temporary file gets the mode of final_path, or the default mode of a new
+    file if final_path does not exist, so replacing final_path keeps it readable
+    by the same users (mkstemp alone creates it 0600).
+    """
+    final_path = Path(final_path)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{final_path.name}.", suffix=".tmp", dir=final_path.parent)
+    os.close(fd)
+    try:
+        mode = final_path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = _new_file_mode()
+    os.chmod(tmp, mode)
+    return Path(tmp)
+
+
+def atomic_write_text(path: str | Path, text: str) -> None:
+    """Write text to path via a temporary file and atomic replace."""
+    tmp = temp_path_for(path)
+    try:
+        tmp.write_text(text, encoding="utf-8")
+        atomic_replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _read_lock_token(lock_path: Path) -> str | None:
+    try:
+        return lock_path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _refresh_lock(lock_path: Path, token: str, stop: threading.Event) -> None:
+    # touch the lock while it is still ours, so waiters don't take it as stale
+    while not stop.wait(LOCK_REFRESH_SECONDS):
+        if _read_lock_token(lock_path) != token:
+            return
+        try:
+            os.utime(lock_path)
+        except OSError:
+            return
+
+
+@contextmanager
+def file_lock(
+    path: str | Path, timeout: float = 60.0, poll_interval: float = 0.1
+) -> Iterator[Path]:
+    """Hold an exclusive lock on path while the block runs.
+
+    The lock is a path.lock file created with O_EXCL, so it also works on
+    network drives where fcntl/msvcrt locks are unreliable. It holds a token
+    (host, PID and a random id) naming its owner, and the owner refreshes its
+    mtime while the block runs. A lock file not refreshed for STALE_LOCK_SECONDS
+    is assumed to be left by a crashed writer and removed. On release the lock
+    file is only removed if it still holds this owner's token.
+
+    Raises:
+        TimeoutError: If the lock is not acquired within timeout seconds
+    """
+    lock_path = Path(path).with_name(Path(path).name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                owner = _read_lock_token(lock_path)
+                if time.time() - lock_path.stat().st_mtime > STALE_LOCK_SECONDS:
+                    # only remove the lock we found stale, not one that replaced it
+                    if _read_lock_token(lock_path) == owner:
+                        logger.warning("Removing stale lock file of %s: %s", owner, lock_path)
+                        lock_path.unlink(missing_ok=True)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                msg = f"Timed out after {timeout}s waiting for lock: {lock_path}"
+                raise TimeoutError(msg) from None
+            time.sleep(poll_interval)
+
+    try:
+        os.write(fd, token.encode("utf-8"))
+    finally:
+        os.close(fd)
+    stop = threading.Event()
+    refresher = threading.Thread(
+        target=_refresh_lock, args=(lock_path, token, stop), name="file_lock_refresh", daemon=True
+    )
+    refresher.start()
+    try:
+        yield lock_path
+    finally:
+        stop.set()
+        refresher.join()
+        if _read_lock_token(lock_path) == token:
+            lock_path.unlink(missing_ok=True)
+        else:
+            logger.warning("Lock file was taken over by another writer: %s", lock_path)
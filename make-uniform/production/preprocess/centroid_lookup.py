@@ -0,0 +1,224 @@
+"""Shared centroid lookups for ZCTA (zip code), Census place (city) and tract polygons.
+
+Each layer's centroids are computed once in a fixed projected CRS
+(NAD83 / UTM zone 10N), converted to WGS84 and persisted as a small Parquet
+lookup table in the local cache directory. Later runs read that table instead
+of the full national/state shapefile; it is rebuilt when the source shapefile
+changes.
+
+Typical use:
+    home = zip_to_latlon(survey_df["Home_Zipcode"])
+    survey_df["home_lat"] = home["lat"]
+    survey_df["home_lon"] = home["lon"]
+"""
+
+import logging
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+
+from cache_utils import (
+    CACHE_DIR,
+    atomic_replace,
+    file_fingerprint,
+    read_sidecar,
+    source_unchanged,
+    temp_path_for,
+    write_sidecar,
+)
+
+logger = logging.getLogger(__name__)
+
+CENTROID_VERSION = 1
+
+# Projected CRS used for all centroid math (NAD83 / UTM zone 10N, meters)
+CENTROID_CRS = "EPSG:26910"
+
+# Source layers; key_field is the polygon attribute used as lookup key
+CENTROID_LAYERS = {
+    "zcta": {
+        "source": r"M:\Data\GIS layers\Census\2020\tl_2020_us_zcta520\tl_2020_us_zcta520.shp",
+        "key_field": "GEOID20",
+    },
+    "place": {
+        "source": r"M:\Data\GIS layers\Census\2023\tl_2023_06_place\tl_2023_06_place.shp",
+        "key_field": "NAME",
+        # Several places share a name; keep the one with the larger land area
+        "dedupe_by": "ALAND",
+    },
+    "tract": {
+        "source": r"M:\Data\GIS layers\Census\2020\tl_2020_06_tract\tl_2020_06_tract.shp",
+        "key_field": "GEOID",
+    },
+}
+
+
+def _layer_config(layer: str, source: str | Path | None) -> dict:
+    if layer not in CENTROID_LAYERS:
+        msg = f"Unknown centroid layer '{layer}'. Expected one of {list(CENTROID_LAYERS)}"
+        raise ValueError(msg)
+    config = dict(CENTROID_LAYERS[layer])
+    if source is not None:
+        config["source"] = str(source)
+    return config
+
+
+def build_centroid_table(layer: str, source: str | Path | None = None) -> pd.DataFrame:
+    """Compute the centroid lookup table for a layer from its shapefile.
+
+    Args:
+        layer: One of the keys of CENTROID_LAYERS
+        source: Optional override of the layer's source shapefile
+
+    Returns:
+        DataFrame with columns key, lat, lon (one row per key)
+    """
+    config = _layer_config(layer, source)
+    key_field = config["key_field"]
+    dedupe_by = config.get("dedupe_by")
+
+    read_columns = [key_field] + ([dedupe_by] if dedupe_by else [])
+    logger.info("Reading %s polygons from %s", layer, config["source"])
+    polygons = gpd.read_file(config["source"], columns=read_columns)
+    logger.info("Read %s %s polygons", f"{len(polygons):,}", layer)
+
+    if dedupe_by:
+        polygons = polygons.sort_values(by=[key_field, dedupe_by], ascending=[True, False])
+        polygons = polygons.drop_duplicates(subset=key_field, keep="first")
+
+    centroids = polygons.to_crs(CENTROID_CRS).geometry.centroid.to_crs(epsg=4326)
+    return pd.DataFrame(
+        {
+            "key": polygons[key_field].astype(str).to_numpy(),
+            "lat": centroids.y.to_numpy(),
+            "lon": centroids.x.to_numpy(),
+        }
+    )
+
+
+def load_centroid_table(
+    layer: str,
+    source: str | Path | None = None,
+    cache_dir: str | Path = CACHE_DIR,
+) -> pd.DataFrame:
+    """Return the centroid lookup table for a layer, building the cache if needed.
+
+    Args:
+        layer: One of the keys of CENTROID_LAYERS
+        source: Optional override of the layer's source shapefile
+        cache_dir: Directory holding the centroid lookup files
+
+    Returns:
+        DataFrame with columns key, lat, lon
+    """
+    config = _layer_config(layer, source)
+    cache_path = Path(cache_dir) / f"{layer}_{Path(config['source']).stem}_centroids.parquet"
+
+    metadata = read_sidecar(cache_path)
+    if metadata is not None and metadata.get("version") == CENTROID_VERSION:
+        if not Path(config["source"]).exists():
+            logger.warning("Source %s not accessible, using cached centroids", config["source"])
+            return pd.read_parquet(cache_path)
+        if source_unchanged(config["source"], metadata["source"]):
+            logger.info("Using cached %s centroids %s", layer, cache_path)
+            return pd.read_parquet(cache_path)
+
+    fingerprint = file_fingerprint(config["source"])
+    centroid_df = build_centroid_table(layer, config["source"])
+
+    tmp_path = temp_path_for(cache_path)
+    try:
+        centroid_df.to_parquet(tmp_path, index=False)
+        atomic_replace(tmp_path, cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    write_sidecar(
+        cache_path,
+        {"version": CENTROID_VERSION, "source": fingerprint, "crs": CENTROID_CRS},
+    )
+    logger.info("Wrote %s %s centroids to %s", f"{len(centroid_df):,}", layer, cache_path)
+    return centroid_df
+
+
+def normalize_zip(zips: pd.Series) -> pd.Series:
+    """Normalize zip codes to 5-character strings.
+
+    Handles integers, floats read from Excel (94110.0) and ZIP+4 strings. Only
+    numeric values (or their text form, e.g. "2134.0") of 3 or 4 digits are
+    taken to have lost their leading zeros and are padded; shorter numbers and
+    text that doesn't start with 5 digits become NA, so fragments such as "941"
+    can't match a real ZCTA.
+    """
+    text = zips.astype("string").str.strip()
+    five_digits = text.str.extract(r"^(\d{5})", expand=False)
+
+    if pd.api.types.is_numeric_dtype(zips.dtype):
+        numeric = pd.Series(True, index=zips.index)
+    else:
+        numeric = zips.map(
+            lambda value: isinstance(value, int | float) and not isinstance(value, bool)
+        ).astype(bool) | text.str.fullmatch(r"\d+\.0+").fillna(False).astype(bool)
+    short_digits = text.str.extract(r"^(\d{3,4})(?:\.0+)?$", expand=False).str.zfill(5)
+    return five_digits.fillna(short_digits.where(numeric))
+
+
+def normalize_city(cities: pd.Series) -> pd.Series:
+    """Normalize city names to the uppercase place-name keys."""
+    return cities.astype("string").str.upper().str.strip()
+
+
+def lookup_centroids(
+    keys: pd.Series,
+    layer: str,
+    overrides: dict[str, tuple[float, float]] | None = None,
+    source: str | Path | None = None,
+) -> pd.DataFrame:
+    """Look up centroids for a column of (already normalized) keys.
+
+    Args:
+        keys: Series of lookup keys
+        layer: One of the keys of CENTROID_LAYERS
+        overrides: Optional key -> (lat, lon) entries that replace or extend the table
+        source: Optional override of the layer's source shapefile
+
+    Returns:
+        DataFrame with columns lat, lon aligned with the index of keys;
+        unmatched keys are NaN
+    """
+    table = load_centroid_table(layer, source)
+    if layer == "place":
+        table = table.assign(key=table["key"].str.upper())
+    if overrides:
+        override_df = pd.DataFrame(
+            [(key, lat, lon) for key, (lat, lon) in overrides.items()],
+            columns=["key", "lat", "lon"],
+        )
+        table = pd.concat([table[~table["key"].isin(override_df["key"])], override_df])
+
+    table = table.drop_duplicates(subset="key", keep="first").set_index("key")
+    positions = table.index.get_indexer(keys.astype(object).where(keys.notna(), None))
+    matched = positions >= 0
+    result = pd.DataFrame({"lat": float("nan"), "lon": float("nan")}, index=keys.index)
+    result.loc[matched, "lat"] = table["lat"].to_numpy()[positions[matched]]
+    result.loc[matched, "lon"] = table["lon"].to_numpy()[positions[matched]]
+    return result
+
+
+def zip_to_latlon(zips: pd.Series, source: str | Path | None = None) -> pd.DataFrame:
+    """Return ZCTA centroid lat/lon for a column of zip codes (see lookup_centroids)."""
+    return lookup_centroids(normalize_zip(zips), "zcta", source=source)
+
+
+def city_to_latlon(
+    cities: pd.Series,
+    overrides: dict[str, tuple[float, float]] | None = None,
+    source: str | Path | None = None,
+) -> pd.DataFrame:
+    """Return Census place centroid lat/lon for a column of city names (see lookup_centroids)."""
+    return lookup_centroids(normalize_city(cities), "place", overrides=overrides, source=source)
+
+
+def tract_to_latlon(geoids: pd.Series, source: str | Path | None = None) -> pd.DataFrame:
+    """Return tract centroid lat/lon for a column of tract GEOIDs (see lookup_centroids)."""
+    return lookup_centroids(geoids.astype("string").str.strip(), "tract", source=source)
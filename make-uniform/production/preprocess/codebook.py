@@ -0,0 +1,146 @@
+"""Indexed access to consultant survey codebooks.
+
+A codebook sheet lists, for every coded survey field, the allowed values and
+their descriptions (one row per value, with the field name in merged cells).
+Codebook groups these rows by field once, so looking up or decoding a field is
+a dict access instead of a filter over the whole codebook, and several fields
+can be decoded in a single ``with_columns`` call.
+
+Typical use:
+    codebook = Codebook(codebook_df)
+    survey_df = codebook.decode(survey_df, {"GENDER": "gender", "LANG": "language"})
+"""
+
+import logging
+from collections.abc import Mapping
+from typing import Any
+
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CODEBOOK_COLUMNS = ["field", "description", "value", "value_description"]
+
+
+def fill_merged_cells(
+    codebook_df: pl.DataFrame, columns: list[str] | None = None
+) -> pl.DataFrame:
+    """Forward-fill codebook columns that come from merged Excel cells.
+
+    Excel merged cells only have a value in their first row, so the field name
+    and description are null for every value row after the first.
+
+    Args:
+        codebook_df: Raw codebook DataFrame
+        columns: Columns to forward-fill. Defaults to ["field", "description"]
+
+    Returns:
+        Codebook DataFrame with the merged-cell columns filled
+    """
+    if columns is None:
+        columns = ["field", "description"]
+    return codebook_df.with_columns(
+        [pl.col(col).fill_null(strategy="forward") for col in columns]
+    )
+
+
+class Codebook:
+    """Value -> description lookups for every field of a codebook.
+
+    Args:
+        codebook_df: Codebook DataFrame, one row per (field, value)
+        field_col: Column holding the field name (forward-filled for merged cells)
+        value_col: Column holding the coded value
+        description_col: Column holding the value description
+    """
+
+    def __init__(
+        self,
+        codebook_df: pl.DataFrame,
+        field_col: str = "field",
+        value_col: str = "value",
+        description_col: str = "value_description",
+    ) -> None:
+        codebook_df = fill_merged_cells(codebook_df, [field_col])
+
+        # Group by field in one pass; later rows win on duplicate values,
+        # as with dict(zip(values, descriptions)) per field
+        self._lookups: dict[str, dict[Any, Any]] = {}
+        for field, value, description in zip(
+            codebook_df[field_col].to_list(),
+            codebook_df[value_col].to_list(),
+            codebook_df[description_col].to_list(),
+            strict=True,
+        ):
+            if field is None:
+                continue
+            self._lookups.setdefault(field, {})[value] = description
+
+        logger.info(
+            "Indexed %s codebook entries for %d fields",
+            f"{codebook_df.height:,}",
+            len(self._lookups),
+        )
+
+    def __contains__(self, field: str) -> bool:
+        return field in self._lookups
+
+    @property
+    def fields(self) -> list[str]:
+        """Fields with at least one codebook entry, in codebook order."""
+        return list(self._lookups)
+
+    def lookup(self, field: str) -> dict:
+        """Return the value -> value_description mapping of a field ({} if absent)."""
+        return dict(self._lookups.get(field, {}))
+
+    def decode_expr(
+        self,
+        field: str,
+        alias: str | None = None,
+        return_dtype: pl.DataType | None = None,
+    ) -> pl.Expr:
+        """Return an expression replacing a field's codes with their descriptions.
+
+        Values not in the codebook become null.
+
+        Args:
+            field: Survey column to decode
+            alias: Output column name. Defaults to the field name (decode in place)
+            return_dtype: Output dtype. Inferred from the descriptions if None
+
+        Returns:
+            Polars expression
+        """
+        return (
+            pl.col(field)
+            .replace_strict(self._lookups.get(field, {}), default=None, return_dtype=return_dtype)
+            .alias(alias or field)
+        )
+
+    def decode(
+        self,
+        df: pl.DataFrame,
+        columns: Mapping[str, str | None],
+        return_dtype: pl.DataType | None = pl.Utf8,
+    ) -> pl.DataFrame:
+        """Decode several fields in one with_columns call.
+
+        Fields without codebook entries are left untouched.
+
+        Args:
+            df: Survey DataFrame
+            columns: Mapping of field -> output column name (None to decode in place)
+            return_dtype: Output dtype of the decoded columns
+
+        Returns:
+            DataFrame with the decoded columns added or replaced
+        """
+        exprs = [
+            self.decode_expr(field, alias, return_dtype)
+            for field, alias in columns.items()
+            if field in self._lookups
+        ]
+        if not exprs:
+            return df
+        return df.with_columns(exprs)
@@ -0,0 +1,144 @@
+"""Keyed store of the survey-to-standard mappings in Dictionary_for_Standard_Database.csv.
+
+Each row of the dictionary maps one survey response (Survey_Name, Survey_year,
+Survey_Variable, Survey_Response) to a generic variable and response. A
+preprocessor registers its mappings with one upsert: the dictionary is read,
+the operator's rows are replaced and the file is rewritten through a temporary
+file and an atomic replace, all while holding a lock file. Preprocessors
+running in parallel (see run_preprocessors.py) therefore never clobber each
+other's mappings, and a crash mid-write leaves the previous dictionary intact.
+
+Lookups by survey go through an index of row positions per (survey, year),
+rebuilt only when the file changes.
+
+Typical use:
+    store = DictionaryStore()
+    store.upsert(pl.read_csv("BART_2024_dictionary_mappings.csv", infer_schema=False),
+                 replace_surveys=True)
+    bart_df = store.survey("BART", 2024)
+"""
+
+import logging
+from pathlib import Path
+
+import polars as pl
+
+from cache_utils import atomic_replace, file_fingerprint, file_lock, temp_path_for
+
+logger = logging.getLogger(__name__)
+
+DICTIONARY_PATH = Path(__file__).resolve().parents[1] / "Dictionary_for_Standard_Database.csv"
+
+SURVEY_COLUMNS = ["Survey_Name", "Survey_year"]
+KEY_COLUMNS = [*SURVEY_COLUMNS, "Survey_Variable", "Survey_Response"]
+DICTIONARY_COLUMNS = [*KEY_COLUMNS, "Generic_Variable", "Generic_Response"]
+
+
+class DictionaryStore:
+    """Dictionary_for_Standard_Database.csv with keyed upserts and a survey index.
+
+    All values are kept as strings so rows are rewritten exactly as read.
+
+    Args:
+        path: Dictionary CSV
+        lock_timeout: Seconds to wait for another writer's lock
+    """
+
+    def __init__(self, path: str | Path = DICTIONARY_PATH, lock_timeout: float = 60.0) -> None:
+        self.path = Path(path)
+        self.lock_timeout = lock_timeout
+        self._df: pl.DataFrame | None = None
+        self._index: dict[tuple[str, str], list[int]] = {}
+        self._fingerprint: tuple[int, int] | None = None
+
+    def read(self) -> pl.DataFrame:
+        """Return the whole dictionary, re-reading it only if the file changed."""
+        current = file_fingerprint(self.path, with_hash=False)
+        fingerprint = (current["size"], current["mtime_ns"])
+        if self._df is None or fingerprint != self._fingerprint:
+            self._set(pl.read_csv(self.path, infer_schema=False), fingerprint)
+        return self._df
+
+    def _set(self, df: pl.DataFrame, fingerprint: tuple[int, int]) -> None:
+        missing = [col for col in DICTIONARY_COLUMNS if col not in df.columns]
+        if missing:
+            msg = f"{self.path} is missing dictionary columns: {missing}"
+            raise ValueError(msg)
+        self._df = df
+        self._fingerprint = fingerprint
+        self._index = {
+            (name, year): rows
+            for name, year, rows in df.with_row_index("row")
+            .group_by(SURVEY_COLUMNS, maintain_order=True)
+            .agg(pl.col("row"))
+            .iter_rows()
+        }
+
+    def surveys(self) -> list[tuple[str, str]]:
+        """Return the (Survey_Name, Survey_year) pairs in the dictionary."""
+        self.read()
+        return list(self._index)
+
+    def survey(self, name: str, year: int | str) -> pl.DataFrame:
+        """Return the mappings of one survey, in file order (empty if unknown)."""
+        df = self.read()
+        return df[self._index.get((name, str(year)), [])]
+
+    def upsert(self, mappings: pl.DataFrame, replace_surveys: bool = False) -> pl.DataFrame:
+        """Insert or update mappings in one locked, atomic rewrite of the dictionary.
+
+        Args:
+            mappings: Rows with the dictionary columns (values are cast to strings)
+            replace_surveys: Drop every existing row of the surveys in mappings
+                first, so responses no longer mapped disappear; otherwise only rows
+                with the same key are replaced
+
+        Returns:
+            The updated dictionary
+
+        Raises:
+            ValueError: If mappings lack dictionary columns or repeat a key
+            TimeoutError: If another writer holds the lock for too long
+        """
+        missing = [col for col in DICTIONARY_COLUMNS if col not in mappings.columns]
+        if missing:
+            msg = f"Mappings are missing dictionary columns: {missing}"
+            raise ValueError(msg)
+        mappings = mappings.select(pl.col(DICTIONARY_COLUMNS).cast(pl.Utf8))
+
+        duplicated = mappings.filter(pl.struct(KEY_COLUMNS).is_duplicated())
+        if not duplicated.is_empty():
+            msg = f"Mappings repeat {duplicated.height} keys, e.g.\n{duplicated.head(5)}"
+            raise ValueError(msg)
+
+        with file_lock(self.path, timeout=self.lock_timeout):
+            # re-read under the lock: another preprocessor may have just written
+            current = pl.read_csv(self.path, infer_schema=False)
+            replaced_on = SURVEY_COLUMNS if replace_surveys else KEY_COLUMNS
+            kept = current.join(
+                mappings.select(replaced_on).unique(),
+                on=replaced_on,
+                how="anti",
+                nulls_equal=True,
+                maintain_order="left",
+            )
+            updated = pl.concat([kept, mappings], how="diagonal")
+
+            tmp = temp_path_for(self.path)
+            try:
+                updated.write_csv(tmp, line_terminator="\n", quote_style="necessary")
+                atomic_replace(tmp, self.path)
+            finally:
+                tmp.unlink(missing_ok=True)
+
+            current_fingerprint = file_fingerprint(self.path, with_hash=False)
+            self._set(updated, (current_fingerprint["size"], current_fingerprint["mtime_ns"]))
+
+        logger.info(
+            "Upserted %d mappings into %s (%d rows replaced, %d total)",
+            mappings.height,
+            self.path,
+            current.height - kept.height,
+            updated.height,
+        )
+        return updated
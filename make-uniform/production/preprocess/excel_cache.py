@@ -0,0 +1,253 @@
+"""Parquet cache for consultant Excel workbooks.
+
+The first read of a sheet parses it with the Calamine engine and writes a
+Parquet copy to the local cache directory, next to a JSON sidecar holding the
+workbook fingerprint (size, mtime, SHA-256) and the read options. Later reads of
+the same sheet load the Parquet copy instead, reading only the requested
+columns. The copy is rebuilt when the workbook changes.
+
+For sheets too large to hold in memory, iter_excel_rows / iter_excel_batches
+stream rows from the workbook with openpyxl in read-only mode.
+
+Typical use:
+    survey_df = read_excel_sheet(SURVEY_PATH, "data", infer_schema_length=10000)
+    od_df = read_excel_sheet(OD_PATH, "OD_RESULTS", columns=["ID", "ROUTE"]).to_pandas()
+"""
+
+import hashlib
+import logging
+import re
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+from cache_utils import (
+    CACHE_DIR,
+    atomic_replace,
+    file_fingerprint,
+    read_sidecar,
+    source_unchanged,
+    temp_path_for,
+    write_sidecar,
+)
+
+logger = logging.getLogger(__name__)
+
+EXCEL_CACHE_VERSION = 1
+
+DEFAULT_BATCH_SIZE = 50_000
+
+
+def sheet_cache_path(
+    workbook_path: str | Path,
+    sheet_name: str,
+    has_header: bool = True,
+    cache_dir: str | Path = CACHE_DIR,
+) -> Path:
+    """Return the Parquet cache path for one sheet of a workbook.
+
+    The name includes a short hash of the workbook's full path, so workbooks
+    with the same file name in different folders don't share a cache entry.
+    """
+    workbook_path = Path(workbook_path)
+    path_key = hashlib.sha256(str(workbook_path.resolve()).encode("utf-8")).hexdigest()[:8]
+    sheet_key = re.sub(r"[^\w-]+", "_", sheet_name)
+    header_key = "" if has_header else ".noheader"
+    return Path(cache_dir) / f"{workbook_path.stem}.{path_key}.{sheet_key}{header_key}.parquet"
+
+
+def convert_sheet(
+    workbook_path: str | Path,
+    sheet_name: str,
+    cache_path: str | Path,
+    has_header: bool = True,
+    infer_schema_length: int | None = None,
+) -> None:
+    """Parse one sheet of a workbook and write it to a Parquet cache file.
+
+    Args:
+        workbook_path: Path to the Excel workbook
+        sheet_name: Name of the sheet to convert
+        cache_path: Path of the Parquet file to write
+        has_header: Whether the first row holds column names
+        infer_schema_length: Rows used to infer column types (None = all rows)
+    """
+    logger.info("Converting sheet '%s' of %s to Parquet", sheet_name, workbook_path)
+    fingerprint = file_fingerprint(workbook_path)
+
+    sheet_df = pl.read_excel(
+        workbook_path,
+        sheet_name=sheet_name,
+        has_header=has_header,
+        infer_schema_length=infer_schema_length,
+    )
+
+    cache_path = Path(cache_path)
+    tmp_path = temp_path_for(cache_path)
+    try:
+        sheet_df.write_parquet(tmp_path)
+        atomic_replace(tmp_path, cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    write_sidecar(
+        cache_path,
+        {
+            "version": EXCEL_CACHE_VERSION,
+            "source": fingerprint,
+            "sheet_name": sheet_name,
+            "has_header": has_header,
+            "infer_schema_length": infer_schema_length,
+            "rows": sheet_df.height,
+            "columns": sheet_df.columns,
+        },
+    )
+    logger.info(
+        "Wrote %s rows x %d columns to %s", f"{sheet_df.height:,}", sheet_df.width, cache_path
+    )
+
+
+def _cache_is_current(
+    cache_path: Path,
+    workbook_path: str | Path,
+    sheet_name: str,
+    has_header: bool,
+    infer_schema_length: int | None,
+) -> bool:
+    """Check whether the Parquet copy of a sheet matches the workbook and read options."""
+    metadata = read_sidecar(cache_path)
+    if metadata is None:
+        return False
+    if (
+        metadata.get("version") != EXCEL_CACHE_VERSION
+        or metadata.get("sheet_name") != sheet_name
+        or metadata.get("has_header") != has_header
+        or metadata.get("infer_schema_length") != infer_schema_length
+    ):
+        return False
+    if not Path(workbook_path).exists():
+        logger.warning("Workbook %s not accessible, using cached sheet", workbook_path)
+        return True
+    if not source_unchanged(workbook_path, metadata["source"]):
+        logger.info("Workbook %s changed since sheet '%s' was cached", workbook_path, sheet_name)
+        return False
+    return True
+
+
+def scan_excel_sheet(
+    workbook_path: str | Path,
+    sheet_name: str,
+    has_header: bool = True,
+    infer_schema_length: int | None = None,
+    cache_dir: str | Path = CACHE_DIR,
+) -> pl.LazyFrame:
+    """Return a LazyFrame over the Parquet copy of a sheet, converting it if needed.
+
+    Args:
+        workbook_path: Path to the Excel workbook
+        sheet_name: Name of the sheet to read
+        has_header: Whether the first row holds column names
+        infer_schema_length: Rows used to infer column types (None = all rows)
+        cache_dir: Directory holding the Parquet copies
+
+    Returns:
+        LazyFrame scanning the cached sheet
+    """
+    cache_path = sheet_cache_path(workbook_path, sheet_name, has_header, cache_dir)
+    if _cache_is_current(cache_path, workbook_path, sheet_name, has_header, infer_schema_length):
+        logger.info("Using cached sheet '%s' from %s", sheet_name, cache_path)
+    else:
+        convert_sheet(workbook_path, sheet_name, cache_path, has_header, infer_schema_length)
+    return pl.scan_parquet(cache_path)
+
+
+def read_excel_sheet(
+    workbook_path: str | Path,
+    sheet_name: str,
+    columns: Sequence[str] | None = None,
+    has_header: bool = True,
+    infer_schema_length: int | None = None,
+    cache_dir: str | Path = CACHE_DIR,
+) -> pl.DataFrame:
+    """Read a sheet through the Parquet cache.
+
+    Args:
+        workbook_path: Path to the Excel workbook
+        sheet_name: Name of the sheet to read
+        columns: Optional subset of columns to read (all columns if None)
+        has_header: Whether the first row holds column names
+        infer_schema_length: Rows used to infer column types (None = all rows)
+        cache_dir: Directory holding the Parquet copies
+
+    Returns:
+        DataFrame with the sheet's contents
+    """
+    sheet_lf = scan_excel_sheet(
+        workbook_path, sheet_name, has_header, infer_schema_length, cache_dir
+    )
+    if columns is not None:
+        sheet_lf = sheet_lf.select(columns)
+    return sheet_lf.collect()
+
+
+def iter_excel_rows(
+    workbook_path: str | Path,
+    sheet_name: str,
+) -> Iterator[tuple[Any, ...]]:
+    """Stream the rows of a sheet as tuples of cell values.
+
+    Uses openpyxl in read-only mode, so memory use does not grow with the
+    sheet size. The header row (if any) is yielded like any other row.
+
+    Args:
+        workbook_path: Path to the Excel workbook
+        sheet_name: Name of the sheet to read
+
+    Yields:
+        One tuple of cell values per row
+    """
+    from openpyxl import load_workbook  # only needed for streaming reads
+
+    workbook = load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        yield from workbook[sheet_name].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_excel_batches(
+    workbook_path: str | Path,
+    sheet_name: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[pl.DataFrame]:
+    """Stream a sheet with a header row as DataFrames of at most batch_size rows.
+
+    Column types are inferred per batch, so the same column may get a
+    different type in different batches.
+
+    Args:
+        workbook_path: Path to the Excel workbook
+        sheet_name: Name of the sheet to read
+        batch_size: Maximum number of rows per DataFrame
+
+    Yields:
+        DataFrames with the sheet's header as column names
+    """
+    rows = iter_excel_rows(workbook_path, sheet_name)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [
+        str(name) if name is not None else f"column_{i + 1}" for i, name in enumerate(header)
+    ]
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield pl.DataFrame(batch, schema=columns, orient="row", infer_schema_length=None)
+            batch = []
+    if batch:
+        yield pl.DataFrame(batch, schema=columns, orient="row", infer_schema_length=None)
@@ -0,0 +1,245 @@
+"""Crow-fly distances between the transit milestone locations of each survey record.
+
+A record has up to seven milestones (home, origin, first boarding, survey
+boarding, survey alighting, last alighting, destination), each a *_lat/*_lon
+column pair of the standard database. Every milestone's coordinates are read
+into NumPy once, converted to radians (or projected) once, and each distance
+column is then a handful of array operations over the whole frame - the same
+haversine as geosphere::distHaversine in the "distances appended" request
+scripts, without their rowwise() loop.
+
+Records with a missing or out-of-range coordinate get a null distance.
+Distances are stored as float32: a few centimeters of precision is plenty for
+access, egress and trip lengths, and it halves the size of the columns.
+
+Typical use:
+    survey_df = append_milestone_distances(survey_df)
+    survey_df = append_milestone_distances(survey_df, DISTANCE_PAIRS, method="projected")
+"""
+
+import argparse
+import logging
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from pyproj import Transformer
+
+logger = logging.getLogger(__name__)
+
+# Milestone -> (lat column, lon column), in trip order
+MILESTONES = {
+    "home": ("home_lat", "home_lon"),
+    "orig": ("orig_lat", "orig_lon"),
+    "first_board": ("first_board_lat", "first_board_lon"),
+    "survey_board": ("survey_board_lat", "survey_board_lon"),
+    "survey_alight": ("survey_alight_lat", "survey_alight_lon"),
+    "last_alight": ("last_alight_lat", "last_alight_lon"),
+    "dest": ("dest_lat", "dest_lon"),
+}
+
+# Output column -> (from milestone, to milestone); the first five are the
+# columns of "Create TPS file with distances appended.R"
+DISTANCE_PAIRS = {
+    "orig_dest_dist": ("orig", "dest"),
+    "orig_firstboard_dist": ("orig", "first_board"),
+    "orig_surveyboard_dist": ("orig", "survey_board"),
+    "survey_alight_dest_dist": ("survey_alight", "dest"),
+    "last_alight_dest_dist": ("last_alight", "dest"),
+    "home_orig_dist": ("home", "orig"),
+    "home_dest_dist": ("home", "dest"),
+    "survey_board_alight_dist": ("survey_board", "survey_alight"),
+}
+
+# Earth radius per unit for the haversine (3963.2 mi, as in the request scripts)
+EARTH_RADIUS = {"miles": 3963.2, "km": 6378.137, "meters": 6_378_137.0}
+
+# Meters per unit for projected distances
+METERS_PER_UNIT = {"miles": 1609.344, "km": 1000.0, "meters": 1.0}
+
+# Projected CRS for method="projected" (NAD83 / UTM zone 10N, meters), as in centroid_lookup
+PROJECTED_CRS = "EPSG:26910"
+
+METHODS = ("haversine", "projected")
+
+
+def all_milestone_pairs(milestones: list[str] | None = None) -> dict[str, tuple[str, str]]:
+    """Return every pair of milestones, in trip order, named "{from}_{to}_dist"."""
+    milestones = milestones or list(MILESTONES)
+    return {f"{a}_{b}_dist": (a, b) for a, b in combinations(milestones, 2)}
+
+
+def _milestone_coordinates(df: pl.DataFrame, milestones: set[str]) -> dict[str, np.ndarray]:
+    """Return {milestone: (2, n) float64 array of lat, lon}, NaN where missing or invalid."""
+    lat_lon_cols = [col for name in sorted(milestones) for col in MILESTONES[name]]
+    missing = [col for col in lat_lon_cols if col not in df.columns]
+    if missing:
+        msg = f"Missing milestone coordinate columns: {missing}"
+        raise ValueError(msg)
+
+    # coordinates may be strings in older releases; unparseable values become null
+    coords = df.select(pl.col(lat_lon_cols).cast(pl.Float64, strict=False))
+    coordinates = {}
+    for name in sorted(milestones):
+        lat_col, lon_col = MILESTONES[name]
+        lat_lon = np.vstack((coords[lat_col].to_numpy(), coords[lon_col].to_numpy()))
+        invalid = (np.abs(lat_lon[0]) > 90) | (np.abs(lat_lon[1]) > 180)
+        lat_lon[:, invalid] = np.nan
+        coordinates[name] = lat_lon
+    return coordinates
+
+
+def haversine(
+    lat1: np.ndarray,
+    lon1: np.ndarray,
+    lat2: np.ndarray,
+    lon2: np.ndarray,
+    radius: float,
+    cos_lat1: np.ndarray | None = None,
+    cos_lat2: np.ndarray | None = None,
+) -> np.ndarray:
+    """Great-circle distances between arrays of points given in radians.
+
+    Same distances as geosphere::distHaversine; NaN coordinates give NaN.
+    cos_lat1/cos_lat2 may be passed in when a milestone appears in several pairs.
+    """
+    cos_lat1 = np.cos(lat1) if cos_lat1 is None else cos_lat1
+    cos_lat2 = np.cos(lat2) if cos_lat2 is None else cos_lat2
+    # in-place steps: this runs once per pair over every record
+    a = np.sin((lat2 - lat1) / 2)
+    a *= a
+    b = np.sin((lon2 - lon1) / 2)
+    b *= b
+    b *= cos_lat1
+    b *= cos_lat2
+    a += b
+    np.sqrt(a, out=a)
+    np.minimum(a, 1.0, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * radius
+    return a
+
+
+def milestone_distances(
+    df: pl.DataFrame,
+    pairs: dict[str, tuple[str, str]] | None = None,
+    units: str = "miles",
+    method: str = "haversine",
+) -> pl.DataFrame:
+    """Compute milestone-pair distances for every record.
+
+    Args:
+        df: Survey records with the *_lat/*_lon columns of the milestones in pairs
+        pairs: Output column -> (from milestone, to milestone) (default: DISTANCE_PAIRS)
+        units: "miles", "km" or "meters"
+        method: "haversine" (great-circle) or "projected" (straight line in PROJECTED_CRS)
+
+    Returns:
+        DataFrame with one Float32 column per pair, aligned with df (no columns
+        if pairs is empty)
+
+    Raises:
+        ValueError: If units, method or a milestone is unknown, a pair is not a
+            (from, to) pair, or coordinates are missing
+    """
+    pairs = DISTANCE_PAIRS if pairs is None else pairs
+    if units not in EARTH_RADIUS:
+        msg = f"Unknown units '{units}'. Expected one of {list(EARTH_RADIUS)}"
+        raise ValueError(msg)
+    if method not in METHODS:
+        msg = f"Unknown method '{method}'. Expected one of {list(METHODS)}"
+        raise ValueError(msg)
+    malformed = {
+        col: pair
+        for col, pair in pairs.items()
+        if not isinstance(pair, tuple | list) or len(pair) != 2
+    }
+    if malformed:
+        msg = f"Distance pairs must be (from milestone, to milestone), got {malformed}"
+        raise ValueError(msg)
+    if not pairs:
+        return pl.DataFrame(height=df.height)
+    milestones = {name for pair in pairs.values() for name in pair}
+    unknown = sorted(milestones - set(MILESTONES))
+    if unknown:
+        msg = f"Unknown milestones {unknown}. Expected some of {list(MILESTONES)}"
+        raise ValueError(msg)
+
+    coordinates = _milestone_coordinates(df, milestones)
+    if method == "haversine":
+        # (lat, lon, cos(lat)) in radians, computed once per milestone
+        points = {}
+        for name, lat_lon in coordinates.items():
+            lat, lon = np.radians(lat_lon)
+            points[name] = (lat, lon, np.cos(lat))
+    else:
+        transformer = Transformer.from_crs("EPSG:4326", PROJECTED_CRS, always_xy=True)
+        points = {
+            name: np.vstack(transformer.transform(lat_lon[1], lat_lon[0]))
+            for name, lat_lon in coordinates.items()
+        }
+
+    columns = []
+    for col, (start, end) in pairs.items():
+        if method == "haversine":
+            lat1, lon1, cos_lat1 = points[start]
+            lat2, lon2, cos_lat2 = points[end]
+            distance = haversine(lat1, lon1, lat2, lon2, EARTH_RADIUS[units], cos_lat1, cos_lat2)
+        else:
+            distance = np.hypot(*(points[end] - points[start])) / METERS_PER_UNIT[units]
+        columns.append(pl.Series(col, distance.astype(np.float32), nan_to_null=True))
+    return pl.DataFrame(columns, height=df.height)
+
+
+def append_milestone_distances(
+    df: pl.DataFrame,
+    pairs: dict[str, tuple[str, str]] | None = None,
+    units: str = "miles",
+    method: str = "haversine",
+) -> pl.DataFrame:
+    """Append milestone-pair distance columns to df (see milestone_distances).
+
+    Existing columns of the same name are replaced.
+    """
+    distances = milestone_distances(df, pairs, units, method)
+    logger.info(
+        "Appended %d %s distance columns (%s) to %d records",
+        distances.width,
+        method,
+        units,
+        df.height,
+    )
+    return df.with_columns(distances)
+
+
+def main() -> None:
+    """Append milestone distances to a standard database file."""
+    parser = argparse.ArgumentParser(
+        description="Append crow-fly distances between transit milestones to a survey file"
+    )
+    parser.add_argument("survey", type=Path, help="Survey CSV or Parquet")
+    parser.add_argument("--output", type=Path, required=True, help="CSV or Parquet")
+    parser.add_argument("--units", choices=list(EARTH_RADIUS), default="miles")
+    parser.add_argument("--method", choices=METHODS, default="haversine")
+    parser.add_argument(
+        "--all-pairs", action="store_true", help="Every milestone pair, not just DISTANCE_PAIRS"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    if args.survey.suffix == ".parquet":
+        survey_df = pl.read_parquet(args.survey)
+    else:
+        survey_df = pl.read_csv(args.survey, infer_schema_length=None)
+    pairs = all_milestone_pairs() if args.all_pairs else DISTANCE_PAIRS
+    survey_df = append_milestone_distances(survey_df, pairs, args.units, args.method)
+    if args.output.suffix == ".parquet":
+        survey_df.write_parquet(args.output)
+    else:
+        survey_df.write_csv(args.output)
+    logger.info("Wrote %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
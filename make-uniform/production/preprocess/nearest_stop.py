@@ -0,0 +1,181 @@
+"""k-nearest stop lookup for whole coordinate columns.
+
+Stops are placed on the unit sphere (x, y, z) and indexed in a SciPy cKDTree.
+Straight-line (chord) distance on the sphere increases with great-circle
+distance, so the tree's Euclidean k-nearest query returns the same stops as a
+haversine search; chord lengths are converted back to meters afterwards. One
+query answers every point of a survey column at once, instead of computing the
+distance from each point to each stop.
+
+The stop table is usually the operator slice of the stop gazetteer that
+geocode_stops_from_names matches names against, so names returned here line
+up with the geocoded board/alight stations.
+
+Typical use:
+    index = NearestStopIndex.from_gazetteer(load_operator_stops(stops_path, ["BART"]))
+    survey_df = index.snap(survey_df, "orig_lat", "orig_lon", k=4, prefix="orig_station")
+"""
+
+import numpy as np
+import polars as pl
+from scipy.spatial import cKDTree
+
+# Earth radius used by geosphere::distHaversine, so distances match the R scripts
+EARTH_RADIUS_M = 6_378_137.0
+
+
+def unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Return (n, 3) unit-sphere coordinates of WGS84 lat/lon arrays in degrees."""
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+def chord_to_meters(chord: np.ndarray) -> np.ndarray:
+    """Convert unit-sphere chord lengths to great-circle distances in meters."""
+    return 2.0 * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0)) * EARTH_RADIUS_M
+
+
+class NearestStopIndex:
+    """KD-tree over a fixed table of stops.
+
+    Args:
+        stop_names: Stop names, in table order
+        stop_lats: WGS84 latitudes aligned with stop_names
+        stop_lons: WGS84 longitudes aligned with stop_names
+    """
+
+    def __init__(
+        self,
+        stop_names: list[str],
+        stop_lats: np.ndarray,
+        stop_lons: np.ndarray,
+    ) -> None:
+        if not (len(stop_names) == len(stop_lats) == len(stop_lons)):
+            msg = "stop_names, stop_lats and stop_lons must have the same length"
+            raise ValueError(msg)
+
+        stop_lats = np.asarray(stop_lats, dtype=np.float64)
+        stop_lons = np.asarray(stop_lons, dtype=np.float64)
+        valid = np.isfinite(stop_lats) & np.isfinite(stop_lons)
+        if not valid.any():
+            msg = "NearestStopIndex requires at least one stop with coordinates"
+            raise ValueError(msg)
+
+        # stops without coordinates can't be nearest to anything
+        self.stop_names = np.asarray(stop_names, dtype=object)[valid]
+        self.stop_lats = stop_lats[valid]
+        self.stop_lons = stop_lons[valid]
+        self.tree = cKDTree(unit_vectors(self.stop_lats, self.stop_lons))
+
+    @classmethod
+    def from_gazetteer(cls, operator_stops: pl.DataFrame) -> "NearestStopIndex":
+        """Build an index from an operator slice of the stop gazetteer.
+
+        Args:
+            operator_stops: Output of stop_gazetteer.load_operator_stops
+                (columns stop_name, lat, lon in WGS84)
+        """
+        return cls(
+            stop_names=operator_stops["stop_name"].to_list(),
+            stop_lats=operator_stops["lat"].to_numpy(),
+            stop_lons=operator_stops["lon"].to_numpy(),
+        )
+
+    def __len__(self) -> int:
+        return len(self.stop_names)
+
+    def query(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        k: int = 1,
+        max_distance_m: float | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the k nearest stops of every point.
+
+        Args:
+            lat: WGS84 latitudes of the points
+            lon: WGS84 longitudes of the points
+            k: Number of stops per point, nearest first
+            max_distance_m: Ignore stops farther than this
+
+        Returns:
+            (positions, distances) arrays of shape (n, k): stop positions in the
+            index (-1 where there is no stop, e.g. missing coordinates) and
+            great-circle distances in meters (NaN where there is no stop)
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        n_points = len(lat)
+        positions = np.full((n_points, k), -1, dtype=np.int64)
+        distances = np.full((n_points, k), np.nan, dtype=np.float64)
+
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        if not valid.any():
+            return positions, distances
+
+        if max_distance_m is None:
+            upper_bound = np.inf
+        else:
+            upper_bound = 2.0 * np.sin(min(max_distance_m / EARTH_RADIUS_M, np.pi) / 2.0)
+        chord, found = self.tree.query(
+            unit_vectors(lat[valid], lon[valid]),
+            k=k,
+            distance_upper_bound=upper_bound,
+            workers=-1,
+        )
+        chord = np.asarray(chord, dtype=np.float64).reshape(-1, k)
+        found = np.asarray(found, dtype=np.int64).reshape(-1, k)
+
+        # cKDTree marks missing neighbors with index len(stops) and infinite distance
+        hit = found < len(self)
+        positions[valid] = np.where(hit, found, -1)
+        distances[valid] = np.where(hit, chord_to_meters(np.where(hit, chord, 0.0)), np.nan)
+        return positions, distances
+
+    def snap(
+        self,
+        df: pl.DataFrame,
+        lat_col: str,
+        lon_col: str,
+        k: int = 1,
+        prefix: str | None = None,
+        max_distance_m: float | None = None,
+    ) -> pl.DataFrame:
+        """Attach the k nearest stops of each row's coordinates.
+
+        Args:
+            df: DataFrame with coordinate columns
+            lat_col: Latitude column (WGS84)
+            lon_col: Longitude column (WGS84)
+            k: Number of stops per row, nearest first
+            prefix: Prefix of the new columns (default: "nearest_stop")
+            max_distance_m: Leave stops farther than this null
+
+        Returns:
+            df with columns {prefix}_{i} (stop name) and {prefix}_{i}_distance
+            (meters) for i = 1..k; with k = 1 the suffix _1 is dropped
+        """
+        prefix = prefix or "nearest_stop"
+        coords = df.select(
+            pl.col(lat_col).cast(pl.Float64, strict=False),
+            pl.col(lon_col).cast(pl.Float64, strict=False),
+        )
+        positions, distances = self.query(
+            coords[lat_col].to_numpy(allow_copy=True),
+            coords[lon_col].to_numpy(allow_copy=True),
+            k=k,
+            max_distance_m=max_distance_m,
+        )
+
+        names = np.where(positions >= 0, self.stop_names[np.maximum(positions, 0)], None)
+        columns = []
+        for i in range(k):
+            name = prefix if k == 1 else f"{prefix}_{i + 1}"
+            columns += [
+                pl.Series(name, names[:, i].tolist(), dtype=pl.Utf8),
+                pl.Series(f"{name}_distance", distances[:, i]).fill_nan(None),
+            ]
+        return df.with_columns(columns)
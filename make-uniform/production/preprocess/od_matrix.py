@@ -0,0 +1,269 @@
+"""Sparse origin-destination matrices of weighted survey trips.
+
+Zone (station, TAP or TAZ) names are mapped to integer positions once; the
+weighted trips of every slice (e.g. time period x access mode) are then summed
+into one scipy.sparse matrix of shape (slices * zones, zones) in a single
+COO -> CSR conversion, and each slice is a block of its rows. Only the OD pairs
+that occur are stored, so a TAZ x TAZ table per slice costs memory in
+proportion to the survey records, not to zones squared, and there is no
+data-frame pivot.
+
+Typical use:
+    od = ODMatrices.from_frame(
+        bart_df, "survey_board_station", "survey_alight_station",
+        weight_col="trip_weight", slice_cols=["time_period"],
+    )
+    am_peak = od.select(time_period="AM PEAK")  # scipy.sparse.csr_matrix
+    od.to_parquet("bart_2024_station_od.parquet")
+"""
+
+import argparse
+import logging
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Column names of the long (Parquet) form
+ORIG_COLUMN = "orig"
+DEST_COLUMN = "dest"
+VALUE_COLUMN = "trips"
+
+
+class ODMatrices:
+    """Sparse OD matrices over one zone system, one matrix per slice.
+
+    Args:
+        zones: Zone names, in matrix order
+        slice_cols: Names of the slicing columns (empty for a single matrix)
+        matrices: Slice key (tuple of slice values, () without slicing) -> CSR
+            matrix of shape (len(zones), len(zones))
+        slice_dtypes: Slice column -> dtype, for the long form when there are no slices
+    """
+
+    def __init__(
+        self,
+        zones: Sequence,
+        slice_cols: Sequence[str],
+        matrices: dict[tuple, sparse.csr_matrix],
+        slice_dtypes: dict[str, pl.DataType] | None = None,
+    ) -> None:
+        self.zones = list(zones)
+        self.slice_cols = list(slice_cols)
+        self.matrices = matrices
+        self.slice_dtypes = slice_dtypes or {}
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        if len(self.zone_index) != len(self.zones):
+            msg = "Zone names must be unique"
+            raise ValueError(msg)
+        shape = (len(self.zones), len(self.zones))
+        for key, matrix in matrices.items():
+            if len(key) != len(self.slice_cols) or matrix.shape != shape:
+                msg = f"Slice {key} does not match slice_cols {self.slice_cols} and shape {shape}"
+                raise ValueError(msg)
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pl.DataFrame,
+        orig_col: str,
+        dest_col: str,
+        weight_col: str | None = None,
+        slice_cols: Sequence[str] = (),
+        zones: Sequence | None = None,
+    ) -> "ODMatrices":
+        """Sum weighted trips into sparse OD matrices.
+
+        Args:
+            df: Survey records
+            orig_col: Origin zone column (e.g. survey_board_station, orig_taz)
+            dest_col: Destination zone column
+            weight_col: Trip weight column; None counts records
+            slice_cols: Columns whose value combinations get their own matrix
+            zones: Zone system, in matrix order; defaults to the sorted origin and
+                destination values. Records with other zones are dropped.
+
+        Returns:
+            ODMatrices with one matrix per slice value combination present in df
+        """
+        slice_cols = list(slice_cols)
+        weight = pl.lit(1.0) if weight_col is None else pl.col(weight_col).cast(pl.Float64)
+        trips = df.select(
+            pl.col(orig_col).alias(ORIG_COLUMN),
+            pl.col(dest_col).alias(DEST_COLUMN),
+            weight.alias(VALUE_COLUMN),
+            *slice_cols,
+        ).drop_nulls([ORIG_COLUMN, DEST_COLUMN, VALUE_COLUMN])
+
+        if zones is None:
+            zones = pl.concat([trips[ORIG_COLUMN], trips[DEST_COLUMN]]).unique().sort().to_list()
+        zones = list(zones)
+        n_zones = len(zones)
+
+        positions = range(n_zones)
+        trips = trips.with_columns(
+            pl.col(col).replace_strict(zones, positions, default=None, return_dtype=pl.Int64)
+            for col in (ORIG_COLUMN, DEST_COLUMN)
+        )
+        unknown = trips.filter(pl.col(ORIG_COLUMN).is_null() | pl.col(DEST_COLUMN).is_null())
+        if not unknown.is_empty():
+            logger.warning(
+                "Dropping %d trips (%.1f weighted) with zones outside the zone system",
+                unknown.height,
+                unknown[VALUE_COLUMN].sum(),
+            )
+            trips = trips.drop_nulls([ORIG_COLUMN, DEST_COLUMN])
+
+        # slice id per record; one (slices * zones, zones) matrix holds every slice
+        if slice_cols:
+            slices = trips.select(slice_cols).unique().sort(slice_cols, nulls_last=True)
+            trips = trips.join(
+                slices.with_row_index("slice_id"), on=slice_cols, how="left", nulls_equal=True
+            )
+            keys = list(slices.iter_rows())
+            slice_id = trips["slice_id"].to_numpy().astype(np.int64)
+        else:
+            keys = [()]
+            slice_id = np.zeros(trips.height, dtype=np.int64)
+
+        stacked = sparse.coo_matrix(
+            (
+                trips[VALUE_COLUMN].to_numpy(),
+                (slice_id * n_zones + trips[ORIG_COLUMN].to_numpy(), trips[DEST_COLUMN].to_numpy()),
+            ),
+            shape=(len(keys) * n_zones, n_zones),
+        ).tocsr()  # duplicate OD pairs are summed here
+        matrices = {key: stacked[i * n_zones : (i + 1) * n_zones] for i, key in enumerate(keys)}
+        logger.info(
+            "Built %d OD matrices over %d zones from %d trips (%d nonzero cells)",
+            len(matrices),
+            n_zones,
+            trips.height,
+            stacked.nnz,
+        )
+        slice_dtypes = {col: trips.schema[col] for col in slice_cols}
+        return cls(zones, slice_cols, matrices, slice_dtypes)
+
+    def select(self, **criteria: object) -> sparse.csr_matrix:
+        """Sum the matrices of the slices matching all criteria.
+
+        Args:
+            **criteria: Slice column -> value or list of values; columns left out
+                are summed over, so select() is the total matrix
+
+        Returns:
+            CSR matrix of shape (len(zones), len(zones))
+
+        Raises:
+            ValueError: If a criterion is not a slice column
+        """
+        unknown = [col for col in criteria if col not in self.slice_cols]
+        if unknown:
+            msg = f"Unknown slice columns {unknown}. Expected some of {self.slice_cols}"
+            raise ValueError(msg)
+        wanted = {
+            self.slice_cols.index(col): set(value)
+            if isinstance(value, list | tuple | set)
+            else {value}
+            for col, value in criteria.items()
+        }
+        total = sparse.csr_matrix((len(self.zones), len(self.zones)))
+        for key, matrix in self.matrices.items():
+            if all(key[i] in values for i, values in wanted.items()):
+                total = total + matrix
+        return total
+
+    def to_frame(self) -> pl.DataFrame:
+        """Return the nonzero cells in long form: slice columns, orig, dest, trips."""
+        zones = pl.Series(self.zones)
+        frames = []
+        for key, matrix in self.matrices.items():
+            cells = matrix.tocoo()
+            frames.append(
+                pl.DataFrame(
+                    {
+                        **{
+                            col: [value] * cells.nnz
+                            for col, value in zip(self.slice_cols, key, strict=True)
+                        },
+                        ORIG_COLUMN: zones.gather(cells.row),
+                        DEST_COLUMN: zones.gather(cells.col),
+                        VALUE_COLUMN: cells.data,
+                    }
+                )
+            )
+        if not frames:
+            # built from zero trips with slice_cols: no slices, no cells
+            return pl.DataFrame(
+                schema={
+                    **{col: self.slice_dtypes.get(col, pl.Null) for col in self.slice_cols},
+                    ORIG_COLUMN: zones.dtype,
+                    DEST_COLUMN: zones.dtype,
+                    VALUE_COLUMN: pl.Float64,
+                }
+            )
+        return pl.concat(frames, how="vertical_relaxed")
+
+    def to_parquet(self, path: str | Path) -> None:
+        """Write the nonzero cells in long form (see to_frame)."""
+        self.to_frame().write_parquet(path)
+        logger.info("Wrote %d OD matrices to %s", len(self.matrices), path)
+
+    @classmethod
+    def from_parquet(
+        cls, path: str | Path, slice_cols: Sequence[str] = (), zones: Sequence | None = None
+    ) -> "ODMatrices":
+        """Read matrices written by to_parquet (zones default to those with trips)."""
+        return cls.from_frame(
+            pl.read_parquet(path), ORIG_COLUMN, DEST_COLUMN, VALUE_COLUMN, slice_cols, zones
+        )
+
+    def to_omx(self, path: str | Path, mapping: str = "zones") -> None:
+        """Write one OMX matrix per slice, named by its slice values joined with "_".
+
+        OMX stores dense arrays, so this suits station and TAP systems; keep
+        TAZ x TAZ tables in Parquet. Requires the openmatrix package.
+        """
+        import openmatrix as omx  # only needed for OMX export
+
+        with omx.open_file(str(path), "w") as omx_file:
+            for key, matrix in self.matrices.items():
+                name = "_".join(str(value) for value in key) or VALUE_COLUMN
+                omx_file[name] = matrix.toarray()
+            omx_file.create_mapping(mapping, self.zones)
+        logger.info("Wrote %d OD matrices to %s", len(self.matrices), path)
+
+
+def main() -> None:
+    """Build OD matrices from a survey file."""
+    parser = argparse.ArgumentParser(description="Build sparse OD matrices of weighted trips")
+    parser.add_argument("survey", type=Path, help="Survey CSV or Parquet")
+    parser.add_argument("--orig-col", required=True, help="e.g. survey_board_station")
+    parser.add_argument("--dest-col", required=True, help="e.g. survey_alight_station")
+    parser.add_argument("--weight-col", help="e.g. trip_weight (default: count records)")
+    parser.add_argument("--slice-cols", nargs="*", default=[], help="e.g. time_period")
+    parser.add_argument("--output", type=Path, required=True, help=".parquet or .omx")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    columns = [args.orig_col, args.dest_col, *args.slice_cols]
+    columns += [args.weight_col] if args.weight_col else []
+    if args.survey.suffix == ".parquet":
+        survey_df = pl.read_parquet(args.survey, columns=columns)
+    else:
+        survey_df = pl.read_csv(args.survey, columns=columns, infer_schema_length=None)
+    od = ODMatrices.from_frame(
+        survey_df, args.orig_col, args.dest_col, args.weight_col, args.slice_cols
+    )
+    if args.output.suffix == ".omx":
+        od.to_omx(args.output)
+    else:
+        od.to_parquet(args.output)
+
+
+if __name__ == "__main__":
+    main()
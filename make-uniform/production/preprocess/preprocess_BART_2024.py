@@ -8,11 +8,27 @@ Uses Polars for efficient data processing.
 
 import logging
 import sys
+from functools import partial
 from pathlib import Path
 
 import geopandas as gpd
 import polars as pl
-from rapidfuzz import fuzz
+
+import codebook as codebook_module
+import recode_engine
+import station_matcher
+import stop_gazetteer
+from build_cache import StageCache
+from cache_utils import sidecar_path
+from codebook import DEFAULT_CODEBOOK_COLUMNS, Codebook, fill_merged_cells
+from dictionary_store import DICTIONARY_PATH, DictionaryStore
+from excel_cache import read_excel_sheet, scan_excel_sheet
+from recode_engine import RecodeEngine
+from standard_dictionary import StandardDictionary
+from station_matcher import StationMatcher
+from string_sanitizer import LINE_BREAKS, sanitize_expr
+from stop_gazetteer import ensure_gazetteer, load_operator_stops
+from survey_store import STORE_DIR, write_survey
 
 logger = logging.getLogger(__name__)
 
@@ -61,27 +77,58 @@ EXIT_STATION_FIELD = "EXIT_STATION_FINAL"
 TRIP_WEIGHT_FIELD = "combined_OD_weight_NEW"  # Trip weight
 BOARDING_WEIGHT_FIELD = "combined_entry_weight_NEW"  # Boarding weight
 
+# Run the pipeline as a single LazyFrame plan (scan cached sheet -> sink output)
+# instead of eagerly materializing every intermediate frame
+LAZY_PIPELINE = False
+# Skip the read/geocode/recode/weight stages whose inputs, code and constants are
+# unchanged since the last run (eager mode only; see build_cache)
+USE_STAGE_CACHE = True
+# Check the written output against util/standard_variable_dict.csv and log the
+# violations; set FAIL_ON_DICTIONARY_VIOLATIONS to stop the run on any violation
+CHECK_STANDARD_DICTIONARY = True
+FAIL_ON_DICTIONARY_VIOLATIONS = False
+# Also keep the preprocessed survey as Parquet (lazy mode always sinks the plan to
+# Parquet once and derives the other outputs from it, deleting it afterwards if False)
+WRITE_PARQUET = False
+# Store coded columns as Enum/Int8 with the standard dictionary's category sets
+# (eager mode only; the Parquet output keeps the types, the CSV is unchanged)
+COMPACT_CATEGORIES = True
+# Also write the survey into the partitioned Parquet store of all preprocessed
+# surveys (canonical_operator=/survey_year=, see survey_store)
+WRITE_SURVEY_STORE = True
+
+# Nested dtypes can't be written to CSV
+NON_CSV_DTYPES = (pl.List, pl.Array, pl.Struct, pl.Object)
+
+# Declarative recodes for access/egress and demographics
+RECODE_SPEC = Path(__file__).parent / "recodes_BART_2024.csv"
+RECODE_MAPPINGS = Path(__file__).parent / "recode_mappings.csv"
+
 # Home coordinate column names (already in survey)
 HOME_ADDRESS_LAT = "HOME_ADDRESS_LAT"
 HOME_ADDRESS_LONG = "HOME_ADDRESS_LONG"
 
 
 
-def geocode_stops_from_names(  # noqa: PLR0912, PLR0915, C901
-    survey_df: pl.DataFrame,
-    stops_gdf: gpd.GeoDataFrame,
+def geocode_stops_from_names(
+    survey_df: pl.DataFrame | pl.LazyFrame,
+    stops_gdf: gpd.GeoDataFrame | pl.DataFrame,
     station_columns: dict[str, dict[str, str]],
     operator_names: list[str],
     stop_name_field: str,
     agency_field: str,
     fuzzy_threshold: int = 90,
     station_aliases: dict[str, str] | None = None,
-) -> pl.DataFrame:
+) -> pl.DataFrame | pl.LazyFrame:
     """Geocode decoded station names to coordinates using fuzzy matching.
 
     Args:
-        survey_df: Survey DataFrame with decoded station name columns
-        stops_gdf: GeoDataFrame with stop locations (must have geometry)
+        survey_df: Survey DataFrame or LazyFrame with decoded station name columns.
+            For a LazyFrame only the unique station names are collected; the
+            geocoded columns are added to the plan.
+        stops_gdf: GeoDataFrame with stop locations (must have geometry), or an
+            operator slice from stop_gazetteer.load_operator_stops (already
+            filtered to the operator, so operator_names/agency_field are unused)
         station_columns: Maps input column -> output column names dict
             e.g., {
                 "entry_station_name": {
@@ -99,7 +146,8 @@ def geocode_stops_from_names(  # noqa: PLR0912, PLR0915, C901
         station_aliases: Optional dict of station name aliases for matching
 
     Returns:
-        Survey DataFrame with added columns as specified in station_columns
+        Survey frame (same type as survey_df) with added columns as specified
+        in station_columns
 
     Raises:
         ValueError: If no stops found for operator, or if unmatched stations exist
@@ -110,28 +158,17 @@ def geocode_stops_from_names(  # noqa: PLR0912, PLR0915, C901
         # Merge with common aliases
         station_aliases = {**COMMON_STATION_ALIASES, **station_aliases}
 
-    # Filter to operator's stops
-    search_pattern = "|".join(operator_names)
-    mask = stops_gdf[agency_field].str.contains(search_pattern, case=False, na=False, regex=True)
-    operator_stops = stops_gdf[mask].copy()
-
-    if len(operator_stops) == 0:
-        msg = f"No stops found for operator(s): {operator_names}"
-        raise ValueError(msg)
-
-    logger.info(
-        "Found %s stops for operator(s): %s", len(operator_stops), ", ".join(operator_names)
-    )
-
-    # Convert to WGS84 and extract coordinates
-    operator_stops = operator_stops.to_crs(epsg=4326)
-    operator_stops["_stop_lon"] = operator_stops.geometry.x
-    operator_stops["_stop_lat"] = operator_stops.geometry.y
-
-    # Validate required fields
-    if stop_name_field not in operator_stops.columns:
-        msg = f"stop_name_field '{stop_name_field}' not found in stops GeoDataFrame"
-        raise ValueError(msg)
+    # Filter to operator's stops and normalize the stop table once
+    if isinstance(stops_gdf, pl.DataFrame):
+        matcher = StationMatcher.from_gazetteer(stops_gdf, station_aliases=station_aliases)
+    else:
+        matcher = StationMatcher.from_geodataframe(
+            stops_gdf=stops_gdf,
+            operator_names=operator_names,
+            stop_name_field=stop_name_field,
+            agency_field=agency_field,
+            station_aliases=station_aliases,
+        )
 
     logger.info("Using stop name field: %s", stop_name_field)
 
@@ -142,7 +179,10 @@ def geocode_stops_from_names(  # noqa: PLR0912, PLR0915, C901
         logger.info("Processing station column: %s", station_col)
 
         # Get unique station names from survey
-        unique_stations = survey_df.select(pl.col(station_col)).unique().drop_nulls()
+        unique_stations = survey_df.lazy().select(pl.col(station_col)).unique().drop_nulls().collect()
+
+        # Score all unique names against all stops in one batched pass
+        matches = matcher.match(unique_stations.to_series().to_list())
 
         # Build lookup from survey name -> canonical name/coords
         name_to_canonical = {}
@@ -150,62 +190,32 @@ def geocode_stops_from_names(  # noqa: PLR0912, PLR0915, C901
         name_to_lon = {}
         unmatched_stations = []
 
-        for row in unique_stations.iter_rows(named=True):
-            survey_name = row[station_col]
-            if survey_name is None:
+        for row in matches.iter_rows(named=True):
+            survey_name = row["survey_name"]
+            survey_name_clean = survey_name.strip()
+            survey_name = station_aliases.get(survey_name_clean, survey_name)
+
+            if row["score"] < fuzzy_threshold:
+                logger.warning(
+                    "No match for '%s' (best: %s at %.1f%%)",
+                    survey_name,
+                    row["canonical_name"],
+                    row["score"],
+                )
+                unmatched_stations.append(survey_name)
                 continue
 
-            # Check aliases first
-            survey_name_clean = str(survey_name).strip()
-            if survey_name_clean in station_aliases:
-                survey_name = station_aliases[survey_name_clean]
-                logger.debug("Using alias: %s -> %s", survey_name_clean, survey_name)
-
-            # Try exact match (case-insensitive)
-            survey_name_upper = survey_name.upper()
-            exact_match = operator_stops[
-                operator_stops[stop_name_field].str.upper() == survey_name_upper
-            ]
+            if row["score"] < 100:  # noqa: PLR2004
+                logger.debug(
+                    "Fuzzy matched '%s' -> '%s' (%.1f%%)",
+                    survey_name,
+                    row["canonical_name"],
+                    row["score"],
+                )
 
-            if len(exact_match) > 0:
-                canonical = exact_match.iloc[0][stop_name_field]
-                lat = exact_match.iloc[0]["_stop_lat"]
-                lon = exact_match.iloc[0]["_stop_lon"]
-            else:
-                # Fuzzy match
-                best_match = None
-                best_score = 0
-                best_lat = None
-                best_lon = None
-                for _, stop_row in operator_stops.iterrows():
-                    canonical_name = stop_row[stop_name_field]
-                    score = fuzz.ratio(survey_name_upper, canonical_name.upper())
-                    if score > best_score:
-                        best_score = score
-                        best_match = canonical_name
-                        best_lat = stop_row["_stop_lat"]
-                        best_lon = stop_row["_stop_lon"]
-
-                if best_score >= fuzzy_threshold:
-                    canonical = best_match
-                    lat = best_lat
-                    lon = best_lon
-                    logger.debug(
-                        "Fuzzy matched '%s' -> '%s' (%.1f%%)", survey_name, canonical, best_score
-                    )
-                else:
-                    logger.warning(
-                        "No match for '%s' (best: %s at %.1f%%)",
-                        survey_name,
-                        best_match,
-                        best_score,
-                    )
-                    unmatched_stations.append(survey_name)
-                    continue
-
-            name_to_canonical[survey_name_clean] = canonical
-            name_to_lat[survey_name_clean] = lat
-            name_to_lon[survey_name_clean] = lon
+            name_to_canonical[survey_name_clean] = row["canonical_name"]
+            name_to_lat[survey_name_clean] = row["lat"]
+            name_to_lon[survey_name_clean] = row["lon"]
 
         match_rate = (
             len(name_to_canonical) / unique_stations.height * 100
@@ -285,274 +295,98 @@ def read_survey_excel(
     data_sheet: str = "data",
     codebook_sheet: str = "codebook",
     codebook_columns: list[str] | None = None,
-) -> tuple[pl.DataFrame, pl.DataFrame]:
+    columns: list[str] | None = None,
+    lazy: bool = False,
+) -> tuple[pl.DataFrame | pl.LazyFrame, pl.DataFrame]:
     """Read survey data and codebook from Excel file.
 
+    Both sheets are read through the Parquet cache in excel_cache, so only the
+    first run after the workbook changes parses the Excel file.
+
     Args:
         path: Path to Excel file
         data_sheet: Name of sheet containing survey data
         codebook_sheet: Name of sheet containing codebook
         codebook_columns: Column names for codebook. Defaults to
             ["field", "description", "value", "value_description"]
+        columns: Optional subset of data sheet columns to read (all if None)
+        lazy: Return the survey data as a LazyFrame over the cached sheet
 
     Returns:
-        Tuple of (survey_df, codebook_df)
+        Tuple of (survey_df, codebook_df); survey_df is a LazyFrame if lazy
 
     Note:
         Codebook is expected to have merged cells for field/description columns.
         This function forward-fills those columns to handle merged cells.
     """
     if codebook_columns is None:
-        codebook_columns = ["field", "description", "value", "value_description"]
+        codebook_columns = DEFAULT_CODEBOOK_COLUMNS
 
     path = Path(path)
     logger.info("Reading survey data from %s", path)
 
     # Read data sheet
-    survey_df = pl.read_excel(path, sheet_name=data_sheet, infer_schema_length=10000)
-    logger.info("Read %s records from data sheet", f"{len(survey_df):,}")
-    logger.info("Columns: %d", len(survey_df.columns))
+    if lazy:
+        survey_df = scan_excel_sheet(path, sheet_name=data_sheet, infer_schema_length=10000)
+        if columns is not None:
+            survey_df = survey_df.select(columns)
+        logger.info("Scanning data sheet lazily")
+    else:
+        survey_df = read_excel_sheet(
+            path, sheet_name=data_sheet, columns=columns, infer_schema_length=10000
+        )
+        logger.info("Read %s records from data sheet", f"{len(survey_df):,}")
+    logger.info("Columns: %d", len(survey_df.collect_schema()))
 
     # Read codebook sheet
-    codebook_df = pl.read_excel(path, sheet_name=codebook_sheet, has_header=False)
+    codebook_df = read_excel_sheet(path, sheet_name=codebook_sheet, has_header=False)
     codebook_df.columns = codebook_columns
 
     # Forward fill field and description columns to handle merged cells
     # (Excel merged cells only have value in first row)
-    codebook_df = codebook_df.with_columns(
-        [
-            pl.col("field").fill_null(strategy="forward"),
-            pl.col("description").fill_null(strategy="forward"),
-        ]
-    )
+    codebook_df = fill_merged_cells(codebook_df)
 
     logger.info("Read %s codebook entries", f"{len(codebook_df):,}")
 
     return survey_df, codebook_df
 
 
-def create_codebook_lookup(codebook_df: pl.DataFrame, field_name: str) -> dict:
-    """Create a lookup dictionary from codebook for a specific field.
+def process_recodes(
+    survey_df: pl.DataFrame | pl.LazyFrame, codebook: Codebook
+) -> pl.DataFrame | pl.LazyFrame:
+    """Recode access/egress modes and demographics in one lazy query.
 
-    Args:
-        codebook_df: Codebook DataFrame with columns 'field', 'value', 'value_description'
-        field_name: Name of field to create lookup for
-
-    Returns:
-        Dictionary mapping value -> value_description
+    Simple decodes and value maps come from the declarative spec in
+    RECODE_SPEC (see recode_engine); fields derived from several recoded
+    columns are added to the same query below. A DataFrame input is collected
+    once at the end; a LazyFrame input is returned as an extended plan.
     """
-    field_codes = codebook_df.filter(pl.col("field") == field_name)
-
-    if field_codes.height == 0:
-        return {}
-
-    # Create lookup: value -> value_description
-    lookup = dict(
-        zip(
-            field_codes.select("value").to_series().to_list(),
-            field_codes.select("value_description").to_series().to_list(),
-            strict=True,
-        )
-    )
-
-    return lookup
-
-
-def process_access_egress(bart_df: pl.DataFrame, codebook_df: pl.DataFrame) -> pl.DataFrame:
-    """Process and recode access and egress modes using codebook."""
-    logger.info("Processing access/egress modes")
-
-    # Standard recoding for typical access/egress values
-    # This is a fallback - actual codes should come from codebook
-    standard_recode = {
-        1: "walk",
-        2: "bike",
-        3: "pnr",  # drive alone/park and ride
-        4: "knr",  # dropped off
-        5: "local bus",
-        6: "express bus",
-        7: "light rail",
-        8: "heavy rail",
-        9: "commuter rail",
-        10: "ferry",
-        11: "taxi",
-        12: "tnc",  # uber/lyft
-        13: "other",
+    logger.info("Processing access/egress modes and demographics")
+
+    # Age categories -> approximate birth year (midpoints), relative to the survey year
+    # This mapping needs to be customized based on actual categories
+    age_to_birth_year = {
+        1: SURVEY_YEAR - 20,
+        2: SURVEY_YEAR - 30,
+        3: SURVEY_YEAR - 40,
+        4: SURVEY_YEAR - 50,
+        5: SURVEY_YEAR - 60,
+        6: SURVEY_YEAR - 70,
     }
+    engine = RecodeEngine.from_csv(
+        RECODE_SPEC,
+        codebook,
+        mappings_path=RECODE_MAPPINGS,
+        mappings={"age_to_birth_year": age_to_birth_year},
+    )
+    recoded_lf = engine.apply(survey_df.lazy())
 
-    # Find access/egress columns
-    access_cols = [col for col in bart_df.columns if "access" in col.lower()]
-    egress_cols = [col for col in bart_df.columns if "egress" in col.lower()]
-
-    logger.info("Found access columns: %s", access_cols)
-    logger.info("Found egress columns: %s", egress_cols)
-
-    # Process access columns
-    for col in access_cols:
-        # Try to get codebook mapping
-        codebook_lookup = create_codebook_lookup(codebook_df, col)
-
-        if codebook_lookup:
-            logger.info("Using codebook for %s", col)
-            bart_df = bart_df.with_columns(
-                [pl.col(col).replace(codebook_lookup, default=None).alias(f"{col}_mode")]
-            )
-        else:
-            logger.info("Using standard recode for %s", col)
-            bart_df = bart_df.with_columns(
-                [pl.col(col).replace(standard_recode, default=None).alias(f"{col}_mode")]
-            )
-
-    # Process egress columns
-    for col in egress_cols:
-        codebook_lookup = create_codebook_lookup(codebook_df, col)
-
-        if codebook_lookup:
-            logger.info("Using codebook for %s", col)
-            bart_df = bart_df.with_columns(
-                [pl.col(col).replace(codebook_lookup, default=None).alias(f"{col}_mode")]
-            )
-        else:
-            logger.info("Using standard recode for %s", col)
-            bart_df = bart_df.with_columns(
-                [pl.col(col).replace(standard_recode, default=None).alias(f"{col}_mode")]
-            )
-
-    # Add standard access_mode and egress_mode fields expected by R script
-    # Use the first processed access/egress column if available, otherwise null
-    logger.info("Adding access_mode and egress_mode fields")
-    if access_cols:
-        primary_access_col = f"{access_cols[0]}_mode"
-        bart_df = bart_df.with_columns([pl.col(primary_access_col).alias("access_mode")])
-    else:
-        bart_df = bart_df.with_columns([pl.lit(None).cast(pl.Utf8).alias("access_mode")])
-
-    if egress_cols:
-        primary_egress_col = f"{egress_cols[0]}_mode"
-        bart_df = bart_df.with_columns([pl.col(primary_egress_col).alias("egress_mode")])
-    else:
-        bart_df = bart_df.with_columns([pl.lit(None).cast(pl.Utf8).alias("egress_mode")])
-
-    return bart_df
-
-
-def process_demographics(  # noqa: PLR0912, PLR0915
-    survey_df: pl.DataFrame, codebook_df: pl.DataFrame
-) -> pl.DataFrame:
-    """Process demographic fields: race, age, language, gender using codebook."""
-    logger.info("Processing demographics")
-
-    # Race - look for race columns and decode using codebook
-    race_cols = [col for col in survey_df.columns if "race" in col.lower()]
-    logger.info("Found race columns: %s", race_cols)
-    for col in race_cols:
-        race_lookup = create_codebook_lookup(codebook_df, col)
-        if race_lookup:
-            survey_df = survey_df.with_columns(
-                [pl.col(col).replace_strict(race_lookup, default=None, return_dtype=pl.Utf8)]
-            )
-
-    # Hispanic - look for hispanic/latino column and decode
-    hispanic_cols = [
-        col for col in survey_df.columns if "hisp" in col.lower() or "latin" in col.lower()
-    ]
-    if hispanic_cols:
-        logger.info("Found hispanic column: %s", hispanic_cols[0])
-        hispanic_lookup = create_codebook_lookup(codebook_df, hispanic_cols[0])
-        if hispanic_lookup:
-            # Decode first
-            survey_df = survey_df.with_columns(
-                [
-                    pl.col(hispanic_cols[0])
-                    .replace_strict(hispanic_lookup, default=None, return_dtype=pl.Utf8)
-                    .alias("hispanic_decoded")
-                ]
-            )
-            # Then create binary: any non-null value means Hispanic
-            survey_df = survey_df.with_columns(
-                [
-                    pl.when(pl.col("hispanic_decoded").is_not_null())
-                    .then(pl.lit(1))
-                    .otherwise(pl.lit(0))
-                    .alias("hispanic")
-                ]
-            )
-            survey_df = survey_df.drop("hispanic_decoded")
-        else:
-            # No codebook, assume it's already binary
-            survey_df = survey_df.with_columns(
-                [
-                    pl.when(pl.col(hispanic_cols[0]).is_not_null())
-                    .then(pl.lit(1))
-                    .otherwise(pl.lit(0))
-                    .alias("hispanic")
-                ]
-            )
-
-    # Age - look for age or birth year columns and decode
-    age_cols = [
-        col
-        for col in survey_df.columns
-        if "age" in col.lower() or "birth" in col.lower() or "born" in col.lower()
-    ]
-    logger.info("Found age columns: %s", age_cols)
-
-    if age_cols:
-        # If we have birth year, use it directly
-        birth_year_cols = [
-            col for col in age_cols if "birth" in col.lower() or "born" in col.lower()
-        ]
-        if birth_year_cols:
-            logger.info("Using birth year column: %s", birth_year_cols[0])
-            survey_df = survey_df.with_columns(
-                [pl.col(birth_year_cols[0]).alias("year_born_four_digit")]
-            )
-        else:
-            # If we have age categories, map to approximate birth year
-            logger.info("Converting age categories to year_born")
-            # This mapping needs to be customized based on actual categories
-            age_to_birth_year = {
-                1: SURVEY_YEAR - 20,  # Approximate midpoint
-                2: SURVEY_YEAR - 30,
-                3: SURVEY_YEAR - 40,
-                4: SURVEY_YEAR - 50,
-                5: SURVEY_YEAR - 60,
-                6: SURVEY_YEAR - 70,
-            }
-            survey_df = survey_df.with_columns(
-                [
-                    pl.col(age_cols[0])
-                    .replace_strict(age_to_birth_year, default=None, return_dtype=pl.Int64)
-                    .alias("year_born_four_digit")
-                ]
-            )
-
-    # Language - decode using codebook, then create binary
-    lang_cols = [
-        col for col in survey_df.columns if "language" in col.lower() or "lang" in col.lower()
-    ]
-    # Filter out survey_language columns
-    lang_cols = [col for col in lang_cols if "survey" not in col.lower()]
-    logger.info("Found language columns: %s", lang_cols)
-
-    # Decode PRIMARY_LANGUAGE1_FINAL using codebook for language_at_home_detail
-    lang_lookup = create_codebook_lookup(codebook_df, "PRIMARY_LANGUAGE1_FINAL")
-    if lang_lookup:
-        survey_df = survey_df.with_columns(
-            [
-                pl.col("PRIMARY_LANGUAGE1_FINAL")
-                .replace_strict(lang_lookup, default=None, return_dtype=pl.Utf8)
-                .alias("language_at_home_detail")
-            ]
-        )
-    else:
-        survey_df = survey_df.with_columns(
-            [pl.lit(None).cast(pl.Utf8).alias("language_at_home_detail")]
-        )
+    # Race dummy variable (1 if any race field is populated, after decoding)
+    race_cols = [col for col in recoded_lf.collect_schema().names() if "RACE_" in col]
 
-    # Create language_at_home_binary (English only vs Other)
-    survey_df = survey_df.with_columns(
+    recoded_lf = recoded_lf.with_columns(
         [
+            # language_at_home_binary (English only vs Other)
             pl.when(pl.col("language_at_home_detail").str.to_lowercase().str.contains("english"))
             .then(pl.lit("ENGLISH ONLY"))
             .when(pl.col("language_at_home_detail").is_not_null())
@@ -560,75 +394,20 @@ def process_demographics(  # noqa: PLR0912, PLR0915
             .otherwise(None)
             .alias("language_at_home_binary"),
             pl.lit(None).cast(pl.Utf8).alias("language_at_home_detail_other"),
-        ]
-    )
-
-    # Gender - decode using codebook
-    gender_cols = [
-        col for col in survey_df.columns if "gender" in col.lower() or "sex" in col.lower()
-    ]
-    if gender_cols:
-        logger.info("Found gender column: %s", gender_cols[0])
-        gender_lookup = create_codebook_lookup(codebook_df, gender_cols[0])
-        if gender_lookup:
-            survey_df = survey_df.with_columns(
-                [
-                    pl.col(gender_cols[0])
-                    .replace_strict(gender_lookup, default=None, return_dtype=pl.Utf8)
-                    .alias("gender")
-                ]
-            )
-        else:
-            # No codebook, use as-is
-            survey_df = survey_df.with_columns([pl.col(gender_cols[0]).alias("gender")])
-
-    # Add race dummy variable (1 if any race field is populated)
-    logger.info("Adding race_dmy_ind field")
-    race_cols = [col for col in survey_df.columns if "RACE_" in col]
-    survey_df = survey_df.with_columns(
-        [
             pl.when(pl.any_horizontal([pl.col(c).is_not_null() for c in race_cols]))
             .then(pl.lit(1))
             .otherwise(pl.lit(0))
-            .alias("race_dmy_ind")
-        ]
-    )
-
-    # Add individual race dummy variables (1 if that specific race is marked)
-    logger.info("Adding individual race dummy variables")
-
-    # Map SingleRaceCode to race_cat (SingleRaceCode is already text)
-    race_cat_mapping = {
-        "American Indian, non-Hispanic": "NATIVE AMERICAN",
-        "Asian or Pac Islander, non-Hispanic": "ASIAN",
-        "African American, non-Hispanic": "BLACK",
-        "White or MENA, non-Hispanic": "WHITE",
-        "Hispanic, any race": "HISPANIC",
-        "Multi-racial, non-Hispanic": "OTHER",
-        "No response": None,
-        "Other, non-Hispanic": "OTHER",
-    }
-
-    survey_df = survey_df.with_columns(
-        [
-            pl.col("RACE_1_AmIndian").fill_null(0).cast(pl.Int8).alias("race_dmy_amind"),
-            pl.col("RACE_2_Asian").fill_null(0).cast(pl.Int8).alias("race_dmy_asn"),
-            pl.col("RACE_3_AfrAm").fill_null(0).cast(pl.Int8).alias("race_dmy_blk"),
-            pl.col("RACE_4_PI").fill_null(0).cast(pl.Int8).alias("race_dmy_pacisl"),
-            pl.col("RACE_5_White").fill_null(0).cast(pl.Int8).alias("race_dmy_wht"),
-            pl.col("RACE_6_Hispanic").fill_null(0).cast(pl.Int8).alias("race_dmy_hisp"),
-            pl.col("RACE_98_Other").fill_null(0).cast(pl.Int8).alias("race_dmy_othr"),
+            .alias("race_dmy_ind"),
             pl.lit(0).cast(pl.Int8).alias("race_dmy_hwi"),  # Hawaiian not in BART 2024
             pl.lit(0).cast(pl.Int8).alias("race_dmy_mdl_estn"),  # Middle Eastern not in BART 2024
-            pl.col("SingleRaceCode").replace(race_cat_mapping, default=None).alias("race_cat"),
-            pl.col("RACE_OTHER").alias("race_other_string"),
         ]
     )
+    return recoded_lf if isinstance(survey_df, pl.LazyFrame) else recoded_lf.collect()
 
-    return survey_df
 
-
-def process_trip_characteristics(bart_df: pl.DataFrame, _codebook_df: pl.DataFrame) -> pl.DataFrame:
+def process_trip_characteristics(
+    bart_df: pl.DataFrame | pl.LazyFrame, _codebook: Codebook
+) -> pl.DataFrame | pl.LazyFrame:
     """Process trip characteristics: origin/destination purposes, transfers, etc."""
     logger.info("Processing trip characteristics")
 
@@ -766,7 +545,7 @@ def process_trip_characteristics(bart_df: pl.DataFrame, _codebook_df: pl.DataFra
     )
 
     # Transfers
-    transfer_cols = [col for col in bart_df.columns if "transfer" in col.lower()]
+    transfer_cols = [col for col in bart_df.collect_schema().names() if "transfer" in col.lower()]
     logger.info("Found transfer columns: %s", transfer_cols)
 
     # Create date_string from DATE_COMPLETED (modeling) or DATE_STARTED_SAS (SAS)
@@ -863,36 +642,28 @@ def process_trip_characteristics(bart_df: pl.DataFrame, _codebook_df: pl.DataFra
     return bart_df
 
 
-
-def main() -> None:  # noqa: PLR0915
-    """Main preprocessing pipeline."""
-    setup_logging()
-
-    logger.info("=" * 80)
-    logger.info("BART 2024 Preprocessing Pipeline")
-    logger.info("=" * 80)
-    # Read data
-    survey_df, codebook_df = read_survey_excel(SURVEY_PATH)
-
-    logger.info("\nInitial data shape: %s", survey_df.shape)
-    logger.info("Initial columns: %s", len(survey_df.columns))
-
-    logger.info("Loading station GeoJSON")
-    stations_gdf = gpd.read_file(STATION_GEOJSON)
+def add_station_locations(
+    survey_df: pl.DataFrame | pl.LazyFrame, codebook: Codebook
+) -> pl.DataFrame | pl.LazyFrame:
+    """Decode and geocode entry/exit stations and add the home location columns."""
+    logger.info("Loading operator stops from station gazetteer")
+    operator_stops = load_operator_stops(
+        STATION_GEOJSON,
+        operator_names=OPERATOR_NAMES,
+        stop_name_field=STOP_NAME_FIELD,
+        agency_field=AGENCY_FIELD,
+    )
 
     # Decode station codes to names using codebook
     logger.info("Decoding station codes to names")
-    entry_lookup = create_codebook_lookup(codebook_df, ENTRY_STATION_FIELD)
-    exit_lookup = create_codebook_lookup(codebook_df, EXIT_STATION_FIELD)
-
     survey_df = survey_df.with_columns(
         [
-            pl.col(ENTRY_STATION_FIELD)
-            .replace_strict(entry_lookup, default=None, return_dtype=pl.Utf8)
-            .alias("entry_station_name"),
-            pl.col(EXIT_STATION_FIELD)
-            .replace_strict(exit_lookup, default=None, return_dtype=pl.Utf8)
-            .alias("exit_station_name"),
+            codebook.decode_expr(
+                ENTRY_STATION_FIELD, alias="entry_station_name", return_dtype=pl.Utf8
+            ),
+            codebook.decode_expr(
+                EXIT_STATION_FIELD, alias="exit_station_name", return_dtype=pl.Utf8
+            ),
         ]
     )
 
@@ -900,7 +671,7 @@ def main() -> None:  # noqa: PLR0915
     logger.info("Geocoding stations")
     survey_df = geocode_stops_from_names(
         survey_df=survey_df,
-        stops_gdf=stations_gdf,
+        stops_gdf=operator_stops,
         station_columns={
             "entry_station_name": {
                 "station": "survey_board_station",
@@ -930,7 +701,7 @@ def main() -> None:  # noqa: PLR0915
         }
     )
     # Add geo_level for home locations
-    survey_df = survey_df.with_columns(
+    return survey_df.with_columns(
         [
             pl.when(pl.col("home_lat").is_not_null())
             .then(pl.lit("address"))
@@ -939,14 +710,99 @@ def main() -> None:  # noqa: PLR0915
         ]
     )
 
-    # Process access/egress
-    survey_df = process_access_egress(survey_df, codebook_df)
 
-    # Process demographics
-    survey_df = process_demographics(survey_df, codebook_df)
+def validate_output_schema(schema: pl.Schema) -> None:
+    """Check that the output schema can be written to CSV for the R pipeline.
+
+    Runs on the in-memory (or lazy plan) schema instead of re-reading the CSV.
+
+    Raises:
+        ValueError: If required columns are missing or a column has a nested dtype
+    """
+    required = ["ID", "canonical_operator", "survey_tech", "survey_year", "weight", "trip_weight"]
+    missing = [col for col in required if col not in schema]
+    if missing:
+        msg = f"Output is missing required columns: {missing}"
+        raise ValueError(msg)
+
+    nested = [f"{col} ({dtype})" for col, dtype in schema.items() if isinstance(dtype, NON_CSV_DTYPES)]
+    if nested:
+        msg = f"Output columns can't be written to CSV: {', '.join(nested)}"
+        raise ValueError(msg)
+
 
-    # Process trip characteristics
-    survey_df = process_trip_characteristics(survey_df, codebook_df)
+def main(lazy: bool = LAZY_PIPELINE) -> None:  # noqa: PLR0915
+    """Main preprocessing pipeline.
+
+    Args:
+        lazy: Build the whole pipeline as one LazyFrame plan and stream it to the
+            output with sink_csv/sink_parquet, so only columns that reach the
+            output are materialized
+    """
+    setup_logging()
+
+    logger.info("=" * 80)
+    logger.info("BART 2024 Preprocessing Pipeline")
+    logger.info("=" * 80)
+    # Stages are cached by content (inputs, code, constants) in eager mode;
+    # the lazy pipeline is a single plan and always runs end to end
+    cache = StageCache("BART_2024", enabled=USE_STAGE_CACHE and not lazy)
+
+    # Read data
+    survey_lf, codebook_df = read_survey_excel(SURVEY_PATH, lazy=True)
+    codebook = Codebook(codebook_df)
+    survey_df = (
+        survey_lf
+        if lazy
+        else cache.stage("read", survey_lf.collect, files=[SURVEY_PATH], code=[read_survey_excel])
+    )
+
+    if not lazy:
+        logger.info("\nInitial data shape: %s", survey_df.shape)
+    logger.info("Initial columns: %s", len(survey_df.collect_schema()))
+
+    # Geocode stations and add home locations. The stage is keyed on the stop
+    # gazetteer's sidecar (the GeoJSON fingerprint), so it also runs offline
+    # from the local gazetteer cache when the network share is unreachable
+    gazetteer = ensure_gazetteer(STATION_GEOJSON, STOP_NAME_FIELD, AGENCY_FIELD)
+    survey_df = cache.stage(
+        "geocode",
+        partial(add_station_locations, survey_df, codebook),
+        files=[sidecar_path(gazetteer)],
+        code=[
+            add_station_locations,
+            geocode_stops_from_names,
+            station_matcher,
+            stop_gazetteer,
+            codebook_module,
+        ],
+        params={
+            "operator_names": OPERATOR_NAMES,
+            "stop_name_field": STOP_NAME_FIELD,
+            "agency_field": AGENCY_FIELD,
+            "fuzzy_threshold": FUZZY_MATCH_THRESHOLD,
+            "station_aliases": COMMON_STATION_ALIASES,
+            "station_fields": [ENTRY_STATION_FIELD, EXIT_STATION_FIELD],
+            "home_fields": [HOME_ADDRESS_LAT, HOME_ADDRESS_LONG],
+        },
+    )
+
+    # Process access/egress and demographics
+    survey_df = cache.stage(
+        "recode",
+        partial(process_recodes, survey_df, codebook),
+        files=[RECODE_SPEC, RECODE_MAPPINGS],
+        code=[process_recodes, recode_engine, codebook_module],
+        params={"survey_year": SURVEY_YEAR},
+    )
+
+    # Process trip characteristics and weights
+    survey_df = cache.stage(
+        "weight",
+        partial(process_trip_characteristics, survey_df, codebook),
+        code=[process_trip_characteristics],
+        params={"trip_weight": TRIP_WEIGHT_FIELD, "boarding_weight": BOARDING_WEIGHT_FIELD},
+    )
 
     # Add metadata
     logger.info("Adding metadata columns")
@@ -1007,24 +863,61 @@ def main() -> None:  # noqa: PLR0915
         output_dir.mkdir(parents=True, exist_ok=True)
 
     # Sanitize the comment field to remove bad characters
-    survey_df = survey_df.with_columns(
-        pl.col("COMMENT")
-        .cast(pl.Utf8)
-        .str.replace_all("\x00", "")
-        .str.replace_all("\r\n", "\n")
-        .str.replace_all("\r", "\n")
-        .str.replace_all("\n", r"\n")
-    )
+    survey_df = survey_df.with_columns(sanitize_expr(pl.col("COMMENT"), LINE_BREAKS))
 
     # Move COMMENT to the end to keep CSV slightly neater
-    if "COMMENT" in survey_df.columns:
-        cols = [col for col in survey_df.columns if col != "COMMENT"] + ["COMMENT"]
+    output_columns = survey_df.collect_schema().names()
+    if "COMMENT" in output_columns:
+        cols = [col for col in output_columns if col != "COMMENT"] + ["COMMENT"]
         survey_df = survey_df.select(cols)
 
+    # Validate on the schema instead of re-reading the written CSV
+    output_schema = survey_df.collect_schema()
+    validate_output_schema(output_schema)
+
+    dictionary = StandardDictionary.from_csv()
+    if COMPACT_CATEGORIES and not lazy:
+        survey_df = dictionary.apply_category_schema(survey_df)
+
     # Write output
     output_file = output_dir / "BART_2024_preprocessed.csv"
+    parquet_file = output_file.with_suffix(".parquet")
     logger.info("\nWriting output to %s", output_file)
-    survey_df.write_csv(output_file, line_terminator="\n", quote_style="necessary")
+    if lazy:
+        # run the plan once into Parquet; the CSV, record count, store and
+        # dictionary check all read that file instead of re-running the plan
+        logger.info("Writing output to %s", parquet_file)
+        survey_df.sink_parquet(parquet_file)
+        output_lf = pl.scan_parquet(parquet_file)
+        output_lf.sink_csv(output_file, line_terminator="\n", quote_style="necessary")
+        n_records = output_lf.select(pl.len()).collect().item()
+    else:
+        survey_df.write_csv(output_file, line_terminator="\n", quote_style="necessary")
+        if WRITE_PARQUET:
+            logger.info("Writing output to %s", parquet_file)
+            survey_df.write_parquet(parquet_file)
+        n_records = survey_df.height
+        output_lf = survey_df.lazy()
+
+    if WRITE_SURVEY_STORE:
+        logger.info("Writing output to survey store %s", STORE_DIR)
+        write_survey(output_lf, f"{CANONICAL_OPERATOR}_{SURVEY_YEAR}", source=output_file)
+
+    # Check values as written, in one pass over the output file
+    if CHECK_STANDARD_DICTIONARY:
+        written_lf = output_lf if lazy else pl.scan_csv(output_file, infer_schema=False)
+        violations = dictionary.validate(written_lf)
+        if violations.is_empty():
+            logger.info("Output matches the standard variable dictionary")
+        else:
+            logger.warning(
+                "Output has %d standard dictionary violations:\n%s", violations.height, violations
+            )
+            if FAIL_ON_DICTIONARY_VIOLATIONS:
+                dictionary.raise_for_violations(violations, source=str(output_file))
+
+    if lazy and not WRITE_PARQUET:
+        parquet_file.unlink()
 
     # Prepare codebook for R Pipeline
     codebook_df_r = (
@@ -1070,19 +963,16 @@ def main() -> None:  # noqa: PLR0915
         output_dir / "BART_2024_codebook_for_R.csv", line_terminator="\n", quote_style="necessary"
     )
 
-    # Check that the CSV is written correctly
-    _ = pl.read_csv(output_file, infer_schema_length=10000)
-
-    logger.info("Wrote %s records with %s columns", f"{len(survey_df):,}", len(survey_df.columns))
+    logger.info("Wrote %s records with %s columns", f"{n_records:,}", len(output_schema))
 
     logger.info("\n=== Output Summary ===")
     logger.info("Output file: %s", output_file)
-    logger.info("Records: %s", f"{len(survey_df):,}")
-    logger.info("Columns: %s", len(survey_df.columns))
+    logger.info("Records: %s", f"{n_records:,}")
+    logger.info("Columns: %s", len(output_schema))
 
     # Log sample of key columns
     key_cols = ["ID", "canonical_operator", "survey_tech", "survey_year"]
-    key_cols = [col for col in key_cols if col in survey_df.columns]
+    key_cols = [col for col in key_cols if col in output_schema]
     logger.info("\nSample data (first 3 rows): %d columns shown", len(key_cols))
 
     logger.info("%s", "\n" + "=" * 80)
@@ -1096,63 +986,37 @@ def main() -> None:  # noqa: PLR0915
 def update_main_dictionary() -> None:
     """Update the main Dictionary_for_Standard_Database.csv with BART 2024 entries.
 
-    Removes any existing BART 2024 entries and appends current entries from
-    BART_2024_dictionary_mappings.csv to prevent duplicates.
+    Replaces any existing BART 2024 entries with the current entries from
+    BART_2024_dictionary_mappings.csv in one locked, atomic rewrite, so other
+    preprocessors can register their mappings at the same time.
     """
     logger.info("\n%s", "=" * 80)
     logger.info("Updating main dictionary file")
     logger.info("%s", "=" * 80)
 
-    # Paths
     bart_dict_path = Path(__file__).parent / "BART_2024_dictionary_mappings.csv"
-    main_dict_path = (
-        Path(__file__).parent.parent.parent.parent
-        / "archive"
-        / "make-uniform"
-        / "production"
-        / "Dictionary_for_Standard_Database.csv"
-    )
 
     if not bart_dict_path.exists():
         logger.error("BART dictionary file not found: %s", bart_dict_path)
         return
 
-    if not main_dict_path.exists():
-        logger.error("Main dictionary file not found: %s", main_dict_path)
+    if not DICTIONARY_PATH.exists():
+        logger.error("Main dictionary file not found: %s", DICTIONARY_PATH)
         return
 
-    # Read BART 2024 entries (skip header)
     logger.info("Reading BART 2024 entries from: %s", bart_dict_path)
-    bart_entries = bart_dict_path.read_text(encoding="utf-8").split("\n")
-    bart_data = [line for line in bart_entries[1:] if line.strip()]  # skip header
-    logger.info("Found %d BART 2024 entries", len(bart_data))
-
-    # Read main dictionary
-    logger.info("Reading main dictionary from: %s", main_dict_path)
-    main_content = main_dict_path.read_text(encoding="utf-8").strip().split("\n")
-    header = main_content[0]
-    main_data = main_content[1:]
-
-    # Remove existing BART 2024 entries (keep only non-empty, non-BART 2024 lines)
-    original_count = len([line for line in main_data if line.strip()])
-    main_data_filtered = [
-        line for line in main_data if line.strip() and not line.startswith("BART,2024,")
-    ]
-    filtered_count = len(main_data_filtered)
-    removed_count = original_count - filtered_count
-    logger.info("Removed %d existing BART 2024 entries", removed_count)
-
-    # Combine: header + filtered main data + BART 2024 entries
-    updated_content = [header, *main_data_filtered, *bart_data]
-
-    # Write back with single newline at end
-    main_dict_path.write_text("\n".join(updated_content) + "\n", encoding="utf-8")
-
-    final_count = len([line for line in updated_content[1:] if line.strip()])
+    bart_mappings = pl.read_csv(bart_dict_path, infer_schema=False)
+    logger.info("Found %d BART 2024 entries", bart_mappings.height)
+
+    store = DictionaryStore(DICTIONARY_PATH)
+    updated = store.upsert(bart_mappings, replace_surveys=True)
+
     logger.info(
-        "Updated main dictionary: %d total entries (%d BART 2024)", final_count, len(bart_data)
+        "Updated main dictionary: %d total entries (%d BART 2024)",
+        updated.height,
+        store.survey("BART", SURVEY_YEAR).height,
     )
-    logger.info("Main dictionary updated: %s", main_dict_path)
+    logger.info("Main dictionary updated: %s", DICTIONARY_PATH)
 
 
 if __name__ == "__main__":
@@ -3,10 +3,21 @@
 #
 import pathlib
 import pandas as pd
-import geopandas as gpd
+
+from centroid_lookup import zip_to_latlon
+from ridership_weights import expansion_factors
+from standard_dictionary import StandardDictionary
+from survey_store import from_pandas, write_survey
 
 pd.options.display.max_rows = 999
 
+# Also write the survey into the partitioned Parquet store of all preprocessed
+# surveys (canonical_operator=/survey_year=, see survey_store)
+WRITE_SURVEY_STORE = True
+
+# Store coded columns as Enum/Int8 in the survey store (see standard_dictionary)
+COMPACT_CATEGORIES = True
+
 # See notes_ACE_2023.csv
 KEEP_COLUMNS = [
     # 01 Geocoded Location Data
@@ -117,39 +128,10 @@ ACE_data_df["survey_time_estimate"] = ACE_data_df["survey_time_estimate"].apply(
 # 0. Convert from float to int then to string, then pad with leading zeros if needed
 ACE_data_df["home_zip"] = ACE_data_df["home_zip"].fillna(0).astype(int).astype(str).str.zfill(5)
 
-# 1. Load ZIP Code shapefile (ZCTAs)
-zcta_gdf = gpd.read_file("M:/Data/Census/Geography/2020_ZCTAs/2020_ZCTAs.shp")
-
-# 2. Ensure GEOID is treated as string
-zcta_gdf["ZCTA"] = zcta_gdf["GEOID"].astype(str)
-
-# 3. Reproject to a projected CRS for accurate centroid calculation
-zcta_gdf = zcta_gdf.to_crs(epsg=26910)
-
-# 4. Replace geometry with centroids (in projected CRS)
-zcta_gdf = zcta_gdf.copy()
-zcta_gdf["geometry"] = zcta_gdf.geometry.centroid
-
-# 5. Reproject centroids to lat/lon
-zcta_gdf = zcta_gdf.to_crs(epsg=4326)
-
-# 6. Extract lon/lat
-zcta_gdf["home_lon"] = zcta_gdf.geometry.x
-zcta_gdf["home_lat"] = zcta_gdf.geometry.y
-
-# 7. Create ZIP-to-centroid lookup table
-zcta_centroids = zcta_gdf[["ZCTA", "home_lat", "home_lon"]]
-
-# 8. Merge with centroid data
-ACE_data_df = ACE_data_df.merge(
-    zcta_centroids,
-    how="left",
-    left_on="home_zip",
-    right_on="ZCTA"
-)
-
-# 9. Drop extra column
-ACE_data_df.drop(columns=["ZCTA"], inplace=True)
+# 1. Look up 2020 Census ZCTA centroids (see centroid_lookup.py)
+home_coords = zip_to_latlon(ACE_data_df["home_zip"])
+ACE_data_df["home_lat"] = home_coords["lat"]
+ACE_data_df["home_lon"] = home_coords["lon"]
 
 # Expand the data to April 2023 monthly ridership using the existing "weight" variable for naive weight correction
 # Load csv with monthly ridership data
@@ -163,8 +145,7 @@ apr_value_2023 = ridership_data.loc[ridership_data['Fiscal_Year'] == 2023, 'APR'
 # Calculate average daily from monthly ridership total, prepare to distribute naive weight over all records
 
 days = 20 # There were 20 weekdays in April 2023 and there is currently no weekend service for ACE
-num_records = len(ACE_data_df)
-naive_weight = (apr_value_2023 / days) / num_records
+naive_weight = expansion_factors(ACE_data_df, control_total=apr_value_2023 / days)
 
 # Rename existing "weight" variable from consultant to "initial_weight"
 
@@ -181,3 +162,10 @@ ACE_data_df[KEEP_COLUMNS].to_csv(ACE_csv, index=False)
 print(f"ACE_data_df[KEEP_COLUMNS].head()=\n{ACE_data_df[KEEP_COLUMNS].head()}")
 print(f"Saved {ACE_csv}")
 
+# and to the partitioned Parquet store of all preprocessed surveys
+if WRITE_SURVEY_STORE:
+    ACE_store_df = from_pandas(ACE_data_df[KEEP_COLUMNS])
+    if COMPACT_CATEGORIES:
+        ACE_store_df = StandardDictionary.from_csv().apply_category_schema(ACE_store_df)
+    write_survey(ACE_store_df, "ACE_2023", operator="ACE", year=2023, source=ACE_csv)
+
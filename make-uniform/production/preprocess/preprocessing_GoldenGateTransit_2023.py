@@ -3,12 +3,23 @@
 #
 import logging
 import pathlib
-import geopandas
 import pandas as pd
 
+from centroid_lookup import city_to_latlon, zip_to_latlon
+from ridership_weights import distribute_ridership
+from standard_dictionary import StandardDictionary
+from survey_store import from_pandas, write_survey
+
 pd.options.display.max_rows = 999
 logger = logging.getLogger("survey_preprocessor")
 
+# Also write the survey into the partitioned Parquet store of all preprocessed
+# surveys (canonical_operator=/survey_year=, see survey_store)
+WRITE_SURVEY_STORE = True
+
+# Store coded columns as Enum/Int8 in the survey store (see standard_dictionary)
+COMPACT_CATEGORIES = True
+
 KEEP_COLUMNS = [
     "canonical_operator",      # one of GOLDEN GATE TRANSIT or GOLDEN GATE FERRY
     "survey_tech",             # from survey dataset and Route
@@ -204,39 +215,14 @@ del GG_ferry_df
 del GG_transit_df
 
 # ================ 01 Geocoded Location Data ================
-# first, read place (city) shapefile
-PLACE_SHAPEFILE = "M:\\Data\\GIS layers\\Census\\2023\\tl_2023_06_place\\tl_2023_06_place.shp"
-fh.setLevel(logging.INFO)
-place_gdf = geopandas.read_file(PLACE_SHAPEFILE)
-fh.setLevel(logging.DEBUG)
-logging.info(f"Read {len(place_gdf):,} rows from {PLACE_SHAPEFILE}")
-logging.debug(f"head:\n{place_gdf.head()}")
-logging.debug(f"dtypes:\n{place_gdf.dtypes}")
-logging.debug(f"crs:\n{place_gdf.crs}")
-
-# There are a number of entires with duplicate names; choose the one with the larger area
-place_gdf.sort_values(by=['NAME','ALAND'], ascending=[True,False], inplace=True)
-logging.debug(f"Places with duplicate names:\n{place_gdf.loc[place_gdf.duplicated(subset='NAME', keep=False)]}")
-place_gdf.drop_duplicates(subset='NAME', keep='first', inplace=True)
-
-# transform to WGS84
-place_gdf.to_crs(epsg=4326, inplace=True)
-logging.debug(f"converted to crs:\n{place_gdf.crs}")
-
-# calculate centroid
-place_centroid_coords = place_gdf.geometry.centroid.get_coordinates()
-place_centroid_coords["PLACE_NAME"] = place_gdf.NAME.str.upper()
-place_centroid_coords.rename(columns={"x":"place_lon", "y":"place_lat"}, inplace=True)
+# city and zip centroids come from the shared centroid lookup (see centroid_lookup.py)
 # add angel island even though it's not a city
 # https://en.wikipedia.org/wiki/Angel_Island_(California)
-ANGEL_ISLAND = pd.DataFrame({"place_lon":-122.43,"place_lat":37.86,"PLACE_NAME":'ANGEL ISLAND'}, index=[0])
-place_centroid_coords = pd.concat([ANGEL_ISLAND,place_centroid_coords])
-
 # manually override SAN FRANCISCO coordinates to place them in Civic Center area
-place_centroid_coords.loc[place_centroid_coords["PLACE_NAME"] == "SAN FRANCISCO",["place_lon", "place_lat"]] = [-122.42, 37.78]
-
-logging.debug(f"{len(place_centroid_coords)=}")
-logging.debug(f"place_centroid_coords.head():\n{place_centroid_coords.head(10)}")
+PLACE_OVERRIDES = {
+    "ANGEL ISLAND" : (37.86, -122.43),
+    "SAN FRANCISCO": (37.78, -122.42),
+}
 
 # ==== trip origin ====
 # a few spelling fixes
@@ -246,87 +232,43 @@ for city_col in ["orig_city", "dest_city"]:
     GG_df[city_col] = GG_df[city_col].str.strip(".") # strip periods
     GG_df.loc[ GG_df[city_col]=="TERRA LINDA",      city_col] = "SAN RAFAEL" # district of San Rafael
 
-# try for place-based join on origin city
-GG_df = pd.merge(
-    left      = GG_df,
-    right     = place_centroid_coords,
-    how       = 'left',
-    left_on   = 'orig_city',
-    right_on  = 'PLACE_NAME',
-    indicator = True,
-    validate  = 'many_to_one'
-)
+# try for place-based lookup on origin city
+orig_coords = city_to_latlon(GG_df.orig_city, overrides=PLACE_OVERRIDES)
 logging.debug("success joining on origin city:\n" + 
-              str(GG_df.loc[ pd.notna(GG_df.orig_city), '_merge'].value_counts()))
+              str(pd.notna(orig_coords.loc[ pd.notna(GG_df.orig_city), 'lat']).value_counts()))
 logging.debug("unmached: \n" + 
               str(GG_df.loc[ pd.notna(GG_df.orig_city) & 
-                             (GG_df._merge=='left_only'), ['orig_city','_merge']].value_counts()))
+                             pd.isna(orig_coords.lat), 'orig_city'].value_counts()))
 # set it
-GG_df.loc[ pd.notna(GG_df.place_lat), "orig_geo_level"] = "city"
-GG_df.loc[ pd.notna(GG_df.place_lat), "orig_lat"] = GG_df.place_lat
-GG_df.loc[ pd.notna(GG_df.place_lon), "orig_lon"] = GG_df.place_lon
-GG_df.drop(columns=['_merge','place_lat','place_lon'], inplace=True)
+GG_df.loc[ pd.notna(orig_coords.lat), "orig_geo_level"] = "city"
+GG_df["orig_lat"] = orig_coords.lat
+GG_df["orig_lon"] = orig_coords.lon
 logging.debug(f"orig_geo_level:\n{GG_df.orig_geo_level.value_counts(dropna=False)}")
 
 # ==== trip destination ====
-# try for place-based join on destination city
-GG_df = pd.merge(
-    left      = GG_df,
-    right     = place_centroid_coords,
-    how       = 'left',
-    left_on   = 'dest_city', # destination city
-    right_on  = 'PLACE_NAME',
-    indicator = True,
-    validate  = 'many_to_one'
-)
+# try for place-based lookup on destination city
+dest_coords = city_to_latlon(GG_df.dest_city, overrides=PLACE_OVERRIDES)
 logging.debug("success joining on destination city:\n" + 
-              str(GG_df.loc[ pd.notna(GG_df.dest_city), '_merge'].value_counts()))
+              str(pd.notna(dest_coords.loc[ pd.notna(GG_df.dest_city), 'lat']).value_counts()))
 logging.debug("unmached: \n" + 
               str(GG_df.loc[ pd.notna(GG_df.dest_city) & 
-                             (GG_df._merge=='left_only'), ['dest_city','_merge']].value_counts()))
+                             pd.isna(dest_coords.lat), 'dest_city'].value_counts()))
 # set it
-GG_df.loc[ pd.notna(GG_df.place_lat), "dest_geo_level"] = "city"
-GG_df.loc[ pd.notna(GG_df.place_lat), "dest_lat"] = GG_df.place_lat
-GG_df.loc[ pd.notna(GG_df.place_lon), "dest_lon"] = GG_df.place_lon
-GG_df.drop(columns=['_merge','place_lat','place_lon'], inplace=True)
+GG_df.loc[ pd.notna(dest_coords.lat), "dest_geo_level"] = "city"
+GG_df["dest_lat"] = dest_coords.lat
+GG_df["dest_lon"] = dest_coords.lon
 logging.debug(f"dest_geo_level:\n{GG_df.dest_geo_level.value_counts(dropna=False)}")
 
 # ==== Home zip code ===
 GG_df['Home_Zipcode'] = GG_df.Home_Zipcode.astype(str)
 logging.debug(f"Home_Zipcode value_counts().head():\n{GG_df.Home_Zipcode.value_counts(dropna=False).head(20)}")
-# read 2020 Census Zip Code shapefiles
-ZIP_SHAPEFILE = "M:\\Data\\GIS layers\\Census\\2020\\tl_2020_us_zcta520\\tl_2020_us_zcta520.shp"
-fh.setLevel(logging.INFO)
-zip_gdf = geopandas.read_file(ZIP_SHAPEFILE)
-fh.setLevel(logging.DEBUG)
-logging.info(f"Read {len(zip_gdf):,} rows from {ZIP_SHAPEFILE}")
-logging.debug(f"head:\n{zip_gdf.head()}")
-logging.debug(f"dtypes:\n{zip_gdf.dtypes}")
-logging.debug(f"crs:\n{zip_gdf.crs}")
-
-# transform to WGS84
-zip_gdf.to_crs(epsg=4326, inplace=True)
-logging.debug(f"converted to crs:\n{zip_gdf.crs}")
-
-# calculate centroid
-zip_centroid_coords = zip_gdf.geometry.centroid.get_coordinates()
-zip_centroid_coords["Home_Zipcode"] = zip_gdf.GEOID20
-zip_centroid_coords.rename(columns={"x":"home_lon", "y":"home_lat"}, inplace=True)
-logging.debug(f"zip_centroid_coords.head():\n{zip_centroid_coords.head()}")
-
-# release this
-del zip_gdf
-# join snapshot_df to zip_centroid_coords
-GG_df = pd.merge(
-    left=GG_df,
-    right=zip_centroid_coords,
-    how='left',
-    on='Home_Zipcode',
-    indicator=True)
-logging.debug(f"Zip_Code join results\n{GG_df._merge.value_counts(dropna=False)}")
+# 2020 Census ZCTA centroids
+home_coords = zip_to_latlon(GG_df.Home_Zipcode)
+logging.debug(f"Zip_Code join results\n{pd.notna(home_coords.lat).value_counts(dropna=False)}")
+GG_df["home_lat"] = home_coords.lat
+GG_df["home_lon"] = home_coords.lon
 GG_df["home_geo_level"] = None
-GG_df.loc[GG_df._merge == 'both', "home_geo_level"] = "zip"
-GG_df.drop(columns=['_merge'], inplace=True)
+GG_df.loc[pd.notna(home_coords.lat), "home_geo_level"] = "zip"
 
 # ================ 02 Access and Egress Modes ================
 ACCESS_EGRESS_RECODE = {
@@ -550,76 +492,32 @@ ridership_df = pd.read_excel(
         sheet_name="Ridership"
     )
 
-# function to distribute ridership totals over valid survey records
-
-def distribute_ridership(survey, ridership): 
-    # check if necessary columns exist in both files
-    if 'Route' not in survey.columns or 'Strata' not in survey.columns:
-        logging.debug("The survey file must have 'Route' and 'Strata' columns.")
-    if 'Route' not in ridership.columns or 'Weekday' not in ridership.columns or 'Weekend' not in ridership.columns:
-        logging.debug("The ridership file must have 'Route', 'Weekday', and 'Weekend' columns.")
-    
-    # Merge the survey data with ridership data based on the 'Route' column
-    merged_df = pd.merge(survey, ridership, on='Route', how='left')
-   
-    # add a new column for distributed ridership, initially zero
-    merged_df['weight'] = 0
-    
-    # distribute ridership based on the collapsed strata and ridership totals
-    # leave Event and Giants routes at 0 weight as those aren't fixed-schedule routes
-    for route in merged_df['Route'].unique():
-        if route in ['LARKSPUR - EVENT', 'LARKSPUR - GIANTS']:
-            continue  # skip "Event" and "Giants" routes, as their ridership is already set to zero
-
-    # filter records for the current route
-        route_records = merged_df[merged_df['Route'] == route]
-        
-        # handle Weekday strata (AM PEAK, MIDDAY, etc.)
-        weekday_records = route_records[route_records['Strata'].isin(['AM OFF', 'AM PEAK', 'EVENING', 'MIDDAY', 'PM PEAK'])]
-        num_weekday_records = len(weekday_records)
-        
-        if num_weekday_records > 0:
-            # get total weekday ridership for the current route
-            total_weekday_ridership = merged_df.loc[(merged_df['Route'] == route), 'Weekday'].iloc[0]
-            
-            # evenly distribute the ridership across all weekday records
-            ridership_per_record = total_weekday_ridership / num_weekday_records
-            
-            # assign the calculated ridership to each weekday record
-            merged_df.loc[(merged_df['Route'] == route) & (merged_df['Strata'].isin(['AM OFF', 'AM PEAK', 'EVENING', 'MIDDAY', 'PM PEAK'])), 'weight'] = ridership_per_record
-        else:
-            logging.debug(f"No Weekday records found for route {route}.")
-        
-        # handle Weekend strata (SAT, SUN)
-        weekend_records = route_records[route_records['Strata'].isin(['SAT', 'SUN'])]
-        num_weekend_records = len(weekend_records)
-        
-        if num_weekend_records > 0:
-            # get total weekend ridership for the current route
-            total_weekend_ridership = merged_df.loc[(merged_df['Route'] == route), 'Weekend'].iloc[0]
-            
-            # evenly distribute the ridership across all weekend records
-            ridership_per_record = total_weekend_ridership / num_weekend_records
-            
-            # assign the calculated ridership to each weekend record
-            merged_df.loc[(merged_df['Route'] == route) & (merged_df['Strata'].isin(['SAT', 'SUN'])), 'weight'] = ridership_per_record
-        else:
-            logging.debug(f"No Weekend records found for route {route}.")        
-    
-    # round the 'weight' column to 2 decimal places
-    merged_df['weight'] = merged_df['weight'].round(2)
-
-    # return the updated DataFrame
-    return merged_df
+# distribute ridership totals over valid survey records by (route, weekday/weekend) stratum
+# ridership column -> survey strata it covers
+RIDERSHIP_STRATA = {
+    "Weekday": ["AM OFF", "AM PEAK", "EVENING", "MIDDAY", "PM PEAK"],
+    "Weekend": ["SAT", "SUN"],
+}
+# leave Event and Giants routes at 0 weight as those aren't fixed-schedule routes
+EXCLUDED_ROUTES = ["LARKSPUR - EVENT", "LARKSPUR - GIANTS"]
 
 # run function and output final file
-GG_df = distribute_ridership(GG_df, ridership_df)
+GG_df = distribute_ridership(
+    GG_df, ridership_df, strata_groups=RIDERSHIP_STRATA, excluded_routes=EXCLUDED_ROUTES
+)
 
 # save to CSV
 GG_csv = GG_dir / "GoldenGate_Transit_Ferry_preprocessed.csv"
 GG_df[KEEP_COLUMNS].to_csv(GG_csv, index=False)
 print(f"Saved {len(GG_df):,} rows to {GG_csv}")
 
+# and to the partitioned Parquet store of all preprocessed surveys
+if WRITE_SURVEY_STORE:
+    GG_store_df = from_pandas(GG_df[KEEP_COLUMNS])
+    if COMPACT_CATEGORIES:
+        GG_store_df = StandardDictionary.from_csv().apply_category_schema(GG_store_df)
+    write_survey(GG_store_df, "GoldenGate_2023", year=2023, source=GG_csv)
+
 # save alternate version for Snapshot Survey merging with more variables
 
 ADDITIONAL_KEEP_COLUMNS = KEEP_COLUMNS + [
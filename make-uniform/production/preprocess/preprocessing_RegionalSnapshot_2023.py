@@ -8,11 +8,21 @@ import logging
 import pathlib
 import pandas as pd
 import numpy as np
-import geopandas # for home zip => lat/long
+
+from centroid_lookup import city_to_latlon, zip_to_latlon
+from standard_dictionary import StandardDictionary
+from survey_store import from_pandas, write_survey
 
 pd.options.display.max_rows = 999
 logger = logging.getLogger("survey_preprocessor")
 
+# Also write the survey into the partitioned Parquet store of all preprocessed
+# surveys (canonical_operator=/survey_year=, see survey_store)
+WRITE_SURVEY_STORE = True
+
+# Store coded columns as Enum/Int8 in the survey store (see standard_dictionary)
+COMPACT_CATEGORIES = True
+
 # See notes_Regional Snapshot_2023.csv
 KEEP_COLUMNS = [
     # 01 Geocoded Location Data
@@ -104,30 +114,7 @@ logging.debug(f"dtypes:\n{snapshot_df.dtypes}")
 
 # 01 Geocoded Location Data
 
-# first, read place (city) shapefile
-PLACE_SHAPEFILE = "M:\\Data\\GIS layers\\Census\\2023\\tl_2023_06_place\\tl_2023_06_place.shp"
-fh.setLevel(logging.INFO)
-place_gdf = geopandas.read_file(PLACE_SHAPEFILE)
-fh.setLevel(logging.DEBUG)
-logging.info(f"Read {len(place_gdf):,} rows from {PLACE_SHAPEFILE}")
-logging.debug(f"head:\n{place_gdf.head()}")
-logging.debug(f"dtypes:\n{place_gdf.dtypes}")
-logging.debug(f"crs:\n{place_gdf.crs}")
-
-# There are a number of entires with duplicate names; choose the one with the larger area
-place_gdf.sort_values(by=['NAME','ALAND'], ascending=[True,False], inplace=True)
-logging.debug(f"Places with duplicate names:\n{place_gdf.loc[place_gdf.duplicated(subset='NAME', keep=False)]}")
-place_gdf.drop_duplicates(subset='NAME', keep='first', inplace=True)
-
-# transform to WGS84
-place_gdf.to_crs(epsg=4326, inplace=True)
-logging.debug(f"converted to crs:\n{place_gdf.crs}")
-
-# calculate centroid
-place_centroid_coords = place_gdf.geometry.centroid.get_coordinates()
-place_centroid_coords["PLACE_NAME"] = place_gdf.NAME.str.upper()
-place_centroid_coords.rename(columns={"x":"place_lon", "y":"place_lat"}, inplace=True)
-logging.debug(f"place_centroid_coords.head():\n{place_centroid_coords.head(10)}")
+# city and zip centroids come from the shared centroid lookup (see centroid_lookup.py)
 
 # ==== trip origin ====
 snapshot_df.loc[ snapshot_df["Orig_Lat/Long"].str.lower()=="unspecified", "Orig_Lat/Long"] = None
@@ -167,31 +154,22 @@ for city_col in ["Q3a", "Q4a"]:
     snapshot_df.loc[ snapshot_df[city_col]=="SOUTH HAYWARD",    city_col] = "HAYWARD"
     snapshot_df.loc[ snapshot_df[city_col]=="MONTGOMERY",       city_col] = "SAN FRANCISCO"
 
-# try for place-based join on origin city
-snapshot_df = pd.merge(
-    left      = snapshot_df,
-    right     = place_centroid_coords,
-    how       = 'left',
-    left_on   = 'Q3a', # origin city
-    right_on  = 'PLACE_NAME',
-    indicator = True,
-    validate  = 'many_to_one'
-)
+# try for place-based lookup on origin city
+orig_coords = city_to_latlon(snapshot_df.Q3a)
 logging.debug("success joining on origin city:\n" + 
-              str(snapshot_df.loc[ pd.isna(snapshot_df.orig_lat) &
-                                   pd.notna(snapshot_df.Q3a), '_merge'].value_counts()))
+              str(pd.notna(orig_coords.loc[ pd.isna(snapshot_df.orig_lat) &
+                                            pd.notna(snapshot_df.Q3a), 'lat']).value_counts()))
 logging.debug("unmached: \n" + 
               str(snapshot_df.loc[ pd.isna(snapshot_df.orig_lat) &
                                    pd.notna(snapshot_df.Q3a) & 
-                                   (snapshot_df._merge=='left_only'), ['Q3a','_merge']].value_counts()))
+                                   pd.isna(orig_coords.lat), 'Q3a'].value_counts()))
 # set it
 snapshot_df.loc[ pd.isna(snapshot_df.orig_lat) &
-                 pd.notna(snapshot_df.place_lat), "orig_geo_level"] = "city"
+                 pd.notna(orig_coords.lat), "orig_geo_level"] = "city"
 snapshot_df.loc[ pd.isna(snapshot_df.orig_lat) &
-                 pd.notna(snapshot_df.place_lat), "orig_lat"] = snapshot_df.place_lat
+                 pd.notna(orig_coords.lat), "orig_lat"] = orig_coords.lat
 snapshot_df.loc[ pd.isna(snapshot_df.orig_lon) &
-                 pd.notna(snapshot_df.place_lon), "orig_lon"] = snapshot_df.place_lon
-snapshot_df.drop(columns=['_merge','place_lat','place_lon'], inplace=True)
+                 pd.notna(orig_coords.lon), "orig_lon"] = orig_coords.lon
 logging.debug(f"orig_geo_level:\n{snapshot_df.orig_geo_level.value_counts(dropna=False)}")
 
 # ==== trip destination ====
@@ -207,67 +185,32 @@ logging.debug(f"Location head():\n" + str(snapshot_df[[
     'Orig_Lat/Long','orig_lat','orig_lon','orig_geo_level',
     'Dest_Lat/Long','dest_lat','dest_lon','dest_geo_level']].head()))
 
-# try for place-based join on origin city
-snapshot_df = pd.merge(
-    left      = snapshot_df,
-    right     = place_centroid_coords,
-    how       = 'left',
-    left_on   = 'Q4a', # origin city
-    right_on  = 'PLACE_NAME',
-    indicator = True,
-    validate  = 'many_to_one'
-)
+# try for place-based lookup on destination city
+dest_coords = city_to_latlon(snapshot_df.Q4a)
 
 logging.debug("success joining on destination city:\n" + 
-              str(snapshot_df.loc[ pd.isna(snapshot_df.dest_lat) &
-                                   pd.notna(snapshot_df.Q4a), '_merge'].value_counts()))
+              str(pd.notna(dest_coords.loc[ pd.isna(snapshot_df.dest_lat) &
+                                            pd.notna(snapshot_df.Q4a), 'lat']).value_counts()))
 logging.debug("unmached: \n" + 
               str(snapshot_df.loc[ pd.isna(snapshot_df.dest_lat) &
                                    pd.notna(snapshot_df.Q4a) & 
-                                   (snapshot_df._merge=='left_only'), ['Q4a','_merge']].value_counts()))
+                                   pd.isna(dest_coords.lat), 'Q4a'].value_counts()))
 # set it
 snapshot_df.loc[ pd.isna(snapshot_df.dest_lat) &
-                 pd.notna(snapshot_df.place_lat), "dest_geo_level"] = "city"
+                 pd.notna(dest_coords.lat), "dest_geo_level"] = "city"
 snapshot_df.loc[ pd.isna(snapshot_df.dest_lat) &
-                 pd.notna(snapshot_df.place_lat), "dest_lat"] = snapshot_df.place_lat
+                 pd.notna(dest_coords.lat), "dest_lat"] = dest_coords.lat
 snapshot_df.loc[ pd.isna(snapshot_df.dest_lon) &
-                 pd.notna(snapshot_df.place_lon), "dest_lon"] = snapshot_df.place_lon
-snapshot_df.drop(columns=['_merge','place_lat','place_lon'], inplace=True)
+                 pd.notna(dest_coords.lon), "dest_lon"] = dest_coords.lon
 logging.debug(f"dest_geo_level:\n{snapshot_df.dest_geo_level.value_counts(dropna=False)}")
 
 # zip code
 logging.debug(f"Zip_Code value_counts().head():\n{snapshot_df.Zip_Code.value_counts(dropna=False).head(20)}")
-# read 2020 Census Zip Code shapefiles
-ZIP_SHAPEFILE = "M:\\Data\\GIS layers\\Census\\2020\\tl_2020_us_zcta520\\tl_2020_us_zcta520.shp"
-fh.setLevel(logging.INFO)
-zip_gdf = geopandas.read_file(ZIP_SHAPEFILE)
-fh.setLevel(logging.DEBUG)
-logging.info(f"Read {len(zip_gdf):,} rows from {ZIP_SHAPEFILE}")
-logging.debug(f"head:\n{zip_gdf.head()}")
-logging.debug(f"dtypes:\n{zip_gdf.dtypes}")
-logging.debug(f"crs:\n{zip_gdf.crs}")
-
-# transform to WGS84
-zip_gdf.to_crs(epsg=4326, inplace=True)
-logging.debug(f"converted to crs:\n{zip_gdf.crs}")
-
-# calculate centroid
-zip_centroid_coords = zip_gdf.geometry.centroid.get_coordinates()
-zip_centroid_coords["Zip_Code"] = zip_gdf.GEOID20
-zip_centroid_coords.rename(columns={"x":"home_lon", "y":"home_lat"}, inplace=True)
-logging.debug(f"zip_centroid_coords.head():\n{zip_centroid_coords.head()}")
-
-# release this
-del zip_gdf
-# join snapshot_df to zip_centroid_coords
-snapshot_df = pd.merge(
-    left=snapshot_df,
-    right=zip_centroid_coords,
-    how='left',
-    on='Zip_Code',
-    indicator=True)
-logging.debug(f"Zip_Code join results\n{snapshot_df._merge.value_counts(dropna=False)}")
-snapshot_df.drop(columns=['_merge'], inplace=True)
+# 2020 Census ZCTA centroids
+home_coords = zip_to_latlon(snapshot_df.Zip_Code)
+logging.debug(f"Zip_Code join results\n{pd.notna(home_coords.lat).value_counts(dropna=False)}")
+snapshot_df["home_lat"] = home_coords.lat
+snapshot_df["home_lon"] = home_coords.lon
 snapshot_df["home_geo_level"] = "zip"
 
 # 04 Origin and Destination Trip Purpose - we only have trip purpose
@@ -510,4 +453,11 @@ snapshot_df[KEEP_COLUMNS].to_csv(
     snapshot_csv, 
     index=False,
     date_format="%Y-%m-%d")
-logging.info(f"Saved {snapshot_csv}")
\ No newline at end of file
+logging.info(f"Saved {snapshot_csv}")
+
+# and to the partitioned Parquet store, one file per operator
+if WRITE_SURVEY_STORE:
+    snapshot_store_df = from_pandas(snapshot_df[KEEP_COLUMNS])
+    if COMPACT_CATEGORIES:
+        snapshot_store_df = StandardDictionary.from_csv().apply_category_schema(snapshot_store_df)
+    write_survey(snapshot_store_df, "Snapshot_2023", year=2023, source=snapshot_csv)
@@ -0,0 +1,264 @@
+"""Declarative recodes compiled into a single lazy Polars query.
+
+A recode spec is a CSV with one rule per row:
+
+    source      Column name, or a regular expression when match is "all"/"first"
+    match       exact | all (every matching column) | first (first matching column)
+    operation   decode    Codebook decode; if the field has no codebook entries,
+                          fall back to ``mapping`` (a mapping name, "copy", "null",
+                          or empty to skip the column)
+                map       Replace values using the named mapping (unmatched -> null)
+                copy      Copy the source column
+                flag      1 if the source is not null, else 0
+                fill_zero Fill nulls with 0 (cast to dtype)
+    mapping     Mapping name (see below) or decode fallback
+    output      Output column; "{source}" is replaced by the source column name.
+                Outputs starting with "_" are intermediate and dropped at the end.
+    dtype       Optional Polars dtype name of the output (e.g. Utf8, Int64)
+    if_missing  "null" to create a null output when no source column exists,
+                otherwise the rule is skipped
+
+Regex sources are matched against the columns of the input frame. Rules are
+applied in file order: a rule sees the outputs of earlier rules, and the first
+applicable rule for an output wins (so alternatives are listed by priority).
+Rules that don't depend on each other are grouped into the same
+``with_columns`` stage, and all stages form one lazy query.
+
+Mappings are read from a CSV with columns mapping, value, label (an empty label
+means null) or passed in as dicts. Mapping values are cast to the dtype of the
+column they are applied to.
+
+Typical use:
+    engine = RecodeEngine.from_csv(RECODE_SPEC, codebook, mappings_path=RECODE_MAPPINGS)
+    survey_df = engine.apply(survey_df.lazy()).collect()
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+from codebook import Codebook
+
+logger = logging.getLogger(__name__)
+
+SPEC_COLUMNS = ["source", "match", "operation", "mapping", "output", "dtype", "if_missing"]
+MATCH_TYPES = {"exact", "all", "first"}
+OPERATIONS = {"decode", "map", "copy", "flag", "fill_zero"}
+
+
+def read_recode_spec(path: str | Path) -> list[dict[str, str]]:
+    """Read and validate a recode spec CSV.
+
+    Args:
+        path: Path to the spec CSV
+
+    Returns:
+        List of rules as dicts with the keys of SPEC_COLUMNS ("" for empty cells)
+
+    Raises:
+        ValueError: If a column is missing or a rule has an unknown match/operation
+    """
+    spec_df = pl.read_csv(path, infer_schema_length=0)
+    missing = [col for col in SPEC_COLUMNS if col not in spec_df.columns]
+    if missing:
+        msg = f"Recode spec {path} is missing columns: {missing}"
+        raise ValueError(msg)
+
+    rules = spec_df.select(SPEC_COLUMNS).fill_null("").to_dicts()
+    for line, rule in enumerate(rules, start=2):
+        if rule["match"] not in MATCH_TYPES:
+            msg = f"{path}:{line}: unknown match '{rule['match']}', expected one of {MATCH_TYPES}"
+            raise ValueError(msg)
+        if rule["operation"] not in OPERATIONS:
+            msg = f"{path}:{line}: unknown operation '{rule['operation']}', expected one of {OPERATIONS}"
+            raise ValueError(msg)
+    return rules
+
+
+def read_mappings(path: str | Path) -> dict[str, dict[str, str | None]]:
+    """Read named value -> label mappings from a CSV (columns mapping, value, label)."""
+    mappings_df = pl.read_csv(path, infer_schema_length=0)
+    mappings: dict[str, dict[str, str | None]] = {}
+    for name, value, label in mappings_df.select("mapping", "value", "label").iter_rows():
+        mappings.setdefault(name, {})[value] = label or None
+    return mappings
+
+
+def _cast_mapping(mapping: dict[Any, Any], dtype: pl.DataType) -> dict[Any, Any]:
+    """Cast mapping keys read from CSV to the dtype of the column they apply to."""
+    if dtype.is_integer():
+        return {int(key): label for key, label in mapping.items()}
+    if dtype.is_float():
+        return {float(key): label for key, label in mapping.items()}
+    if dtype == pl.Utf8:
+        return {str(key): label for key, label in mapping.items()}
+    return mapping
+
+
+class RecodeEngine:
+    """Compile recode rules against a survey schema and apply them lazily.
+
+    Args:
+        rules: Recode rules (see read_recode_spec)
+        codebook: Codebook used by decode rules
+        mappings: Named value -> label mappings used by map rules and decode fallbacks
+    """
+
+    def __init__(
+        self,
+        rules: list[dict[str, str]],
+        codebook: Codebook | None = None,
+        mappings: dict[str, dict[Any, Any]] | None = None,
+    ) -> None:
+        self.rules = rules
+        self.codebook = codebook
+        self.mappings = mappings or {}
+
+    @classmethod
+    def from_csv(
+        cls,
+        spec_path: str | Path,
+        codebook: Codebook | None = None,
+        mappings_path: str | Path | None = None,
+        mappings: dict[str, dict[Any, Any]] | None = None,
+    ) -> "RecodeEngine":
+        """Build an engine from a spec CSV and optional mappings CSV.
+
+        Args:
+            spec_path: Path to the recode spec CSV
+            codebook: Codebook used by decode rules
+            mappings_path: Optional mappings CSV (columns mapping, value, label)
+            mappings: Optional additional mappings (override the CSV by name)
+
+        Returns:
+            RecodeEngine
+        """
+        all_mappings = read_mappings(mappings_path) if mappings_path else {}
+        all_mappings.update(mappings or {})
+        return cls(read_recode_spec(spec_path), codebook, all_mappings)
+
+    def _mapping(self, name: str) -> dict[Any, Any]:
+        if name not in self.mappings:
+            msg = f"Unknown recode mapping '{name}'"
+            raise ValueError(msg)
+        return self.mappings[name]
+
+    def _replace(self, source: str, mapping: dict, dtype: pl.DataType, return_dtype) -> pl.Expr:
+        return pl.col(source).replace_strict(
+            _cast_mapping(mapping, dtype), default=None, return_dtype=return_dtype
+        )
+
+    def _rule_expr(  # noqa: PLR0911
+        self, rule: dict[str, str], source: str, schema: dict[str, pl.DataType]
+    ) -> pl.Expr | None:
+        """Return the expression for one rule applied to one source column."""
+        operation = rule["operation"]
+        return_dtype = getattr(pl, rule["dtype"]) if rule["dtype"] else None
+
+        if operation == "decode":
+            if self.codebook is not None and source in self.codebook:
+                return self.codebook.decode_expr(source, return_dtype=return_dtype)
+            fallback = rule["mapping"]
+            if not fallback:
+                return None
+            if fallback == "copy":
+                return pl.col(source)
+            if fallback == "null":
+                return pl.lit(None).cast(return_dtype or pl.Utf8)
+            return self._replace(source, self._mapping(fallback), schema[source], return_dtype)
+        if operation == "map":
+            return self._replace(source, self._mapping(rule["mapping"]), schema[source], return_dtype)
+        if operation == "copy":
+            expr = pl.col(source)
+        elif operation == "flag":
+            expr = pl.when(pl.col(source).is_not_null()).then(pl.lit(1)).otherwise(pl.lit(0))
+        else:  # fill_zero
+            expr = pl.col(source).fill_null(0)
+        return expr.cast(return_dtype) if return_dtype else expr
+
+    def _sources(self, rule: dict[str, str], input_columns: list[str], available: set[str]) -> list[str]:
+        if rule["match"] == "exact":
+            return [rule["source"]] if rule["source"] in available else []
+        pattern = re.compile(rule["source"])
+        matches = [col for col in input_columns if pattern.search(col)]
+        return matches[:1] if rule["match"] == "first" else matches
+
+    def compile(self, schema: dict[str, pl.DataType]) -> list[list[pl.Expr]]:
+        """Resolve the rules against a schema into dependency-ordered stages.
+
+        Args:
+            schema: Schema of the input frame
+
+        Returns:
+            List of stages; each stage is a list of expressions for one with_columns
+        """
+        input_columns = list(schema)
+        schema = dict(schema)
+        produced_stage: dict[str, int] = {}  # output column -> stage that writes it
+        read_stage: dict[str, int] = {}  # column -> last stage that reads it
+        stages: list[list[pl.Expr]] = []
+
+        for rule in self.rules:
+            sources = self._sources(rule, input_columns, set(schema))
+            targets = [(source, rule["output"].format(source=source)) for source in sources]
+            if not targets and rule["match"] != "all" and rule["if_missing"] == "null":
+                targets = [(None, rule["output"])]
+
+            for source, output in targets:
+                # first applicable rule for an output wins (in-place decodes excepted)
+                if output in produced_stage and output != source:
+                    continue
+                if source is None:
+                    dtype = getattr(pl, rule["dtype"]) if rule["dtype"] else pl.Utf8
+                    expr = pl.lit(None).cast(dtype)
+                else:
+                    expr = self._rule_expr(rule, source, schema)
+                    if expr is None:
+                        continue
+                expr = expr.alias(output)
+                logger.debug("Recode %s -> %s (%s)", source, output, rule["operation"])
+
+                # run after the stage producing the source, after any stage still
+                # reading the output's old values, and after earlier writes of it
+                stage = max(
+                    produced_stage.get(source, -1) + 1,
+                    read_stage.get(output, 0),
+                    produced_stage.get(output, -1) + 1,
+                )
+                while len(stages) <= stage:
+                    stages.append([])
+                stages[stage].append(expr)
+
+                if source is not None:
+                    read_stage[source] = max(read_stage.get(source, 0), stage)
+                produced_stage[output] = stage
+                # resolve the output dtype on an empty frame for later rules
+                schema[output] = pl.LazyFrame(schema=schema).select(expr).collect_schema()[output]
+
+        logger.info(
+            "Compiled %d recode rules into %d expressions in %d stages",
+            len(self.rules),
+            sum(len(stage) for stage in stages),
+            len(stages),
+        )
+        return stages
+
+    def apply(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Add all recodes to a lazy query.
+
+        Args:
+            lf: Survey LazyFrame
+
+        Returns:
+            LazyFrame with the recoded columns added (intermediate "_" outputs dropped)
+        """
+        schema = lf.collect_schema()
+        for stage in self.compile(dict(schema)):
+            lf = lf.with_columns(stage)
+        intermediate = [
+            col for col in lf.collect_schema().names() if col.startswith("_") and col not in schema
+        ]
+        return lf.drop(intermediate) if intermediate else lf
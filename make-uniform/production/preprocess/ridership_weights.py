@@ -0,0 +1,121 @@
+"""Vectorized distribution of ridership control totals over survey records.
+
+Each eligible record gets an equal share of its stratum's control total
+(control total / number of eligible records in the stratum), computed with one
+groupby instead of a loop over routes and strata.
+
+Typical use (Golden Gate: route x weekday/weekend strata):
+    GG_df = distribute_ridership(
+        GG_df, ridership_df, strata_groups=RIDERSHIP_STRATA, excluded_routes=EXCLUDED_ROUTES
+    )
+
+Typical use (ACE: one stratum, scalar total):
+    naive_weight = expansion_factors(ACE_data_df, control_total=average_daily_ridership)
+"""
+
+import logging
+from collections.abc import Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def expansion_factors(
+    df: pd.DataFrame,
+    control_total: float | pd.Series,
+    by: Sequence[str | pd.Series] | None = None,
+    eligible: pd.Series | None = None,
+) -> pd.Series:
+    """Divide control totals evenly over the eligible records of each stratum.
+
+    Args:
+        df: Survey records
+        control_total: Control total per record (Series aligned with df) or one
+            scalar total for all records
+        by: Stratum keys (column names of df or Series aligned with df);
+            None treats all records as one stratum
+        eligible: Boolean Series marking records that receive a share;
+            defaults to all records
+
+    Returns:
+        Series aligned with df: control total / eligible records in the stratum,
+        0 for ineligible records (NaN where the control total is NaN)
+    """
+    if eligible is None:
+        eligible = pd.Series(True, index=df.index)
+    if not isinstance(control_total, pd.Series):
+        control_total = pd.Series(control_total, index=df.index, dtype="float64")
+
+    if by:
+        keys = [df[key] if isinstance(key, str) else key for key in by]
+        # rows with a null key form no stratum (count NaN); they must be ineligible
+        stratum_size = eligible.astype(int).groupby(keys, dropna=True).transform("sum")
+    else:
+        stratum_size = eligible.sum()
+
+    return (control_total / stratum_size).where(eligible, 0.0)
+
+
+def distribute_ridership(
+    survey: pd.DataFrame,
+    ridership: pd.DataFrame,
+    strata_groups: dict[str, Sequence[str]],
+    excluded_routes: Sequence[str] = (),
+    route_col: str = "Route",
+    strata_col: str = "Strata",
+    weight_col: str = "weight",
+    decimals: int = 2,
+) -> pd.DataFrame:
+    """Distribute route ridership totals over survey records by stratum group.
+
+    Records are grouped by (route, stratum group); each group's ridership total
+    (the ridership column named by the group) is divided evenly over its records.
+
+    Args:
+        survey: Survey records with route_col and strata_col
+        ridership: One row per route with route_col and one column per stratum group
+        strata_groups: Ridership column -> survey strata it covers, e.g.
+            {"Weekday": ["AM PEAK", "MIDDAY"], "Weekend": ["SAT", "SUN"]}
+        excluded_routes: Routes left at 0 weight (e.g. non-fixed-schedule service)
+        route_col: Route column in survey and ridership
+        strata_col: Stratum column in survey
+        weight_col: Name of the weight column to add
+        decimals: Decimal places to round the weights to
+
+    Returns:
+        survey merged with ridership (left join on route_col) plus weight_col;
+        records outside all strata groups or on excluded routes get 0
+    """
+    if route_col not in survey.columns or strata_col not in survey.columns:
+        logger.debug("The survey file must have '%s' and '%s' columns.", route_col, strata_col)
+    missing_totals = [col for col in [route_col, *strata_groups] if col not in ridership.columns]
+    if missing_totals:
+        logger.debug("The ridership file is missing columns: %s", missing_totals)
+
+    merged_df = pd.merge(survey, ridership, on=route_col, how="left")
+
+    # Ridership column (stratum group) of each record; later groups win on overlap
+    stratum_group = merged_df[strata_col].map(
+        {stratum: total_col for total_col, strata in strata_groups.items() for stratum in strata}
+    )
+    routes = merged_df[route_col]
+    eligible = stratum_group.notna() & routes.notna() & ~routes.isin(excluded_routes)
+
+    # Control total of each record: its group's ridership on the route's first row
+    route_totals = merged_df.drop_duplicates(subset=route_col).set_index(route_col)
+    control_total = pd.Series(float("nan"), index=merged_df.index)
+    for total_col in strata_groups:
+        in_group = eligible & (stratum_group == total_col)
+        control_total[in_group] = routes[in_group].map(route_totals[total_col])
+
+        routes_without_records = set(routes[~routes.isin(excluded_routes)].dropna()) - set(
+            routes[in_group]
+        )
+        for route in routes_without_records:
+            logger.debug("No %s records found for route %s.", total_col, route)
+
+    merged_df[weight_col] = expansion_factors(
+        merged_df, control_total, by=[routes, stratum_group], eligible=eligible
+    ).round(decimals)
+    return merged_df
@@ -0,0 +1,327 @@
+"""Resolve survey route strings to canonical routes with canonical_route_crosswalk.csv.
+
+The crosswalk maps (survey_name, survey_year, survey_route_name) to a
+canonical_route, canonical_operator and technology; rows with survey_name
+GEOCODE hold the rail station-pair routes shared by every survey. RouteResolver
+normalizes the keys once (upper case, single spaces) and resolves a survey
+column in three steps, each over the unique route strings only:
+
+1. hash join on (survey_name, survey_year, route)
+2. hash join on the GEOCODE routes
+3. rapidfuzz cdist of the remaining strings against the crosswalk strings of
+   the row's operator only, so a fuzzy match can never pick another operator's
+   route; the best match is kept if it reaches the score cutoff
+
+The result is joined back onto the survey in one step, so route
+canonicalization can run in the preprocessors instead of in
+Build_Standard_Database.R.
+
+Typical use:
+    resolver = RouteResolver.from_csv()
+    snapshot_df = resolver.resolve(
+        snapshot_df, "Route", survey_name="Regional Snapshot", survey_year=2023,
+        operator_col="canonical_operator",
+    )
+
+From the command line (one row per unique route, for review before adding
+routes to the crosswalk):
+    python route_resolver.py mtc_snapshot_preprocessed.csv --route-col Route
+        --survey-name "Regional Snapshot" --year 2023 --operator-col canonical_operator
+        --output snapshot_routes.csv
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from rapidfuzz import fuzz, process
+
+logger = logging.getLogger(__name__)
+
+CANONICAL_ROUTE_CROSSWALK = Path(__file__).resolve().parents[1] / "canonical_route_crosswalk.csv"
+
+# survey_name of the crosswalk rows shared by all surveys (rail station pairs)
+GEOCODE_SURVEY = "GEOCODE"
+
+DEFAULT_SCORE_CUTOFF = 85.0
+
+# Number of route strings scored per cdist call
+DEFAULT_CHUNK_SIZE = 512
+
+RESOLVED_COLUMNS = {
+    "canonical_route": pl.Utf8,
+    "crosswalk_operator": pl.Utf8,
+    "technology": pl.Utf8,
+    "route_match": pl.Utf8,
+    "route_score": pl.Float64,
+}
+
+# Private key columns of the resolution table
+_ROUTE_KEY = "_route_key"
+_OPERATOR_KEY = "_operator_key"
+
+
+def normalize_expr(expr: pl.Expr) -> pl.Expr:
+    """Normalize a route or operator string: upper case, trimmed, single spaces."""
+    return expr.cast(pl.Utf8).str.to_uppercase().str.replace_all(r"\s+", " ").str.strip_chars()
+
+
+def normalize(value: str) -> str:
+    """Normalize one string like normalize_expr."""
+    return " ".join(value.upper().split())
+
+
+class RouteResolver:
+    """Canonical route lookup over the crosswalk, with an operator-restricted fuzzy fallback.
+
+    Args:
+        crosswalk_df: Crosswalk with columns survey_name, survey_year,
+            survey_route_name, canonical_route, canonical_operator, technology
+        score_cutoff: Minimum fuzz.token_sort_ratio of a fuzzy match (0-100)
+        chunk_size: Number of route strings scored per cdist call
+    """
+
+    def __init__(
+        self,
+        crosswalk_df: pl.DataFrame,
+        score_cutoff: float = DEFAULT_SCORE_CUTOFF,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        self.score_cutoff = score_cutoff
+        self.chunk_size = chunk_size
+
+        crosswalk_df = crosswalk_df.select(
+            normalize_expr(pl.col("survey_name")).alias("survey_key"),
+            pl.col("survey_year").cast(pl.Int32, strict=False),
+            normalize_expr(pl.col("survey_route_name")).alias(_ROUTE_KEY),
+            normalize_expr(pl.col("canonical_operator")).alias(_OPERATOR_KEY),
+            pl.col("canonical_route"),
+            pl.col("canonical_operator").alias("crosswalk_operator"),
+            pl.col("technology"),
+        ).filter(pl.col(_ROUTE_KEY).is_not_null() & pl.col("canonical_route").is_not_null())
+
+        # first crosswalk row wins for keys that differ only in case or spacing
+        self._index = crosswalk_df.filter(pl.col("survey_key") != GEOCODE_SURVEY).unique(
+            ["survey_key", "survey_year", _ROUTE_KEY], keep="first", maintain_order=True
+        )
+        self._geocode_index = (
+            crosswalk_df.filter(pl.col("survey_key") == GEOCODE_SURVEY)
+            .unique([_ROUTE_KEY], keep="first", maintain_order=True)
+            .drop("survey_key", "survey_year")
+        )
+
+        # fuzzy candidates per operator: every survey string and canonical name
+        # that maps to one of the operator's canonical routes
+        targets = ["canonical_route", "crosswalk_operator", "technology"]
+        candidates = pl.concat(
+            [
+                crosswalk_df.select(_OPERATOR_KEY, pl.col(_ROUTE_KEY).alias("candidate"), *targets),
+                crosswalk_df.select(
+                    _OPERATOR_KEY,
+                    normalize_expr(pl.col("canonical_route")).alias("candidate"),
+                    *targets,
+                ),
+            ]
+        ).unique([_OPERATOR_KEY, "candidate"], keep="first", maintain_order=True)
+        self._candidates = {
+            operator: group.drop(_OPERATOR_KEY)
+            for (operator,), group in candidates.group_by(_OPERATOR_KEY, maintain_order=True)
+        }
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str | Path = CANONICAL_ROUTE_CROSSWALK,
+        score_cutoff: float = DEFAULT_SCORE_CUTOFF,
+    ) -> "RouteResolver":
+        """Read the crosswalk (tolerating the stray non-UTF-8 bytes it contains)."""
+        crosswalk_df = pl.read_csv(path, infer_schema_length=0, encoding="utf8-lossy")
+        return cls(crosswalk_df, score_cutoff)
+
+    def _fuzzy_match(self, operator: str | None, routes: list[str]) -> pl.DataFrame:
+        """Score route strings against one operator's candidates; best match per route."""
+        empty = pl.DataFrame(schema={_ROUTE_KEY: pl.Utf8, **RESOLVED_COLUMNS})
+        candidates = self._candidates.get(operator)
+        if candidates is None or not routes:
+            return empty
+
+        choices = candidates["candidate"].to_list()
+        best_idx = np.zeros(len(routes), dtype=np.int64)
+        best_score = np.zeros(len(routes), dtype=np.float64)
+        for start in range(0, len(routes), self.chunk_size):
+            chunk = routes[start : start + self.chunk_size]
+            scores = process.cdist(
+                chunk,
+                choices,
+                scorer=fuzz.token_sort_ratio,
+                dtype=np.float64,
+                workers=-1,
+            )
+            # argmax returns the first maximum: earlier crosswalk rows win ties
+            chunk_idx = scores.argmax(axis=1)
+            best_idx[start : start + len(chunk)] = chunk_idx
+            best_score[start : start + len(chunk)] = scores[np.arange(len(chunk)), chunk_idx]
+
+        matched = best_score >= self.score_cutoff
+        if not matched.any():
+            return empty
+        return (
+            candidates[best_idx[matched]]
+            .drop("candidate")
+            .with_columns(
+                pl.Series(_ROUTE_KEY, np.asarray(routes, dtype=object)[matched].tolist(), pl.Utf8),
+                pl.lit("fuzzy").alias("route_match"),
+                pl.Series("route_score", best_score[matched]),
+            )
+            .select(empty.columns)
+        )
+
+    def _resolution_table(
+        self,
+        routes: pl.DataFrame,
+        survey_name: str,
+        survey_year: int,
+    ) -> pl.DataFrame:
+        """Resolve unique (route, operator) keys.
+
+        Args:
+            routes: Unique keys with the normalized columns _route_key and _operator_key
+            survey_name: Survey name as in the crosswalk (e.g. "AC Transit")
+            survey_year: Survey year as in the crosswalk
+
+        Returns:
+            The keys with the RESOLVED_COLUMNS (nulls where unresolved)
+        """
+        exact = routes.join(
+            self._index.filter(
+                (pl.col("survey_key") == normalize(survey_name))
+                & (pl.col("survey_year") == survey_year)
+            ).select(_ROUTE_KEY, "canonical_route", "crosswalk_operator", "technology"),
+            on=_ROUTE_KEY,
+            how="inner",
+        )
+        remaining = routes.join(exact, on=[_ROUTE_KEY, _OPERATOR_KEY], how="anti")
+        geocode = remaining.join(
+            self._geocode_index.select(
+                _ROUTE_KEY, "canonical_route", "crosswalk_operator", "technology"
+            ),
+            on=_ROUTE_KEY,
+            how="inner",
+        )
+        matched = pl.concat(
+            [
+                exact.with_columns(pl.lit("exact").alias("route_match")),
+                geocode.with_columns(pl.lit("geocode").alias("route_match")),
+            ]
+        ).with_columns(pl.lit(100.0).alias("route_score"))
+
+        remaining = remaining.join(geocode, on=[_ROUTE_KEY, _OPERATOR_KEY], how="anti")
+        fuzzy = [
+            self._fuzzy_match(operator, group[_ROUTE_KEY].to_list()).with_columns(
+                pl.lit(operator, dtype=pl.Utf8).alias(_OPERATOR_KEY)
+            )
+            for (operator,), group in remaining.group_by(_OPERATOR_KEY, maintain_order=True)
+        ]
+
+        resolved = pl.concat(
+            [matched.select(_ROUTE_KEY, _OPERATOR_KEY, *RESOLVED_COLUMNS)]
+            + [frame.select(_ROUTE_KEY, _OPERATOR_KEY, *RESOLVED_COLUMNS) for frame in fuzzy]
+        )
+        return routes.join(resolved, on=[_ROUTE_KEY, _OPERATOR_KEY], how="left", nulls_equal=True)
+
+    def resolve(
+        self,
+        survey_df: pl.DataFrame,
+        route_col: str,
+        survey_name: str,
+        survey_year: int,
+        operator: str | None = None,
+        operator_col: str | None = None,
+    ) -> pl.DataFrame:
+        """Attach the canonical route of every row of a survey.
+
+        Args:
+            survey_df: Survey with a raw route column
+            route_col: Raw route column
+            survey_name: Survey name as in the crosswalk
+            survey_year: Survey year as in the crosswalk
+            operator: Canonical operator of every row (restricts fuzzy matches)
+            operator_col: Column with each row's canonical operator, for
+                multi-operator surveys (used instead of operator)
+
+        Returns:
+            survey_df with the RESOLVED_COLUMNS added: canonical_route,
+            crosswalk_operator, technology, route_match (exact, geocode, fuzzy or
+            null) and route_score
+
+        Raises:
+            ValueError: If neither operator nor operator_col is given
+        """
+        if operator is None and operator_col is None:
+            msg = "Pass operator or operator_col to restrict fuzzy matches to an operator"
+            raise ValueError(msg)
+        operator_expr = pl.col(operator_col) if operator_col is not None else pl.lit(operator)
+
+        keyed = survey_df.with_columns(
+            normalize_expr(pl.col(route_col)).alias(_ROUTE_KEY),
+            normalize_expr(operator_expr).alias(_OPERATOR_KEY),
+        )
+        table = self._resolution_table(
+            keyed.select(_ROUTE_KEY, _OPERATOR_KEY).unique().drop_nulls(_ROUTE_KEY),
+            survey_name,
+            survey_year,
+        )
+
+        counts = table["route_match"].fill_null("unresolved").value_counts()
+        logger.info(
+            "Resolved %d unique routes of %s %s: %s",
+            table.height,
+            survey_name,
+            survey_year,
+            dict(counts.iter_rows()),
+        )
+        return keyed.join(
+            table,
+            on=[_ROUTE_KEY, _OPERATOR_KEY],
+            how="left",
+            nulls_equal=True,
+            maintain_order="left",
+        ).drop(_ROUTE_KEY, _OPERATOR_KEY)
+
+
+def main() -> None:
+    """Write the route resolution of a survey CSV for review."""
+    parser = argparse.ArgumentParser(
+        description="Resolve the routes of a survey CSV with canonical_route_crosswalk.csv"
+    )
+    parser.add_argument("survey", type=Path, help="Survey CSV")
+    parser.add_argument("--route-col", required=True)
+    parser.add_argument("--survey-name", required=True, help="survey_name in the crosswalk")
+    parser.add_argument("--year", type=int, required=True, help="survey_year in the crosswalk")
+    parser.add_argument("--operator", help="Canonical operator of every row")
+    parser.add_argument("--operator-col", help="Column with each row's canonical operator")
+    parser.add_argument("--crosswalk", type=Path, default=CANONICAL_ROUTE_CROSSWALK)
+    parser.add_argument("--score-cutoff", type=float, default=DEFAULT_SCORE_CUTOFF)
+    parser.add_argument("--output", type=Path, required=True, help="CSV of unique routes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    resolver = RouteResolver.from_csv(args.crosswalk, args.score_cutoff)
+    columns = [args.route_col] + ([args.operator_col] if args.operator_col else [])
+    survey_df = pl.read_csv(args.survey, columns=columns, infer_schema=False)
+    resolved = resolver.resolve(
+        survey_df, args.route_col, args.survey_name, args.year, args.operator, args.operator_col
+    )
+    routes = (
+        resolved.group_by(columns + list(RESOLVED_COLUMNS))
+        .agg(pl.len().alias("n_rows"))
+        .sort("route_match", "route_score", nulls_last=True)
+    )
+    routes.write_csv(args.output)
+    logger.info("Wrote %d unique routes to %s", routes.height, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Run the operator preprocessors as a dependency graph on a process pool.
+
+Each preprocessor (and downstream step such as the Snapshot/ACE/Golden Gate
+combine) is declared as a task with the files it reads and writes. A task
+depends on every task that writes one of its inputs; tasks whose dependencies
+are done run in parallel, each in a fresh worker process, so a full rebuild
+takes about as long as its longest chain instead of the sum of all runs.
+
+Python scripts are executed with runpy in the worker (as if run directly);
+R scripts are run with Rscript. If a task fails, the tasks that depend on it
+are skipped and the others still run.
+
+A task is also skipped when its outputs exist and nothing it depends on changed
+since its last successful run: the content of its script, its input files and
+the shared helper modules and dictionaries (see build_cache). ``inputs`` must
+therefore list every file a script reads, including reference layers such as
+the stops GeoJSON and the Census shapefiles. Use --force to rerun everything.
+
+Usage:
+    python run_preprocessors.py                      # everything
+    python run_preprocessors.py --tasks snapshot_combine --workers 2
+    python run_preprocessors.py --list               # show tasks and dependencies
+    python run_preprocessors.py --force              # ignore the up-to-date check
+"""
+
+import argparse
+import json
+import logging
+import os
+import runpy
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+from pathlib import Path
+
+from build_cache import STAGE_CACHE_DIR, FileHashMemo, content_key
+from cache_utils import atomic_write_text
+from standard_dictionary import CANONICAL_ROUTE_CROSSWALK, STANDARD_VARIABLE_DICT
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_DIR = Path(__file__).resolve().parent
+REPO_DIR = PREPROCESS_DIR.parents[2]
+
+# Data locations used by the scripts below (kept in sync with their constants)
+ONBOARD_DIR = Path("M:/Data/OnBoard/Data and Reports")
+GG_DIR = ONBOARD_DIR / "Golden Gate Transit" / "2023"
+ACE_DIR = ONBOARD_DIR / "ACE" / "2023"
+SNAPSHOT_DIR = ONBOARD_DIR / "Snapshot Survey"
+BART_DIR = ONBOARD_DIR / "BART"
+AC_TRANSIT_DIR = Path(
+    r"E:/Box/Modeling and Surveys/Surveys/Transit Passenger Surveys/Ongoing TPS/"
+    r"Individual Operator Efforts/AC Transit 2025 (OD Survey)/AC_Transit_MTC_ETC_Shared_Folder/"
+    r"Survey Databases/Final"
+)
+
+SNAPSHOT_BOX_WORKBOOK = (
+    Path(os.environ.get("USERPROFILE", Path.home()))
+    / "Box/Modeling and Surveys/Surveys/Transit Passenger Surveys/Snapshot Survey/Data"
+    / "mtc snapshot survey_final data file_for regional MTC only_REVISED 28 August 2024.xlsx"
+)
+
+# Reference layers read by the scripts (stop_gazetteer, centroid_lookup)
+STATION_GEOJSON = (
+    ONBOARD_DIR / "Geography Files" / "cdot_ca_transit_stops_4312132402745178866.geojson"
+)
+CENSUS_DIR = Path("M:/Data/GIS layers/Census")
+ZCTA_SHAPEFILE = CENSUS_DIR / "2020" / "tl_2020_us_zcta520" / "tl_2020_us_zcta520.shp"
+PLACE_SHAPEFILE = CENSUS_DIR / "2023" / "tl_2023_06_place" / "tl_2023_06_place.shp"
+
+
+def shapefile(path: Path) -> tuple[Path, ...]:
+    """Return the files of a shapefile that centroids depend on: geometry, attributes, CRS."""
+    return tuple(path.with_suffix(suffix) for suffix in (".shp", ".dbf", ".prj"))
+
+
+GG_PREPROCESSED = GG_DIR / "GoldenGate_Transit_Ferry_preprocessed.csv"
+GG_PREPROCESSED_ADDITIONAL = GG_DIR / "GoldenGate_Transit_Ferry_preprocessed_additional_columns.csv"
+ACE_PREPROCESSED = ACE_DIR / "ACE_Onboard_preprocessed.csv"
+
+# Keys of the last successful run of each task
+TASK_CACHE_DIR = STAGE_CACHE_DIR.parent / "tasks"
+
+
+@dataclass(frozen=True)
+class PreprocessTask:
+    """One script in the preprocessing graph.
+
+    Args:
+        name: Task name used on the command line and in the report
+        script: Python or R script to run
+        inputs: Files the script reads
+        outputs: Files the script writes
+        after: Names of tasks that must finish first in addition to the
+            writers of ``inputs``
+    """
+
+    name: str
+    script: Path
+    inputs: tuple[Path, ...] = ()
+    outputs: tuple[Path, ...] = ()
+    after: tuple[str, ...] = ()
+
+
+TASKS = [
+    PreprocessTask(
+        name="bart_2024",
+        script=PREPROCESS_DIR / "preprocess_BART_2024.py",
+        inputs=(
+            BART_DIR / "2024_StationProfileV1_NewWeights_ReducedVariables.xlsx",
+            STATION_GEOJSON,
+        ),
+        outputs=(BART_DIR / "BART_2024_preprocessed.csv", BART_DIR / "BART_2024_codebook.csv"),
+    ),
+    PreprocessTask(
+        name="golden_gate_2023",
+        script=PREPROCESS_DIR / "preprocessing_GoldenGateTransit_2023.py",
+        inputs=(
+            GG_DIR / "GGFerry2023 Final Data.xlsx",
+            GG_DIR / "GGT2023 Final Data.xlsx",
+            GG_DIR / "Average Daily Ridership for GGT and GGF - Snapshot Survey Period.xlsx",
+            *shapefile(PLACE_SHAPEFILE),
+            *shapefile(ZCTA_SHAPEFILE),
+        ),
+        outputs=(GG_PREPROCESSED, GG_PREPROCESSED_ADDITIONAL),
+    ),
+    PreprocessTask(
+        name="ace_2023",
+        script=PREPROCESS_DIR / "preprocessing_ACE_2023.py",
+        inputs=(
+            ACE_DIR / "ACE Onboard Data (sent 7.7.23).xlsx",
+            ACE_DIR / "April 2023 Monthly Performance Report.csv",
+            *shapefile(ZCTA_SHAPEFILE),
+        ),
+        outputs=(ACE_PREPROCESSED,),
+    ),
+    PreprocessTask(
+        name="snapshot_2023",
+        script=PREPROCESS_DIR / "preprocessing_RegionalSnapshot_2023.py",
+        inputs=(
+            SNAPSHOT_DIR / "mtc snapshot survey_final data file_recoded Dumbarton mode_052725.xlsx",
+            *shapefile(PLACE_SHAPEFILE),
+            *shapefile(ZCTA_SHAPEFILE),
+        ),
+        outputs=(SNAPSHOT_DIR / "mtc_snapshot_preprocessed.csv",),
+    ),
+    PreprocessTask(
+        name="ac_transit_2025",
+        script=PREPROCESS_DIR / "preprocess_AC_Transit_2025.py",
+        inputs=(AC_TRANSIT_DIR / "od_20260318_ac-transit_weighted-secondary-weekend 1.xlsx",),
+        outputs=(AC_TRANSIT_DIR / "AC_Transit_2025_preprocessed.csv",),
+    ),
+    PreprocessTask(
+        name="snapshot_combine",
+        script=REPO_DIR / "snapshot-survey" / "Combine_Snapshot_ACE_Golden_Gate_Recode_Dumbarton.R",
+        inputs=(
+            GG_PREPROCESSED,
+            ACE_PREPROCESSED,
+            ACE_DIR / "ACE Onboard Data (sent 7.7.23).xlsx",
+            SNAPSHOT_BOX_WORKBOOK,
+        ),
+    ),
+]
+
+
+def build_graph(tasks: list[PreprocessTask]) -> dict[str, set[str]]:
+    """Return task name -> names of the tasks it depends on.
+
+    Raises:
+        ValueError: If task names are duplicated, two tasks write the same file
+            or an ``after`` entry names an unknown task
+    """
+    names = [task.name for task in tasks]
+    if len(set(names)) != len(names):
+        msg = f"Duplicate task names: {names}"
+        raise ValueError(msg)
+
+    writer: dict[Path, str] = {}
+    for task in tasks:
+        for output in task.outputs:
+            if output in writer:
+                msg = f"{output} is written by both {writer[output]} and {task.name}"
+                raise ValueError(msg)
+            writer[output] = task.name
+
+    graph = {}
+    for task in tasks:
+        unknown = set(task.after) - set(names)
+        if unknown:
+            msg = f"Task {task.name} runs after unknown tasks: {sorted(unknown)}"
+            raise ValueError(msg)
+        graph[task.name] = {writer[path] for path in task.inputs if path in writer} | set(task.after)
+    return graph
+
+
+def select_tasks(graph: dict[str, set[str]], requested: list[str]) -> set[str]:
+    """Return the requested tasks plus everything they (transitively) depend on."""
+    unknown = set(requested) - set(graph)
+    if unknown:
+        msg = f"Unknown tasks: {sorted(unknown)}; available: {sorted(graph)}"
+        raise ValueError(msg)
+
+    selected: set[str] = set()
+    pending = list(requested)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(graph[name])
+    return selected
+
+
+def shared_sources(tasks: list[PreprocessTask]) -> list[Path]:
+    """Helper modules, recode specs and dictionaries the preprocessing scripts share."""
+    scripts = {task.script for task in tasks} | {Path(__file__).resolve()}
+    helpers = [path for path in PREPROCESS_DIR.glob("*.py") if path not in scripts]
+    specs = [*PREPROCESS_DIR.glob("recode*.csv"), STANDARD_VARIABLE_DICT, CANONICAL_ROUTE_CROSSWALK]
+    return sorted(helpers + specs)
+
+
+def task_key(task: PreprocessTask, shared: list[Path], hashes: FileHashMemo) -> str | None:
+    """Return the content key of a task, or None if an input is missing."""
+    sources = [task.script, *task.inputs, *shared]
+    if not all(path.exists() for path in sources):
+        return None
+    return content_key({str(path): hashes.digest(path) for path in sources})
+
+
+def is_up_to_date(task: PreprocessTask, key: str | None) -> bool:
+    """Check whether a task's outputs exist and were built with the same key."""
+    record = TASK_CACHE_DIR / f"{task.name}.json"
+    if key is None or not task.outputs or not record.exists():
+        return False
+    if not all(path.exists() for path in task.outputs):
+        return False
+    return json.loads(record.read_text(encoding="utf-8")).get("key") == key
+
+
+def record_success(task: PreprocessTask, key: str | None) -> None:
+    if key is None:
+        return
+    TASK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(TASK_CACHE_DIR / f"{task.name}.json", json.dumps({"key": key}, indent=2))
+
+
+def run_task(task: PreprocessTask) -> float:
+    """Run one task in the current (worker) process and return its wall time in seconds."""
+    start = time.perf_counter()
+    if task.script.suffix.lower() == ".r":
+        subprocess.run(["Rscript", str(task.script)], cwd=task.script.parent, check=True)
+    else:
+        # run as if invoked as `python script.py` from its own directory
+        os.chdir(task.script.parent)
+        sys.path.insert(0, str(task.script.parent))
+        runpy.run_path(str(task.script), run_name="__main__")
+    return time.perf_counter() - start
+
+
+def run_graph(
+    tasks: list[PreprocessTask],
+    requested: list[str] | None = None,
+    max_workers: int | None = None,
+    force: bool = False,
+) -> dict[str, tuple[str, float]]:
+    """Run tasks in dependency order, independent tasks in parallel.
+
+    Args:
+        tasks: Task declarations
+        requested: Task names to run (with their dependencies); all tasks if None
+        max_workers: Size of the process pool (defaults to the number of CPUs)
+        force: Run tasks even if they are up to date
+
+    Returns:
+        Task name -> (status, wall time in seconds); status is "ok", "failed",
+        "skipped" (a dependency failed) or "current" (up to date, not run)
+    """
+    graph = build_graph(tasks)
+    selected = select_tasks(graph, requested) if requested else set(graph)
+    by_name = {task.name: task for task in tasks}
+    produced = {output for task in tasks if task.name in selected for output in task.outputs}
+
+    for name in sorted(selected):
+        missing = [path for path in by_name[name].inputs if path not in produced and not path.exists()]
+        if missing:
+            logger.warning("Task %s: inputs not found: %s", name, ", ".join(map(str, missing)))
+
+    sorter = TopologicalSorter({name: graph[name] for name in selected})
+    sorter.prepare()
+    shared = shared_sources(tasks)
+    hashes = FileHashMemo(STAGE_CACHE_DIR / "file_hashes.json")
+    keys: dict[str, str | None] = {}
+
+    results: dict[str, tuple[str, float]] = {}
+    failed: set[str] = set()
+    # one fresh process per task: the scripts configure logging and globals at import
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as pool:
+        running = {}
+        while sorter.is_active():
+            for name in sorter.get_ready():
+                if graph[name] & failed:
+                    logger.warning("Skipping %s: dependency failed", name)
+                    results[name] = ("skipped", 0.0)
+                    failed.add(name)
+                    sorter.done(name)
+                    continue
+                # keyed after the dependencies ran, so changed upstream outputs count
+                keys[name] = task_key(by_name[name], shared, hashes)
+                if not force and is_up_to_date(by_name[name], keys[name]):
+                    logger.info("Skipping %s: up to date", name)
+                    results[name] = ("current", 0.0)
+                    sorter.done(name)
+                    continue
+                logger.info("Starting %s", name)
+                running[pool.submit(run_task, by_name[name])] = (name, time.perf_counter())
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, start = running.pop(future)
+                try:
+                    elapsed = future.result()
+                    results[name] = ("ok", elapsed)
+                    record_success(by_name[name], keys[name])
+                    logger.info("Finished %s in %.1f s", name, elapsed)
+                except Exception:
+                    results[name] = ("failed", time.perf_counter() - start)
+                    failed.add(name)
+                    logger.exception("Task %s failed", name)
+                sorter.done(name)
+    return results
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", nargs="+", help="Tasks to run (with their dependencies); default all")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+    parser.add_argument("--list", action="store_true", help="List tasks and dependencies, then exit")
+    parser.add_argument("--force", action="store_true", help="Rerun tasks even if they are up to date")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%m/%d/%Y %I:%M:%S %p",
+    )
+
+    if args.list:
+        for name, dependencies in build_graph(TASKS).items():
+            logger.info("%-20s after: %s", name, ", ".join(sorted(dependencies)) or "-")
+        return
+
+    start = time.perf_counter()
+    results = run_graph(TASKS, args.tasks, args.workers, args.force)
+    total = time.perf_counter() - start
+
+    logger.info("\n=== Task wall times ===")
+    for name, (status, elapsed) in sorted(results.items(), key=lambda item: -item[1][1]):
+        logger.info("%-20s %-8s %8.1f s", name, status, elapsed)
+    logger.info(
+        "Total %.1f s (sum of tasks %.1f s)", total, sum(elapsed for _, elapsed in results.values())
+    )
+
+    if any(status not in ("ok", "current") for status, _ in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
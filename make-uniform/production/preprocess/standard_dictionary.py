@@ -0,0 +1,417 @@
+"""Checks of preprocessed survey files against util/standard_variable_dict.csv.
+
+The standard variable dictionary lists, for each generic variable, its data
+type (integer, float, string) and, for categoric variables, the valid survey
+responses and the standard values they map to. StandardDictionary compiles it
+into one violation expression per column (numeric casts, ``is_in`` sets, ID
+null/uniqueness rules) and evaluates all of them in a single Polars query, so a
+preprocessed file can be checked in seconds right after it is written instead
+of failing later in Build_Standard_Database.R.
+
+Only columns of the file that are generic variables are checked; survey
+specific columns pass through untouched.
+
+The same category sets give the compact in-memory types of a survey frame:
+categoric variables (and canonical_operator, survey_tech and the geo_level
+columns, whose sets come from the canonical route crosswalk) become pl.Enum
+columns and binary dummies become Int8, so each coded answer is stored as a
+small integer instead of a string. The pandas preprocessors apply it to the
+Polars copy they write to the survey store. The types survive a Parquet round
+trip; CSV output is unchanged.
+
+Typical use:
+    dictionary = StandardDictionary.from_csv()
+    violations = dictionary.validate(pl.scan_csv(output_file, infer_schema=False))
+    dictionary.raise_for_violations(violations)
+    survey_df = dictionary.apply_category_schema(survey_df)
+
+From the command line:
+    python standard_dictionary.py BART_2024_preprocessed.csv [--strict]
+"""
+
+import argparse
+import logging
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+STANDARD_VARIABLE_DICT = Path(__file__).resolve().parents[3] / "util" / "standard_variable_dict.csv"
+CANONICAL_ROUTE_CROSSWALK = Path(__file__).resolve().parents[1] / "canonical_route_crosswalk.csv"
+
+# Specification level of the orig/dest/home locations
+GEO_LEVELS = ("point", "city", "zip")
+GEO_LEVEL_COLUMNS = ("orig_geo_level", "dest_geo_level", "home_geo_level")
+
+# Requirement marking a column that must be present, non-null and unique
+IDENTICAL = "identical"
+
+VIOLATION_SCHEMA = {
+    "column": pl.Utf8,
+    "check": pl.Utf8,
+    "value": pl.Utf8,
+    "n_rows": pl.UInt32,
+    "first_row": pl.UInt32,
+}
+
+
+@dataclass(frozen=True)
+class StandardVariable:
+    """One generic variable of the standard dictionary.
+
+    Args:
+        name: Generic variable name
+        variable_type: categoric, binary, numerical or non-categorical
+        data_type: integer, float or string
+        valid_values: Survey responses accepted for a categoric variable
+        standard_values: Standard values of a categoric variable (sorted as listed)
+        requirement: Other requirement, e.g. "identical" for the ID
+    """
+
+    name: str
+    variable_type: str
+    data_type: str
+    valid_values: tuple[str, ...] = ()
+    standard_values: tuple[str, ...] = ()
+    requirement: str | None = None
+
+    @property
+    def is_categoric(self) -> bool:
+        return self.variable_type == "categoric"
+
+    def categories(self, allow_survey_values: bool = True) -> tuple[str, ...]:
+        """Return the accepted values of a categoric variable, standard values first."""
+        values = self.standard_values + (self.valid_values if allow_survey_values else ())
+        return tuple(dict.fromkeys(values))
+
+
+def read_standard_dictionary(
+    path: str | Path = STANDARD_VARIABLE_DICT,
+) -> dict[str, StandardVariable]:
+    """Read the standard variable dictionary into one StandardVariable per generic variable."""
+    dictionary_df = pl.read_csv(path, infer_schema_length=0).select(
+        "generic_variable",
+        "variable_type",
+        "data_type",
+        "valid_values_for_categoric_variables",
+        "standard_values_for_categoric_variables",
+        "other_requirements",
+    )
+
+    variables = {}
+    for row in (
+        dictionary_df.group_by("generic_variable", maintain_order=True)
+        .agg(
+            pl.col("variable_type").first(),
+            pl.col("data_type").first(),
+            pl.col("valid_values_for_categoric_variables").drop_nulls().unique(maintain_order=True),
+            pl.col("standard_values_for_categoric_variables")
+            .drop_nulls()
+            .unique(maintain_order=True),
+            pl.col("other_requirements").drop_nulls().first(),
+        )
+        .iter_rows(named=True)
+    ):
+        variables[row["generic_variable"]] = StandardVariable(
+            name=row["generic_variable"],
+            variable_type=row["variable_type"],
+            data_type=row["data_type"],
+            valid_values=tuple(row["valid_values_for_categoric_variables"]),
+            standard_values=tuple(row["standard_values_for_categoric_variables"]),
+            requirement=row["other_requirements"],
+        )
+    return variables
+
+
+def read_fixed_categories(
+    crosswalk: str | Path = CANONICAL_ROUTE_CROSSWALK,
+) -> dict[str, tuple[str, ...]]:
+    """Return the category sets of the non-dictionary coded columns.
+
+    canonical_operator and survey_tech take the operators and technologies of the
+    canonical route crosswalk; the geo_level columns take GEO_LEVELS.
+    """
+    crosswalk_df = pl.read_csv(
+        crosswalk,
+        columns=["canonical_operator", "technology"],
+        infer_schema_length=0,
+        encoding="utf8-lossy",
+    )
+    categories = {
+        "canonical_operator": tuple(
+            crosswalk_df["canonical_operator"].drop_nulls().unique().sort().to_list()
+        ),
+        "survey_tech": tuple(
+            crosswalk_df["technology"].drop_nulls().unique(maintain_order=True).to_list()
+        ),
+    }
+    categories.update(dict.fromkeys(GEO_LEVEL_COLUMNS, GEO_LEVELS))
+    return categories
+
+
+def _not_number(col: str) -> pl.Expr:
+    return pl.col(col).is_not_null() & pl.col(col).cast(pl.Float64, strict=False).is_null()
+
+
+def violation_expr(variable: StandardVariable, allow_survey_values: bool = True) -> pl.Expr | None:
+    """Return an expression giving the failed check of each row (null if valid).
+
+    Args:
+        variable: Generic variable to check
+        allow_survey_values: Accept the dictionary's valid survey responses of a
+            categoric variable as well as its standard values
+
+    Returns:
+        String expression, or None if the variable has no checks
+    """
+    col = variable.name
+    checks: list[tuple[pl.Expr, str]] = []
+
+    if variable.requirement == IDENTICAL:
+        checks += [(pl.col(col).is_null(), "null"), (pl.col(col).is_duplicated(), "duplicate")]
+
+    if variable.is_categoric:
+        allowed = variable.categories(allow_survey_values)
+        checks.append(
+            (
+                pl.col(col).is_not_null() & ~pl.col(col).cast(pl.Utf8).is_in(sorted(allowed)),
+                "invalid_category",
+            )
+        )
+    elif variable.variable_type == "binary":
+        value = pl.col(col).cast(pl.Float64, strict=False)
+        checks.append(
+            (pl.col(col).is_not_null() & ~value.is_in([0.0, 1.0]).fill_null(False), "not_binary")
+        )
+    elif variable.data_type == "integer":
+        value = pl.col(col).cast(pl.Float64, strict=False)
+        checks += [
+            (_not_number(col), "not_numeric"),
+            (value.is_not_null() & (value != value.round()), "not_integer"),
+        ]
+    elif variable.data_type == "float":
+        checks.append((_not_number(col), "not_numeric"))
+
+    if not checks:
+        return None
+
+    expr = pl.when(checks[0][0]).then(pl.lit(checks[0][1]))
+    for condition, name in checks[1:]:
+        expr = expr.when(condition).then(pl.lit(name))
+    return expr.otherwise(pl.lit(None, dtype=pl.Utf8))
+
+
+def _cast_expr(col: str, dtype: pl.DataType) -> pl.Expr:
+    # Enum casts go through strings so numeric codes (e.g. 1.0) can't match "1"
+    if isinstance(dtype, pl.Enum):
+        return pl.col(col).cast(pl.Utf8).cast(dtype, strict=False)
+    return pl.col(col).cast(dtype, strict=False)
+
+
+class StandardDictionary:
+    """Compiled checks of the standard variable dictionary.
+
+    Args:
+        variables: Generic variable name -> StandardVariable
+        allow_survey_values: Accept valid survey responses for categoric variables
+            (files before standardization) as well as standard values
+    """
+
+    def __init__(
+        self,
+        variables: dict[str, StandardVariable],
+        allow_survey_values: bool = True,
+        fixed_categories: dict[str, tuple[str, ...]] | None = None,
+    ) -> None:
+        self.variables = variables
+        self.allow_survey_values = allow_survey_values
+        self.fixed_categories = fixed_categories or {}
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str | Path = STANDARD_VARIABLE_DICT,
+        allow_survey_values: bool = True,
+        crosswalk: str | Path | None = CANONICAL_ROUTE_CROSSWALK,
+    ) -> "StandardDictionary":
+        """Read the dictionary, and the crosswalk category sets unless crosswalk is None."""
+        fixed_categories = read_fixed_categories(crosswalk) if crosswalk is not None else None
+        return cls(read_standard_dictionary(path), allow_survey_values, fixed_categories)
+
+    def category_schema(self) -> dict[str, pl.DataType]:
+        """Return the compact dtype of every coded column.
+
+        Returns:
+            Column name -> pl.Enum for categoric variables and fixed category
+            columns, pl.Int8 for binary variables
+        """
+        schema: dict[str, pl.DataType] = {}
+        for name, variable in self.variables.items():
+            if variable.is_categoric:
+                schema[name] = pl.Enum(variable.categories(self.allow_survey_values))
+            elif variable.variable_type == "binary":
+                schema[name] = pl.Int8
+        for name, categories in self.fixed_categories.items():
+            schema[name] = pl.Enum(categories)
+        return schema
+
+    def _fitting_columns(self, survey: pl.DataFrame) -> dict[str, pl.DataType]:
+        """Return the coded columns of a survey whose values all fit their compact dtype."""
+        schema = {
+            col: dtype
+            for col, dtype in self.category_schema().items()
+            if col in survey.columns and survey.schema[col] != dtype
+        }
+        if not schema:
+            return {}
+
+        # a value fits if it casts and reads back unchanged (no new nulls, no truncation)
+        fits = survey.select(
+            (
+                pl.col(col).is_null()
+                | (_cast_expr(col, dtype).cast(pl.Utf8) == pl.col(col).cast(pl.Utf8)).fill_null(
+                    False
+                )
+            )
+            .all()
+            .alias(col)
+            for col, dtype in schema.items()
+        ).row(0, named=True)
+
+        unfit = sorted(col for col, ok in fits.items() if not ok)
+        if unfit:
+            logger.info("Keeping columns with values outside their category set as is: %s", unfit)
+        return {col: dtype for col, dtype in schema.items() if fits[col]}
+
+    def apply_category_schema(self, survey: pl.DataFrame) -> pl.DataFrame:
+        """Cast the coded columns of a survey to Enum/Int8 where all values fit.
+
+        Columns with a value outside their category set (see validate) keep their
+        dtype, so no value is lost.
+
+        Args:
+            survey: Survey frame with generic variable columns
+
+        Returns:
+            The survey with compact coded columns, in the same column order
+        """
+        schema = self._fitting_columns(survey)
+        if not schema:
+            return survey
+        return survey.with_columns(_cast_expr(col, dtype) for col, dtype in schema.items())
+
+    def validate(
+        self,
+        survey: pl.DataFrame | pl.LazyFrame,
+        required: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Check every generic variable column of a survey in one query.
+
+        Args:
+            survey: Preprocessed survey (read CSVs with infer_schema=False so
+                values are checked as written)
+            required: Generic variables that must be present (the ID is always required
+                if it is marked "identical")
+
+        Returns:
+            Violations table with columns column, check, value, n_rows, first_row:
+            one row per column, failed check and offending value (null for
+            missing columns)
+        """
+        lf = survey.lazy()
+        columns = lf.collect_schema().names()
+
+        required_set = set(required or []) | {
+            name for name, variable in self.variables.items() if variable.requirement == IDENTICAL
+        }
+        missing = sorted(name for name in required_set if name not in columns)
+        missing_df = pl.DataFrame(
+            {
+                "column": missing,
+                "check": ["missing_column"] * len(missing),
+                "value": [None] * len(missing),
+                "n_rows": [0] * len(missing),
+                "first_row": [None] * len(missing),
+            },
+            schema=VIOLATION_SCHEMA,
+        )
+
+        checks = {
+            col: expr
+            for col in columns
+            if col in self.variables
+            and (expr := violation_expr(self.variables[col], self.allow_survey_values)) is not None
+        }
+        if not checks:
+            return missing_df
+
+        violations = (
+            lf.with_row_index("row")
+            .select(
+                "row",
+                *[
+                    pl.struct(expr.alias("check"), pl.col(col).cast(pl.Utf8).alias("value")).alias(
+                        col
+                    )
+                    for col, expr in checks.items()
+                ],
+            )
+            .unpivot(index="row", on=list(checks), variable_name="column", value_name="result")
+            .unnest("result")
+            .filter(pl.col("check").is_not_null())
+            .group_by("column", "check", "value")
+            .agg(pl.len().alias("n_rows"), pl.col("row").min().alias("first_row"))
+            .sort("column", "check", "first_row")
+            .collect()
+        )
+        return pl.concat([missing_df, violations.cast(VIOLATION_SCHEMA)])
+
+    def raise_for_violations(self, violations: pl.DataFrame, source: str = "survey") -> None:
+        """Raise ValueError summarizing a non-empty violations table."""
+        if violations.is_empty():
+            return
+        summary = (
+            violations.group_by("column", "check", maintain_order=True)
+            .agg(pl.col("n_rows").sum(), pl.col("value").drop_nulls().head(5))
+            .iter_rows()
+        )
+        lines = [
+            f"  {col}: {check} ({n:,} rows, e.g. {values})" for col, check, n, values in summary
+        ]
+        msg = f"{source} violates the standard variable dictionary:\n" + "\n".join(lines)
+        raise ValueError(msg)
+
+
+def main() -> None:
+    """Validate preprocessed CSV files from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Check preprocessed CSVs against the standard variable dictionary"
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="Preprocessed CSV files")
+    parser.add_argument("--dictionary", type=Path, default=STANDARD_VARIABLE_DICT)
+    parser.add_argument(
+        "--strict", action="store_true", help="Only accept standard values for categoric variables"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    dictionary = StandardDictionary.from_csv(args.dictionary, allow_survey_values=not args.strict)
+
+    failed = False
+    for path in args.files:
+        violations = dictionary.validate(pl.scan_csv(path, infer_schema=False))
+        if violations.is_empty():
+            logger.info("%s: no violations", path)
+            continue
+        failed = True
+        with pl.Config(tbl_rows=-1, fmt_str_lengths=60):
+            logger.warning("%s: %d violations\n%s", path, violations.height, violations)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Batched station-name matching against an operator's stop table.
+
+Normalizes the stop table once, resolves exact (case-insensitive) matches with a
+hash lookup, and scores all remaining survey names against all stops in a single
+rapidfuzz ``cdist`` pass instead of a per-name ``iterrows`` loop.
+
+Matching rules are the same as the original ``geocode_stops_from_names`` loop:
+aliases are applied first, an exact uppercase match wins (first stop in table
+order), otherwise the stop with the highest ``fuzz.ratio`` is taken (first stop
+in table order on ties) if it reaches the threshold.
+"""
+
+import logging
+from collections.abc import Sequence
+
+import geopandas as gpd
+import numpy as np
+import polars as pl
+from rapidfuzz import fuzz, process
+
+logger = logging.getLogger(__name__)
+
+# Number of survey names scored per cdist call; bounds the score matrix size
+# when matching thousands of names against a statewide stop table
+DEFAULT_CHUNK_SIZE = 512
+
+MATCH_SCHEMA = {
+    "survey_name": pl.Utf8,
+    "canonical_name": pl.Utf8,
+    "lat": pl.Float64,
+    "lon": pl.Float64,
+    "score": pl.Float64,
+}
+
+
+class StationMatcher:
+    """Match survey station names to a fixed table of stops.
+
+    Args:
+        stop_names: Canonical stop names, in table order
+        stop_lats: WGS84 latitudes aligned with stop_names
+        stop_lons: WGS84 longitudes aligned with stop_names
+        station_aliases: Optional dict of survey name -> name to match instead
+        chunk_size: Number of survey names scored per cdist call
+    """
+
+    def __init__(
+        self,
+        stop_names: Sequence[str],
+        stop_lats: Sequence[float],
+        stop_lons: Sequence[float],
+        station_aliases: dict[str, str] | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        if not (len(stop_names) == len(stop_lats) == len(stop_lons)):
+            msg = "stop_names, stop_lats and stop_lons must have the same length"
+            raise ValueError(msg)
+        if len(stop_names) == 0:
+            msg = "StationMatcher requires at least one stop"
+            raise ValueError(msg)
+
+        self.stop_names = [str(name) if name is not None else "" for name in stop_names]
+        self.stop_lats = np.asarray(stop_lats, dtype=np.float64)
+        self.stop_lons = np.asarray(stop_lons, dtype=np.float64)
+        self.station_aliases = station_aliases or {}
+        self.chunk_size = chunk_size
+
+        # Normalize once: uppercase choices for scoring, first index per exact name
+        self._stop_names_upper = [name.upper() for name in self.stop_names]
+        self._exact_index: dict[str, int] = {}
+        for idx, name_upper in enumerate(self._stop_names_upper):
+            self._exact_index.setdefault(name_upper, idx)
+
+    @classmethod
+    def from_geodataframe(
+        cls,
+        stops_gdf: gpd.GeoDataFrame,
+        operator_names: list[str],
+        stop_name_field: str,
+        agency_field: str,
+        station_aliases: dict[str, str] | None = None,
+    ) -> "StationMatcher":
+        """Build a matcher from the stops of one or more operators.
+
+        Args:
+            stops_gdf: GeoDataFrame with stop locations (must have geometry)
+            operator_names: List of operator names to filter stops by
+                (e.g., ["BART", "Bay Area Rapid Transit"])
+            stop_name_field: Column name in stops_gdf containing stop names
+            agency_field: Column name in stops_gdf containing agency/operator names
+            station_aliases: Optional dict of station name aliases for matching
+
+        Returns:
+            StationMatcher over the operator's stops in WGS84
+
+        Raises:
+            ValueError: If no stops found for operator, or stop_name_field is missing
+        """
+        search_pattern = "|".join(operator_names)
+        mask = stops_gdf[agency_field].str.contains(
+            search_pattern, case=False, na=False, regex=True
+        )
+        operator_stops = stops_gdf[mask]
+
+        if len(operator_stops) == 0:
+            msg = f"No stops found for operator(s): {operator_names}"
+            raise ValueError(msg)
+
+        logger.info(
+            "Found %s stops for operator(s): %s", len(operator_stops), ", ".join(operator_names)
+        )
+
+        if stop_name_field not in operator_stops.columns:
+            msg = f"stop_name_field '{stop_name_field}' not found in stops GeoDataFrame"
+            raise ValueError(msg)
+
+        operator_stops = operator_stops.to_crs(epsg=4326)
+        return cls(
+            stop_names=operator_stops[stop_name_field].tolist(),
+            stop_lats=operator_stops.geometry.y.to_numpy(),
+            stop_lons=operator_stops.geometry.x.to_numpy(),
+            station_aliases=station_aliases,
+        )
+
+    @classmethod
+    def from_gazetteer(
+        cls,
+        operator_stops: pl.DataFrame,
+        station_aliases: dict[str, str] | None = None,
+    ) -> "StationMatcher":
+        """Build a matcher from an operator slice of the stop gazetteer.
+
+        Args:
+            operator_stops: Output of stop_gazetteer.load_operator_stops
+                (columns stop_name, lat, lon in WGS84)
+            station_aliases: Optional dict of station name aliases for matching
+
+        Returns:
+            StationMatcher over the given stops
+        """
+        return cls(
+            stop_names=operator_stops["stop_name"].to_list(),
+            stop_lats=operator_stops["lat"].to_numpy(),
+            stop_lons=operator_stops["lon"].to_numpy(),
+            station_aliases=station_aliases,
+        )
+
+    def _query_name(self, survey_name: str) -> str:
+        """Apply aliases and return the uppercase string to match."""
+        survey_name_clean = str(survey_name).strip()
+        if survey_name_clean in self.station_aliases:
+            alias = self.station_aliases[survey_name_clean]
+            logger.debug("Using alias: %s -> %s", survey_name_clean, alias)
+            return alias.upper()
+        return str(survey_name).upper()
+
+    def match(self, survey_names: Sequence[str]) -> pl.DataFrame:
+        """Score survey names against all stops and return the best match for each.
+
+        Args:
+            survey_names: Survey station names (typically the unique values of a column)
+
+        Returns:
+            DataFrame with one row per input name and columns survey_name,
+            canonical_name, lat, lon, score. Exact matches score 100.
+        """
+        survey_names = [name for name in survey_names if name is not None]
+        n_names = len(survey_names)
+        best_idx = np.full(n_names, -1, dtype=np.int64)
+        best_score = np.zeros(n_names, dtype=np.float64)
+
+        queries = [self._query_name(name) for name in survey_names]
+
+        # Exact (case-insensitive) matches via hash lookup
+        fuzzy_rows = []
+        for row, query in enumerate(queries):
+            idx = self._exact_index.get(query)
+            if idx is not None:
+                best_idx[row] = idx
+                best_score[row] = 100.0
+            else:
+                fuzzy_rows.append(row)
+
+        # Fuzzy matches: one score matrix per chunk of names, argmax per row
+        # (argmax returns the first maximum, matching the strict ">" of the old loop)
+        for start in range(0, len(fuzzy_rows), self.chunk_size):
+            rows = fuzzy_rows[start : start + self.chunk_size]
+            scores = process.cdist(
+                [queries[row] for row in rows],
+                self._stop_names_upper,
+                scorer=fuzz.ratio,
+                dtype=np.float64,
+                workers=-1,
+            )
+            chunk_idx = scores.argmax(axis=1)
+            chunk_score = scores[np.arange(len(rows)), chunk_idx]
+            has_match = chunk_score > 0
+            best_idx[rows] = np.where(has_match, chunk_idx, -1)
+            best_score[rows] = chunk_score
+
+        matched = best_idx >= 0
+        safe_idx = np.where(matched, best_idx, 0)
+        return pl.DataFrame(
+            {
+                "survey_name": [str(name) for name in survey_names],
+                "canonical_name": [
+                    self.stop_names[idx] if ok else None
+                    for idx, ok in zip(safe_idx, matched, strict=True)
+                ],
+                "lat": np.where(matched, self.stop_lats[safe_idx], np.nan),
+                "lon": np.where(matched, self.stop_lons[safe_idx], np.nan),
+                "score": best_score,
+            },
+            schema=MATCH_SCHEMA,
+        ).with_columns(pl.col("lat", "lon").fill_nan(None))
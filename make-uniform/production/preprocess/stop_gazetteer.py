@@ -0,0 +1,225 @@
+"""Persistent stop gazetteer built from the CDOT statewide transit stops GeoJSON.
+
+The first run converts the GeoJSON into a compact Arrow IPC file with one row
+per stop (agency, stop name, WGS84 lat/lon), sorted by
+agency. A JSON sidecar stores the source fingerprint and the row range of each
+agency, so later runs memory-map the file and read only the requested
+operator's rows instead of parsing the full GeoJSON over the network share.
+
+The cache is rebuilt when the source GeoJSON changes (size/mtime, then hash).
+"""
+
+import logging
+import re
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import polars as pl
+
+from cache_utils import (
+    CACHE_DIR,
+    atomic_replace,
+    file_fingerprint,
+    read_sidecar,
+    source_unchanged,
+    temp_path_for,
+    write_sidecar,
+)
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_VERSION = 2
+
+GAZETTEER_SCHEMA = {
+    "source_order": pl.UInt32,
+    "agency": pl.Utf8,
+    "stop_name": pl.Utf8,
+    "lat": pl.Float64,
+    "lon": pl.Float64,
+}
+
+
+def gazetteer_path(source_path: str | Path, cache_dir: str | Path = CACHE_DIR) -> Path:
+    """Return the cache file path for a given stops GeoJSON."""
+    return Path(cache_dir) / f"{Path(source_path).stem}.gazetteer.arrow"
+
+
+def build_gazetteer(
+    source_path: str | Path,
+    cache_path: str | Path,
+    stop_name_field: str = "stop_name",
+    agency_field: str = "agency",
+) -> None:
+    """Convert the stops GeoJSON to a sorted Arrow IPC gazetteer with agency index.
+
+    Args:
+        source_path: Path to the stops GeoJSON
+        cache_path: Path of the Arrow IPC file to write
+        stop_name_field: Column in the GeoJSON containing stop names
+        agency_field: Column in the GeoJSON containing agency/operator names
+    """
+    logger.info("Building stop gazetteer from %s", source_path)
+    fingerprint = file_fingerprint(source_path)
+
+    stops_gdf = gpd.read_file(source_path, columns=[agency_field, stop_name_field])
+    for field in (agency_field, stop_name_field):
+        if field not in stops_gdf.columns:
+            msg = f"Field '{field}' not found in {source_path}"
+            raise ValueError(msg)
+    stops_gdf = stops_gdf.to_crs(epsg=4326)
+
+    attributes = pd.DataFrame(
+        {
+            "agency": stops_gdf[agency_field].astype("string"),
+            "stop_name": stops_gdf[stop_name_field].astype("string"),
+            "lat": stops_gdf.geometry.y,
+            "lon": stops_gdf.geometry.x,
+        }
+    )
+    gazetteer_df = (
+        pl.from_pandas(attributes)
+        .with_row_index("source_order")
+        .select(list(GAZETTEER_SCHEMA))
+        .cast(GAZETTEER_SCHEMA)
+        .sort(["agency", "source_order"], nulls_last=True)
+    )
+
+    # Row range per agency; rows are contiguous after the sort
+    agency_index = (
+        gazetteer_df.with_row_index("_row")
+        .drop_nulls("agency")
+        .group_by("agency", maintain_order=True)
+        .agg(pl.col("_row").min().alias("offset"), pl.len().alias("length"))
+    )
+
+    cache_path = Path(cache_path)
+    tmp_path = temp_path_for(cache_path)
+    try:
+        # Uncompressed so the file can be memory-mapped
+        gazetteer_df.write_ipc(tmp_path, compression="uncompressed")
+        atomic_replace(tmp_path, cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    write_sidecar(
+        cache_path,
+        {
+            "version": GAZETTEER_VERSION,
+            "source": fingerprint,
+            "stop_name_field": stop_name_field,
+            "agency_field": agency_field,
+            "agencies": {
+                row["agency"]: [row["offset"], row["length"]]
+                for row in agency_index.iter_rows(named=True)
+            },
+        },
+    )
+    logger.info(
+        "Wrote gazetteer with %s stops for %s agencies to %s",
+        f"{gazetteer_df.height:,}",
+        agency_index.height,
+        cache_path,
+    )
+
+
+def _valid_metadata(
+    cache_path: Path, source_path: str | Path, stop_name_field: str, agency_field: str
+) -> dict | None:
+    """Return the sidecar metadata if the cache is current for this source, else None."""
+    metadata = read_sidecar(cache_path)
+    if metadata is None:
+        return None
+    if (
+        metadata.get("version") != GAZETTEER_VERSION
+        or metadata.get("stop_name_field") != stop_name_field
+        or metadata.get("agency_field") != agency_field
+    ):
+        return None
+    if not Path(source_path).exists():
+        logger.warning("Source %s not accessible, using cached gazetteer", source_path)
+        return metadata
+    if not source_unchanged(source_path, metadata["source"]):
+        logger.info("Source %s changed since gazetteer was built", source_path)
+        return None
+    return metadata
+
+
+def ensure_gazetteer(
+    source_path: str | Path,
+    stop_name_field: str = "stop_name",
+    agency_field: str = "agency",
+    cache_dir: str | Path = CACHE_DIR,
+) -> Path:
+    """Return the gazetteer cache of a stops GeoJSON, building it if it is not current.
+
+    When the source is not accessible, an existing cache is used as is. The
+    cache's sidecar records the source fingerprint, so it also serves as the
+    fingerprint of the stops for callers that key on their inputs (e.g. the
+    stage cache), without reading the source over the network.
+
+    Returns:
+        Path of the Arrow IPC gazetteer
+    """
+    cache_path = gazetteer_path(source_path, cache_dir)
+    if _valid_metadata(cache_path, source_path, stop_name_field, agency_field) is None:
+        build_gazetteer(source_path, cache_path, stop_name_field, agency_field)
+    else:
+        logger.info("Using cached stop gazetteer %s", cache_path)
+    return cache_path
+
+
+def load_operator_stops(
+    source_path: str | Path,
+    operator_names: list[str],
+    stop_name_field: str = "stop_name",
+    agency_field: str = "agency",
+    cache_dir: str | Path = CACHE_DIR,
+) -> pl.DataFrame:
+    """Load one operator's stops from the gazetteer, building the cache if needed.
+
+    Agencies are selected with the same case-insensitive regex match on the
+    agency name as the GeoJSON filter in geocode_stops_from_names.
+
+    Args:
+        source_path: Path to the stops GeoJSON
+        operator_names: List of operator names to filter stops by
+            (e.g., ["BART", "Bay Area Rapid Transit"])
+        stop_name_field: Column in the GeoJSON containing stop names
+        agency_field: Column in the GeoJSON containing agency/operator names
+        cache_dir: Directory holding the gazetteer cache
+
+    Returns:
+        DataFrame with columns agency, stop_name, lat, lon,
+        in the order the stops appear in the GeoJSON
+
+    Raises:
+        ValueError: If no stops found for operator
+    """
+    cache_path = ensure_gazetteer(source_path, stop_name_field, agency_field, cache_dir)
+    metadata = read_sidecar(cache_path)
+
+    search_pattern = re.compile("|".join(operator_names), flags=re.IGNORECASE)
+    ranges = sorted(
+        (offset, length)
+        for agency, (offset, length) in metadata["agencies"].items()
+        if search_pattern.search(agency)
+    )
+    if not ranges:
+        msg = f"No stops found for operator(s): {operator_names}"
+        raise ValueError(msg)
+
+    # Scan the (memory-mapped) file and materialize only the operator's row
+    # ranges, restoring the GeoJSON order so match tie-breaking is unchanged
+    gazetteer_lf = pl.scan_ipc(cache_path)
+    operator_stops = (
+        pl.concat([gazetteer_lf.slice(offset, length) for offset, length in ranges])
+        .sort("source_order")
+        .drop("source_order")
+        .collect()
+    )
+
+    logger.info(
+        "Found %s stops for operator(s): %s", operator_stops.height, ", ".join(operator_names)
+    )
+    return operator_stops
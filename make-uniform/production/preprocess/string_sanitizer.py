@@ -0,0 +1,95 @@
+"""Single-pass sanitation of string columns and column names.
+
+Survey exports carry characters that break the downstream CSV/R steps: quotes
+and pound signs in free-text answers, embedded line breaks and NUL bytes in
+comments, and column names like "Route [Inbound]". Each rule set here is
+compiled into one str.replace_many expression (an Aho-Corasick scan), so every
+string column is rewritten in a single pass over its Arrow buffer. Nulls stay
+null and non-string columns are not touched.
+
+Typical use:
+    survey_df = sanitize_frame(survey_df, QUOTE_AND_POUND)
+    survey_df = survey_df.with_columns(sanitize_expr(pl.col("COMMENT"), LINE_BREAKS))
+"""
+
+from collections.abc import Mapping
+from typing import TypeVar
+
+import polars as pl
+
+FrameT = TypeVar("FrameT", pl.DataFrame, pl.LazyFrame)
+
+# Characters removed from answers so values survive quoting in the R pipeline
+QUOTE_AND_POUND = {"'": "", "#": ""}
+
+# NUL bytes dropped and line breaks escaped so each record stays on one CSV line
+# (earlier patterns take precedence, so "\r\n" is one break, not two)
+LINE_BREAKS = {"\x00": "", "\r\n": r"\n", "\r": r"\n", "\n": r"\n"}
+
+# Column names like "Route [Inbound]" become "Route_Inbound"
+COLUMN_NAME_REPLACEMENTS = {" [": "_", "]": ""}
+
+
+def sanitize_expr(expr: pl.Expr, replacements: Mapping[str, str]) -> pl.Expr:
+    """Apply all replacements to a string expression in one pass.
+
+    Args:
+        expr: String expression (other dtypes are cast to string)
+        replacements: Substring -> replacement; earlier substrings win where
+            two start at the same position
+
+    Returns:
+        Expression with every occurrence replaced
+    """
+    return expr.cast(pl.Utf8).str.replace_many(
+        list(replacements), list(replacements.values()), leftmost=True
+    )
+
+
+def clean_column_name(name: str, replacements: Mapping[str, str] = COLUMN_NAME_REPLACEMENTS) -> str:
+    """Apply the column name replacements to one name."""
+    for old, new in replacements.items():
+        name = name.replace(old, new)
+    return name
+
+
+def sanitize_frame(
+    df: FrameT,
+    replacements: Mapping[str, str],
+    columns: list[str] | None = None,
+    column_name_replacements: Mapping[str, str] | None = COLUMN_NAME_REPLACEMENTS,
+) -> FrameT:
+    """Sanitize the string columns of a frame and clean its column names together.
+
+    Args:
+        df: DataFrame or LazyFrame
+        replacements: Substring -> replacement for the string values
+        columns: Columns to sanitize (all string columns if None)
+        column_name_replacements: Substring -> replacement for the column names,
+            or None to keep the names
+
+    Returns:
+        Frame of the same kind with sanitized values and names
+
+    Raises:
+        ValueError: If cleaning makes two column names equal
+    """
+    schema = df.collect_schema()
+    if columns is None:
+        columns = [col for col, dtype in schema.items() if dtype == pl.Utf8]
+
+    renames = {}
+    if column_name_replacements is not None:
+        renames = {
+            col: clean_column_name(col, column_name_replacements)
+            for col in schema.names()
+            if clean_column_name(col, column_name_replacements) != col
+        }
+        new_names = [renames.get(col, col) for col in schema.names()]
+        if len(set(new_names)) != len(new_names):
+            duplicates = sorted({name for name in new_names if new_names.count(name) > 1})
+            msg = f"Cleaned column names collide: {duplicates}"
+            raise ValueError(msg)
+
+    df = df.with_columns(sanitize_expr(pl.col(col), replacements) for col in columns)
+    return df.rename(renames)
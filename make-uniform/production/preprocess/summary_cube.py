@@ -0,0 +1,221 @@
+"""Pre-aggregated weighted cube of survey records for operator/income/race summaries.
+
+The cube is built with one group_by over the records: for every combination of
+the dimension values that occurs (e.g. operator x household_income x race x
+auto_suff) it keeps the record count and, per weight column, the sum and the
+sum of squares of the weights. Any roll-up or slice over a subset of the
+dimensions is then a filter and group_by over the cube cells, which number in
+the thousands, instead of another pass over the records. The sums of squares
+give the effective sample size (sum w)^2 / sum w^2 of every answer.
+
+String dimensions are stored as Enum columns, so the cube is small in memory
+and on disk; it is saved as Parquet with a JSON sidecar naming its dimensions
+and weights.
+
+Typical use:
+    cube = SummaryCube.from_frame(
+        survey_df, ["canonical_operator", "household_income", "race", "auto_suff"],
+        weight_cols=["weight", "trip_weight"],
+    )
+    income_by_operator = cube.query(["canonical_operator", "household_income"])
+    zero_car = cube.query(["canonical_operator", "race"], auto_suff="zero autos")
+"""
+
+import argparse
+import logging
+from collections.abc import Sequence
+from pathlib import Path
+
+import polars as pl
+
+from cache_utils import atomic_replace, read_sidecar, temp_path_for, write_sidecar
+
+logger = logging.getLogger(__name__)
+
+COUNT_COLUMN = "n"
+SQUARED_SUFFIX = "_sq"
+EFFECTIVE_N_SUFFIX = "_effective_n"
+
+
+class SummaryCube:
+    """Weighted counts over every occurring combination of dimension values.
+
+    Args:
+        cells: One row per combination: the dimension columns, COUNT_COLUMN, and
+            per weight column w the columns w and w + SQUARED_SUFFIX
+        dimensions: Dimension columns of cells
+        weight_cols: Weight columns summed in cells
+    """
+
+    def __init__(
+        self, cells: pl.DataFrame, dimensions: Sequence[str], weight_cols: Sequence[str]
+    ) -> None:
+        self.dimensions = list(dimensions)
+        self.weight_cols = list(weight_cols)
+        expected = [*self.dimensions, COUNT_COLUMN, *self._sum_columns()]
+        missing = [col for col in expected if col not in cells.columns]
+        if missing:
+            msg = f"Cube cells are missing columns: {missing}"
+            raise ValueError(msg)
+        self.cells = cells.select(expected)
+
+    def _sum_columns(self) -> list[str]:
+        return [col for w in self.weight_cols for col in (w, w + SQUARED_SUFFIX)]
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pl.DataFrame | pl.LazyFrame,
+        dimensions: Sequence[str],
+        weight_cols: Sequence[str] = ("weight",),
+    ) -> "SummaryCube":
+        """Aggregate survey records into a cube.
+
+        Args:
+            df: Survey records
+            dimensions: Categorical columns to keep; null is kept as its own value
+            weight_cols: Weight columns to sum (null weights count as 0)
+
+        Returns:
+            SummaryCube with one cell per occurring combination of dimension values
+        """
+        dimensions = list(dimensions)
+        weight_cols = list(weight_cols)
+        lf = df.lazy().select(dimensions + weight_cols)
+        schema = lf.collect_schema()
+
+        # string dimensions become Enums over their sorted values
+        string_dims = [col for col in dimensions if schema[col] == pl.Utf8]
+        if string_dims:
+            values = lf.select(
+                pl.col(col).drop_nulls().unique().sort().implode() for col in string_dims
+            ).collect()
+            lf = lf.with_columns(
+                pl.col(col).cast(pl.Enum(values[col][0].to_list())) for col in string_dims
+            )
+
+        weights = [pl.col(w).cast(pl.Float64).fill_null(0.0) for w in weight_cols]
+        cells = (
+            lf.group_by(dimensions)
+            .agg(
+                pl.len().cast(pl.UInt32).alias(COUNT_COLUMN),
+                *(w.sum() for w in weights),
+                *((w * w).sum().alias(w.meta.output_name() + SQUARED_SUFFIX) for w in weights),
+            )
+            .sort(dimensions, nulls_last=True)
+            .collect()
+        )
+        logger.info(
+            "Built a %d-cell cube over %s from %d records",
+            cells.height,
+            dimensions,
+            cells[COUNT_COLUMN].sum(),
+        )
+        return cls(cells, dimensions, weight_cols)
+
+    def query(
+        self,
+        by: Sequence[str] = (),
+        **filters: object,
+    ) -> pl.DataFrame:
+        """Roll the cube up to the given dimensions, after slicing it.
+
+        Args:
+            by: Dimensions to keep; all others are summed over (none gives the total)
+            **filters: Dimension -> value or list of values to keep; None keeps null
+
+        Returns:
+            One row per combination of the by values, with COUNT_COLUMN, the
+            weight sums and squared sums, and w + EFFECTIVE_N_SUFFIX per weight
+
+        Raises:
+            ValueError: If by or filters name a column that is not a dimension
+        """
+        by = list(by)
+        unknown = [col for col in [*by, *filters] if col not in self.dimensions]
+        if unknown:
+            msg = f"Unknown dimensions {unknown}. Expected some of {self.dimensions}"
+            raise ValueError(msg)
+
+        cells = self.cells.lazy()
+        for col, value in filters.items():
+            values = list(value) if isinstance(value, list | tuple | set) else [value]
+            keep = pl.col(col).is_in([v for v in values if v is not None])
+            if None in values:
+                keep = keep | pl.col(col).is_null()
+            cells = cells.filter(keep)
+
+        sums = [COUNT_COLUMN, *self._sum_columns()]
+        if by:
+            summary = cells.group_by(by).agg(pl.col(sums).sum()).sort(by, nulls_last=True)
+        else:
+            summary = cells.select(pl.col(sums).sum())
+        return summary.with_columns(
+            (pl.col(w) ** 2 / pl.col(w + SQUARED_SUFFIX)).alias(w + EFFECTIVE_N_SUFFIX)
+            for w in self.weight_cols
+        ).collect()
+
+    def crosstab(
+        self, index: str, columns: str, value: str | None = None, **filters: object
+    ) -> pl.DataFrame:
+        """Return a wide table of one value, e.g. operator rows x income columns.
+
+        Args:
+            index: Dimension for the rows
+            columns: Dimension for the columns
+            value: Weight column or COUNT_COLUMN (default: the first weight column)
+            **filters: Dimension -> value or list of values to keep (see query)
+        """
+        value = value or self.weight_cols[0]
+        return self.query([index, columns], **filters).pivot(
+            on=columns, index=index, values=value, sort_columns=True
+        )
+
+    def save(self, path: str | Path) -> None:
+        """Write the cube cells to Parquet with a sidecar naming dimensions and weights."""
+        path = Path(path)
+        tmp = temp_path_for(path)
+        try:
+            self.cells.write_parquet(tmp)
+            atomic_replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        write_sidecar(path, {"dimensions": self.dimensions, "weight_cols": self.weight_cols})
+        logger.info("Wrote %d cube cells to %s", self.cells.height, path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "SummaryCube":
+        """Read a cube written by save.
+
+        Raises:
+            FileNotFoundError: If the cube or its sidecar is missing
+        """
+        metadata = read_sidecar(path)
+        if metadata is None:
+            msg = f"No summary cube (Parquet file and sidecar) at {path}"
+            raise FileNotFoundError(msg)
+        return cls(pl.read_parquet(path), metadata["dimensions"], metadata["weight_cols"])
+
+
+def main() -> None:
+    """Build a summary cube from a survey file."""
+    parser = argparse.ArgumentParser(description="Pre-aggregate a weighted summary cube")
+    parser.add_argument("survey", type=Path, help="Survey CSV or Parquet")
+    parser.add_argument("--dimensions", nargs="+", required=True, help="e.g. canonical_operator")
+    parser.add_argument("--weight-cols", nargs="+", default=["weight"])
+    parser.add_argument("--output", type=Path, required=True, help="Cube Parquet file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    columns = args.dimensions + args.weight_cols
+    if args.survey.suffix == ".parquet":
+        survey_lf = pl.scan_parquet(args.survey)
+    else:
+        survey_lf = pl.scan_csv(args.survey, infer_schema_length=None)
+    SummaryCube.from_frame(survey_lf.select(columns), args.dimensions, args.weight_cols).save(
+        args.output
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Hive-partitioned Parquet store of the preprocessed surveys.
+
+Each preprocessor writes its survey next to its CSV output into one shared
+dataset laid out as::
+
+    standard_database/
+        canonical_operator=BART/survey_year=2024/BART_2024.parquet
+        canonical_operator=GOLDEN GATE TRANSIT/survey_year=2023/GoldenGate_2023.parquet
+        canonical_operator=GOLDEN GATE TRANSIT/survey_year=2023/Snapshot_2023.parquet
+        manifest.json
+
+A survey covering several operators (e.g. the Regional Snapshot) is split into
+one file per operator and year. Writing a survey replaces only its own files, so
+two surveys of the same operator and year live side by side. Each file has a
+JSON sidecar (rows, columns, content hash); manifest.json collects them so a
+reader can pick files for the requested operators, years and columns without
+listing the tree or opening the other files.
+
+The layout is a plain Hive dataset, so R scripts can open it directly with
+arrow::open_dataset(store_dir, unify_schemas = TRUE); surveys have different
+columns, which scan_surveys reconciles for Python readers.
+
+Typical use:
+    write_survey(survey_df, "BART_2024", year=2024)
+    write_survey(from_pandas(GG_df[KEEP_COLUMNS]), "GoldenGate_2023", year=2023)
+    lf = scan_surveys(operators=["BART", "CALTRAIN"], columns=["ID", "weight"])
+"""
+
+import json
+import logging
+import re
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+import pandas as pd
+import polars as pl
+
+from cache_utils import (
+    atomic_replace,
+    atomic_write_text,
+    file_lock,
+    file_sha256,
+    read_sidecar,
+    sidecar_path,
+    temp_path_for,
+    write_sidecar,
+)
+from standard_dictionary import StandardDictionary
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = Path(__file__).parent.parent / "output" / "standard_database"
+MANIFEST_FILE = "manifest.json"
+
+# Partition keys, in directory order, and their dtypes when read back
+OPERATOR_KEY = "canonical_operator"
+YEAR_KEY = "survey_year"
+PARTITION_SCHEMA = {OPERATOR_KEY: pl.Utf8, YEAR_KEY: pl.Int32}
+
+# Directory name of a null partition value
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _partition_dir(store_dir: Path, operator: str | None, year: int | None) -> Path:
+    # percent-encode path separators and other unsafe characters, as Hive does
+    operator_value = HIVE_NULL if operator is None else quote(operator, safe=" ")
+    year_value = HIVE_NULL if year is None else year
+    return store_dir / f"{OPERATOR_KEY}={operator_value}" / f"{YEAR_KEY}={year_value}"
+
+
+def _file_stem(survey: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", survey).strip("_")
+
+
+def from_pandas(survey_df: pd.DataFrame) -> pl.DataFrame:
+    """Convert a pandas survey to Polars for write_survey.
+
+    Raw answer columns of the pandas preprocessors (e.g. Q4, Dir) are object
+    columns that can mix numbers and text, which Arrow refuses to convert; every
+    object column is read as strings instead, as it would be from the CSV.
+    """
+    object_cols = survey_df.select_dtypes(include="object").columns
+    return pl.from_pandas(survey_df.astype({col: "string" for col in object_cols}))
+
+
+def write_survey(
+    survey_df: pl.DataFrame | pl.LazyFrame,
+    survey: str,
+    store_dir: str | Path = STORE_DIR,
+    operator: str | None = None,
+    year: int | None = None,
+    source: str | Path | None = None,
+) -> list[Path]:
+    """Write a preprocessed survey into the store, replacing its earlier files.
+
+    A LazyFrame (e.g. a scan of the preprocessor's Parquet output) is streamed
+    into each partition file with sink_parquet instead of being collected.
+
+    Args:
+        survey_df: Preprocessed survey
+        survey: Survey name, e.g. "BART_2024" (one file per survey and partition)
+        store_dir: Root directory of the store
+        operator: Operator of every row; taken from canonical_operator if None
+        year: Survey year of every row; taken from survey_year if None (rows with
+            a null operator or year go to the Hive default partition)
+        source: Output file the survey was also written to (recorded in the manifest)
+
+    Returns:
+        Paths of the written Parquet files
+
+    Raises:
+        ValueError: If the operator or year is neither given nor a column
+    """
+    store_dir = Path(store_dir)
+    keys = {OPERATOR_KEY: operator, YEAR_KEY: year}
+    columns = survey_df.collect_schema().names()
+    for key, value in keys.items():
+        if value is None and key not in columns:
+            msg = f"Survey {survey} has no {key} column; pass it explicitly"
+            raise ValueError(msg)
+    survey_lf = (
+        survey_df.lazy()
+        .with_columns(pl.lit(value).alias(key) for key, value in keys.items() if value is not None)
+        .with_columns(pl.col(key).cast(dtype) for key, dtype in PARTITION_SCHEMA.items())
+    )
+    partitions = (
+        survey_lf.group_by(list(PARTITION_SCHEMA), maintain_order=True)
+        .agg(pl.len().alias("rows"))
+        .collect()
+    )
+    # partition values live in the path, not in the file
+    file_columns = [
+        col for col in survey_lf.collect_schema().names() if col not in PARTITION_SCHEMA
+    ]
+
+    file_name = f"{_file_stem(survey)}.parquet"
+    written = []
+    for part_operator, part_year, rows in partitions.iter_rows():
+        path = _partition_dir(store_dir, part_operator, part_year) / file_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        part_lf = survey_lf.filter(
+            pl.col(OPERATOR_KEY).eq_missing(part_operator),
+            pl.col(YEAR_KEY).eq_missing(part_year),
+        ).select(file_columns)
+        tmp = temp_path_for(path)
+        try:
+            part_lf.sink_parquet(tmp)
+            atomic_replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        write_sidecar(
+            path,
+            {
+                "survey": survey,
+                OPERATOR_KEY: part_operator,
+                YEAR_KEY: part_year,
+                "path": path.relative_to(store_dir).as_posix(),
+                "rows": rows,
+                "columns": file_columns,
+                "sha256": file_sha256(path),
+                "source": str(source) if source is not None else None,
+                "written": datetime.now().isoformat(timespec="seconds"),
+            },
+        )
+        written.append(path)
+        logger.info("Wrote %s rows of %s to %s", f"{rows:,}", survey, path)
+
+    # drop this survey's files in partitions it no longer covers
+    for stale in store_dir.glob(f"{OPERATOR_KEY}=*/{YEAR_KEY}=*/{file_name}"):
+        if stale not in written:
+            stale.unlink()
+            sidecar_path(stale).unlink(missing_ok=True)
+
+    rebuild_manifest(store_dir)
+    return written
+
+
+def rebuild_manifest(store_dir: str | Path = STORE_DIR) -> list[dict[str, Any]]:
+    """Collect the sidecars of every file in the store into manifest.json.
+
+    Each writer rebuilds the manifest after writing its own sidecars. Rebuilds
+    hold a lock on the manifest from listing the sidecars to replacing the file,
+    so when preprocessors run in parallel a writer can't replace the manifest
+    with a listing taken before another writer's sidecars existed; the last
+    rebuild sees every survey.
+
+    Returns:
+        Manifest entries, sorted by operator, year and survey
+
+    Raises:
+        TimeoutError: If another writer holds the manifest lock for too long
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    with file_lock(store_dir / MANIFEST_FILE):
+        entries = [
+            metadata
+            for path in store_dir.glob(f"{OPERATOR_KEY}=*/{YEAR_KEY}=*/*.parquet")
+            if (metadata := read_sidecar(path)) is not None
+        ]
+        entries.sort(
+            key=lambda entry: (entry[OPERATOR_KEY] or "", entry[YEAR_KEY] or 0, entry["survey"])
+        )
+        atomic_write_text(store_dir / MANIFEST_FILE, json.dumps(entries, indent=2))
+    return entries
+
+
+def read_manifest(store_dir: str | Path = STORE_DIR) -> pl.DataFrame:
+    """Return the store's manifest, one row per file.
+
+    Raises:
+        FileNotFoundError: If the store has no manifest
+    """
+    manifest_path = Path(store_dir) / MANIFEST_FILE
+    if not manifest_path.exists():
+        msg = f"No survey store manifest found: {manifest_path}"
+        raise FileNotFoundError(msg)
+    entries = json.loads(manifest_path.read_text(encoding="utf-8"))
+    return pl.DataFrame(
+        entries,
+        schema={
+            "survey": pl.Utf8,
+            **PARTITION_SCHEMA,
+            "path": pl.Utf8,
+            "rows": pl.Int64,
+            "columns": pl.List(pl.Utf8),
+            "sha256": pl.Utf8,
+            "source": pl.Utf8,
+            "written": pl.Utf8,
+        },
+    )
+
+
+def scan_surveys(
+    store_dir: str | Path = STORE_DIR,
+    operators: Iterable[str] | None = None,
+    years: Iterable[int] | None = None,
+    surveys: Iterable[str] | None = None,
+    columns: list[str] | None = None,
+    compact_categories: bool = True,
+) -> pl.LazyFrame:
+    """Lazily read the requested slice of the store.
+
+    Only the files of the requested operators, years and surveys are opened,
+    and only the requested columns are read from them. Columns a survey lacks
+    are filled with nulls. A coded column that every file stores with its
+    compact dtype (standard_dictionary category_schema) keeps that Enum/Int8
+    dtype in the combined frame; otherwise it comes back as the common
+    (relaxed) dtype, so no value is lost.
+
+    Args:
+        store_dir: Root directory of the store
+        operators: canonical_operator values to read (all if None)
+        years: Survey years to read (all if None)
+        surveys: Survey names to read (all if None)
+        columns: Columns to read (all if None); the partition keys and the survey
+            name are always returned, so listing them here is allowed but not needed
+        compact_categories: Keep the Enum/Int8 dtypes of the coded columns
+
+    Returns:
+        LazyFrame with the partition keys, the survey name and the requested columns
+
+    Raises:
+        ValueError: If no file matches, or a requested column is in none of the files
+    """
+    store_dir = Path(store_dir)
+    manifest = read_manifest(store_dir)
+    for key, values in ((OPERATOR_KEY, operators), (YEAR_KEY, years), ("survey", surveys)):
+        if values is not None:
+            manifest = manifest.filter(pl.col(key).is_in(list(values)))
+    if manifest.is_empty():
+        msg = (
+            f"No surveys in {store_dir} match operators={operators}, years={years}, "
+            f"surveys={surveys}"
+        )
+        raise ValueError(msg)
+
+    keys = [*PARTITION_SCHEMA, "survey"]
+    if columns is not None:
+        # partition keys and the survey name come from the manifest, not the files
+        columns = [col for col in columns if col not in keys]
+        available = set(manifest["columns"].explode().drop_nulls().to_list())
+        unknown = [col for col in columns if col not in available]
+        if unknown:
+            msg = f"Columns not found in the selected surveys: {unknown}"
+            raise ValueError(msg)
+
+    frames = []
+    file_schemas = []
+    for entry in manifest.iter_rows(named=True):
+        file_columns = (
+            entry["columns"]
+            if columns is None
+            else [col for col in columns if col in entry["columns"]]
+        )
+        lf = pl.scan_parquet(store_dir / entry["path"]).select(file_columns)
+        file_schemas.append(lf.collect_schema())  # Parquet footer only
+        frames.append(
+            lf.with_columns(
+                pl.lit(entry["survey"], dtype=pl.Utf8).alias("survey"),
+                *[
+                    pl.lit(entry[key], dtype=dtype).alias(key)
+                    for key, dtype in PARTITION_SCHEMA.items()
+                ],
+            )
+        )
+
+    combined = pl.concat(frames, how="diagonal_relaxed").select(*keys, pl.all().exclude(keys))
+    if not compact_categories:
+        return combined
+
+    # diagonal_relaxed turns an Enum into String as soon as one file lacks it or
+    # stores it differently; cast back the columns every file stores compactly
+    compact = {
+        col: dtype
+        for col, dtype in StandardDictionary.from_csv().category_schema().items()
+        if col not in keys
+        and any(col in schema for schema in file_schemas)
+        and all(schema[col] == dtype for schema in file_schemas if col in schema)
+    }
+    return combined.with_columns(pl.col(col).cast(dtype) for col, dtype in compact.items())
+
+
+def load_surveys(
+    store_dir: str | Path = STORE_DIR,
+    operators: Iterable[str] | None = None,
+    years: Iterable[int] | None = None,
+    surveys: Iterable[str] | None = None,
+    columns: list[str] | None = None,
+    compact_categories: bool = True,
+) -> pl.DataFrame:
+    """Read the requested slice of the store (see scan_surveys)."""
+    return scan_surveys(store_dir, operators, years, surveys, columns, compact_categories).collect()
@@ -5,9 +5,11 @@ Strip PII variables from Transit Passenger Survey data.
 
 from pathlib import Path
 import polars as pl
-import geopandas as gpd
 import os
 
+from spatial_join import spatial_join_coordinate_pairs
+from zone_index import ZoneGridIndex
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -80,6 +82,10 @@ TRACT_PATH = r"M:/Data/Requests/Louisa Leung/tl_2025_06_tract.zip"
 # VTATAZ_PATH = r"M:/Data/Requests/Louisa Leung/Caltrain Survey Data/VTATAZ_CCAG/VTATAZ.shp"
 # BG_PATH = r"M:/Data/Requests/Louisa Leung/tl_2025_06_bg.zip"
 
+# Grid indexes of the zone layers are built on first use and reused by later
+# requests until the shapefile changes
+ZONE_INDEX_DIR = Path(__file__).parent / "zone_index_cache"
+
 # ----------------------------------------------------------------------------
 # Output settings
 # ----------------------------------------------------------------------------
@@ -103,106 +109,6 @@ if not Path("M:/").exists():
     raise FileNotFoundError("Could not access M: drive. Please check network connection.")
 
 
-# NOTE: Will become a reusable function in a shared utils module
-def spatial_join_coordinates_to_shapefile(
-    df: pl.DataFrame,
-    lat_col: str,
-    lon_col: str,
-    shapefile_gdf: gpd.GeoDataFrame,
-    shapefile_id_col: str,
-    output_id_col: str | None = None,
-    id_col: str = "id",
-    source_crs: str = "EPSG:4326"
-) -> pl.DataFrame:
-    """Perform spatial join between dataframe with lat/lon coordinates and a shapefile.
-
-    Parameters:
-    -----------
-    df : pl.DataFrame
-        Input dataframe with coordinate columns
-    lat_col : str
-        Name of the latitude column in the input dataframe
-    lon_col : str
-        Name of the longitude column in the input dataframe
-    shapefile_gdf : gpd.GeoDataFrame
-        GeoDataFrame of the shapefile
-    shapefile_id_col : str
-        Name of the ID column in the shapefile (e.g., 'TAZ')
-    output_id_col : str | None
-        Name of the output column for the joined ID (e.g., 'Origin_TAZ'), defaults to id_col if None
-    id_col : str
-        Name of the ID column in the input dataframe (default: 'id')
-    source_crs : str
-        Source coordinate reference system (default: 'EPSG:4326' for WGS84)
-
-    Returns:
-    --------
-    pl.DataFrame
-        DataFrame with id_col and output_id_col columns
-    """
-    # Make sure ID column is not case sensitive
-    actual_id_col = next(
-        (c for c in df.columns if c.lower() == id_col.lower()),
-        None
-    )
-
-    if actual_id_col is None:
-        raise ValueError(f"Could not find ID column matching '{id_col}'")
-
-    id_col = actual_id_col
-
-    # Read shapefile and get target CRS
-    shapefile_gdf = shapefile_gdf[[shapefile_id_col, "geometry"]]
-    target_crs = shapefile_gdf.crs
-
-    if output_id_col is None:
-        output_id_col = id_col
-
-    # Convert coordinate columns to numeric and filter out nulls
-    subset = df.select([
-        id_col,
-        pl.col(lat_col).cast(pl.Float64, strict=False).alias(lat_col),
-        pl.col(lon_col).cast(pl.Float64, strict=False).alias(lon_col)
-    ]).drop_nulls(subset=[lat_col, lon_col])
-
-    # Convert to GeoDataFrame
-    subset_pandas = subset.to_pandas()
-    points_gdf = gpd.GeoDataFrame(
-        subset_pandas,
-        geometry=gpd.points_from_xy(subset_pandas[lon_col], subset_pandas[lat_col]),
-        crs=source_crs
-    )
-
-    # Reproject to match shapefile CRS
-    if target_crs:
-        points_gdf = points_gdf.to_crs(target_crs)
-
-    # Perform spatial join
-    joined = gpd.sjoin(points_gdf, shapefile_gdf, how="left", predicate="within")
-
-    # Clean up result
-    result_pandas = joined.drop(columns="geometry")
-
-    # Handle the case where the shapefile ID column might have been renamed by sjoin
-    if shapefile_id_col in result_pandas.columns:
-        result_pandas = result_pandas.rename(columns={shapefile_id_col: output_id_col})
-    elif f"{shapefile_id_col}_right" in result_pandas.columns:
-        result_pandas = result_pandas.rename(columns={f"{shapefile_id_col}_right": output_id_col})
-
-    # Drop index_right if it exists
-    if "index_right" in result_pandas.columns:
-        result_pandas = result_pandas.drop(columns="index_right")
-
-    # Convert back to polars and select only ID columns
-    result = pl.from_pandas(result_pandas)
-    result_slim = result.select([id_col, output_id_col])
-    
-    # Join back to original dataframe to preserve all rows data type
-    final_result = df.join(result_slim, on=id_col, how="left")
-    
-    return final_result
-
-
 def parse_latlons_from_columns(
     df: pl.DataFrame,
     latlon_suffixes: tuple[str, str] = ("lat", "lon"),
@@ -267,12 +173,12 @@ def main() -> None:
         survey = survey.select(FINAL_COLUMNS)
     print(f"Survey data contains {survey.height} records and {survey.width} columns.")
     
-    # Load shapefiles into GeoDataFrames
-    print("Loading shapefiles...")
+    # Load (or build) grid indexes of the zone shapefiles
+    print("Loading zone indexes...")
     geo_cache = {
-        # "vtaTAZ": gpd.read_file(vtaTAZ_PATH).rename(columns={"TAZ": "vtaTAZ"}),
-        # "BG": gpd.read_file(BG_PATH).rename(columns={"GEOID": "BG"}),
-        "TRACT": gpd.read_file(TRACT_PATH).rename(columns={"GEOID": "TRACT"})
+        # "vtaTAZ": ZoneGridIndex.from_file(VTATAZ_PATH, "TAZ", ZONE_INDEX_DIR / "vtaTAZ"),
+        # "BG": ZoneGridIndex.from_file(BG_PATH, "GEOID", ZONE_INDEX_DIR / "BG"),
+        "TRACT": ZoneGridIndex.from_file(TRACT_PATH, "GEOID", ZONE_INDEX_DIR / "TRACT")
     }
     zones = list(geo_cache.keys())
 
@@ -284,19 +190,13 @@ def main() -> None:
     for config in taz_configs:
         print(" ", config)
     
-    # Process each location type and collect results
-    _survey = survey.clone()
-    for lat_col, lon_col, output_col, shp_id_col in taz_configs:
-        print(f"  Processing {output_col}...")
-        _survey = spatial_join_coordinates_to_shapefile(
-            df=_survey,
-            lat_col=lat_col,
-            lon_col=lon_col,
-            shapefile_gdf=geo_cache[shp_id_col],
-            shapefile_id_col=shp_id_col,
-            output_id_col=output_col,
-            id_col="ID"
-        )
+    # Join all lat/lon pairs to all zone layers in one batched pass
+    print(f"  Processing {', '.join(output_col for _, _, output_col, _ in taz_configs)}...")
+    _survey = spatial_join_coordinate_pairs(
+        df=survey,
+        join_configs=taz_configs,
+        zone_layers=geo_cache,
+    )
 
     # Collect all zone output column names to protect
     zone_output_cols = {output_col for _, _, output_col, _ in taz_configs}
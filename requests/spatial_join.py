@@ -0,0 +1,161 @@
+"""
+Batched spatial joins of survey coordinate pairs to zone layers.
+
+All lat/lon pairs of a survey are stacked into one point array, projected once
+per zone layer and queried against that layer's STRtree in a single call. The
+resulting zone columns are attached to the survey in one step instead of one
+join (and one copy of the wide survey) per coordinate pair.
+"""
+
+
+import geopandas as gpd
+import numpy as np
+import polars as pl
+
+from zone_index import ZoneGridIndex, first_containing_polygon
+
+
+def stack_coordinate_pairs(
+    df: pl.DataFrame,
+    lat_lon_pairs: list[tuple[str, str]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Stack every non-null lat/lon pair of a dataframe into flat arrays.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Input dataframe with coordinate columns
+    lat_lon_pairs : list[tuple[str, str]]
+        (latitude_column, longitude_column) pairs to stack
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        (lat, lon, row, pair) arrays; row is the dataframe row position and
+        pair the index into lat_lon_pairs of each point
+    """
+    coords = df.select(
+        [
+            expr
+            for i, (lat_col, lon_col) in enumerate(lat_lon_pairs)
+            for expr in (
+                pl.col(lat_col).cast(pl.Float64, strict=False).alias(f"lat_{i}"),
+                pl.col(lon_col).cast(pl.Float64, strict=False).alias(f"lon_{i}"),
+            )
+        ]
+    )
+
+    lats, lons, rows, pairs = [], [], [], []
+    for i in range(len(lat_lon_pairs)):
+        lat = coords[f"lat_{i}"].to_numpy(allow_copy=True).astype(np.float64, copy=False)
+        lon = coords[f"lon_{i}"].to_numpy(allow_copy=True).astype(np.float64, copy=False)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        lats.append(lat[valid])
+        lons.append(lon[valid])
+        rows.append(np.flatnonzero(valid))
+        pairs.append(np.full(valid.sum(), i, dtype=np.int64))
+
+    if not lat_lon_pairs:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(lats), np.concatenate(lons), np.concatenate(rows), np.concatenate(pairs)
+
+
+def points_in_polygons(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    zones_gdf: gpd.GeoDataFrame,
+    source_crs: str = "EPSG:4326",
+) -> np.ndarray:
+    """Return the position of the polygon containing each point, or -1.
+
+    Points are projected to the zone layer's CRS once and queried against the
+    layer's spatial index in one call. If a point falls in several (overlapping)
+    polygons, the first polygon in layer order is used.
+
+    Parameters:
+    -----------
+    lat, lon : np.ndarray
+        Point coordinates in source_crs
+    zones_gdf : gpd.GeoDataFrame
+        Zone polygons
+    source_crs : str
+        Source coordinate reference system (default: 'EPSG:4326' for WGS84)
+
+    Returns:
+    --------
+    np.ndarray
+        Positional index into zones_gdf for each point (-1 where no polygon contains it)
+    """
+    points = gpd.GeoSeries(gpd.points_from_xy(lon, lat), crs=source_crs)
+    if zones_gdf.crs:
+        points = points.to_crs(zones_gdf.crs)
+
+    return first_containing_polygon(points.values, zones_gdf)
+
+
+def spatial_join_coordinate_pairs(
+    df: pl.DataFrame,
+    join_configs: list[tuple[str, str, str, str]],
+    zone_layers: dict[str, gpd.GeoDataFrame | ZoneGridIndex],
+    zone_id_cols: dict[str, str] | None = None,
+    source_crs: str = "EPSG:4326",
+) -> pl.DataFrame:
+    """Join every lat/lon pair of a dataframe to one or more zone layers at once.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Input dataframe with coordinate columns
+    join_configs : list[tuple[str, str, str, str]]
+        (latitude_column, longitude_column, output_column, zone_name) tuples,
+        as returned by parse_latlons_from_columns in Remove_LatLong.py
+    zone_layers : dict[str, gpd.GeoDataFrame | ZoneGridIndex]
+        Zone polygons or prebuilt grid indexes by zone name
+        (e.g., {"TRACT": tract_gdf})
+    zone_id_cols : dict[str, str] | None
+        ID column of each zone GeoDataFrame; defaults to the zone name itself.
+        Not used for ZoneGridIndex layers, which carry their own ID column
+    source_crs : str
+        Source coordinate reference system (default: 'EPSG:4326' for WGS84)
+
+    Returns:
+    --------
+    pl.DataFrame
+        Input dataframe with one added column per join config
+    """
+    if zone_id_cols is None:
+        zone_id_cols = {}
+
+    # Stack each distinct coordinate pair once, shared across zone layers
+    lat_lon_pairs = list(
+        dict.fromkeys((lat_col, lon_col) for lat_col, lon_col, _, _ in join_configs)
+    )
+    pair_index = {pair: i for i, pair in enumerate(lat_lon_pairs)}
+    lat, lon, rows, pairs = stack_coordinate_pairs(df, lat_lon_pairs)
+
+    new_columns = {}
+    for zone_name in dict.fromkeys(zone for _, _, _, zone in join_configs):
+        zone_layer = zone_layers[zone_name]
+        if isinstance(zone_layer, ZoneGridIndex):
+            # Grid lookup, exact polygon test only for points in boundary cells
+            zone_ids = zone_layer.zone_ids
+            zone_pos = zone_layer.lookup_positions(lat, lon, source_crs)
+        else:
+            # One projection and one STRtree query per zone layer for all points
+            zone_id_col = zone_id_cols.get(zone_name, zone_name)
+            zone_ids = pl.from_pandas(zone_layer[zone_id_col].reset_index(drop=True))
+            zone_pos = points_in_polygons(lat, lon, zone_layer, source_crs)
+
+        for lat_col, lon_col, output_col, zone in join_configs:
+            if zone != zone_name:
+                continue
+            in_pair = (pairs == pair_index[(lat_col, lon_col)]) & (zone_pos >= 0)
+            # zone position per survey row; NaN (-> null) where unmatched
+            positions = np.full(df.height, np.nan)
+            positions[rows[in_pair]] = zone_pos[in_pair]
+            gather_idx = pl.Series(positions, nan_to_null=True).cast(pl.UInt32)
+            new_columns[output_col] = zone_ids.gather(gather_idx).alias(output_col)
+
+    # add columns in join_configs order
+    return df.with_columns([new_columns[output_col] for _, _, output_col, _ in join_configs])
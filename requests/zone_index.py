@@ -0,0 +1,344 @@
+"""
+Grid-indexed point-in-polygon zone assignment for repeat data requests.
+
+A ZoneGridIndex rasterizes a zone layer (TAZ, MAZ, tract, block group, ...)
+once onto a regular grid in the layer's own CRS. Each cell stores either the single
+zone that fully contains it, "no zone", or "boundary". Bulk lookups then
+resolve most points with integer arithmetic on NumPy arrays; only points in
+boundary cells fall back to an exact polygon test. The index is saved to disk
+and reloaded by later requests as long as the source layer is unchanged.
+"""
+
+
+import json
+import warnings
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import polars as pl
+import shapely
+from pyproj import CRS, Transformer
+
+# Grid cell values other than zone positions
+EMPTY_CELL = -1
+BOUNDARY_CELL = -2
+
+DEFAULT_CELL_SIZE = 250.0  # meters
+
+# Largest grid built (a few seconds and a few hundred MB of cell boxes);
+# layers that need more cells at the requested size get larger cells
+MAX_GRID_CELLS = 2_000_000
+
+# Approximate meters per degree, to size cells of layers in geographic CRS
+METERS_PER_DEGREE = 111_320.0
+
+INDEX_VERSION = 1
+
+
+def first_containing_polygon(
+    points: np.ndarray,
+    zones_gdf: gpd.GeoDataFrame,
+) -> np.ndarray:
+    """Return the position of the first polygon containing each point, or -1.
+
+    Parameters:
+    -----------
+    points : np.ndarray
+        Shapely points in the CRS of zones_gdf
+    zones_gdf : gpd.GeoDataFrame
+        Zone polygons
+
+    Returns:
+    --------
+    np.ndarray
+        Positional index into zones_gdf for each point; if a point falls in
+        several (overlapping) polygons, the first polygon in layer order is used
+    """
+    point_idx, zone_idx = zones_gdf.sindex.query(points, predicate="within")
+
+    # keep the first polygon (lowest position) for each point
+    order = np.lexsort((zone_idx, point_idx))
+    point_idx, zone_idx = point_idx[order], zone_idx[order]
+    first = np.ones(len(point_idx), dtype=bool)
+    first[1:] = point_idx[1:] != point_idx[:-1]
+
+    result = np.full(len(points), -1, dtype=np.int64)
+    result[point_idx[first]] = zone_idx[first]
+    return result
+
+
+class ZoneGridIndex:
+    """Rasterized lookup index over a zone layer.
+
+    Parameters:
+    -----------
+    zones_gdf : gpd.GeoDataFrame
+        Zone polygons; the grid is in their CRS
+    zone_id_col : str
+        Name of the zone ID column in zones_gdf
+    grid : np.ndarray
+        2-D int array (rows = y, cols = x) of zone positions, EMPTY_CELL or BOUNDARY_CELL
+    origin : tuple[float, float]
+        (x, y) of the lower-left corner of the grid
+    cell_size : float
+        Cell edge length in CRS units
+    source_info : dict | None
+        Fingerprint of the zone file the index was built from
+    """
+
+    def __init__(
+        self,
+        zones_gdf: gpd.GeoDataFrame,
+        zone_id_col: str,
+        grid: np.ndarray,
+        origin: tuple[float, float],
+        cell_size: float,
+        source_info: dict | None = None,
+    ) -> None:
+        self.zones_gdf = zones_gdf.reset_index(drop=True)
+        self.zone_id_col = zone_id_col
+        self.grid = grid
+        self.origin = origin
+        self.cell_size = cell_size
+        self.source_info = source_info or {}
+        self.zone_ids = pl.from_pandas(self.zones_gdf[zone_id_col])
+        self._transformers = {}
+
+    @property
+    def crs(self) -> CRS:
+        return self.zones_gdf.crs
+
+    @classmethod
+    def build(
+        cls,
+        zones_gdf: gpd.GeoDataFrame,
+        zone_id_col: str,
+        cell_size: float = DEFAULT_CELL_SIZE,
+        max_cells: int = MAX_GRID_CELLS,
+    ) -> "ZoneGridIndex":
+        """Rasterize a zone layer into a grid index.
+
+        Parameters:
+        -----------
+        zones_gdf : gpd.GeoDataFrame
+            Zone polygons
+        zone_id_col : str
+            Name of the zone ID column (e.g., 'TAZ', 'GEOID')
+        cell_size : float
+            Cell edge length in meters (default: 250); converted to degrees
+            for layers in a geographic CRS
+        max_cells : int
+            Largest number of grid cells; if the layer's bounds need more at
+            cell_size, the cells are enlarged (with a warning) to fit
+
+        Returns:
+        --------
+        ZoneGridIndex
+        """
+        # Keep the layer CRS so boundary tests give the same answer as a
+        # spatial join against the original layer
+        zones_gdf = zones_gdf[[zone_id_col, "geometry"]].reset_index(drop=True)
+        if zones_gdf.crs is not None and zones_gdf.crs.is_geographic:
+            cell_size = cell_size / METERS_PER_DEGREE
+
+        xmin, ymin, xmax, ymax = zones_gdf.total_bounds
+        n_cols = max(int(np.ceil((xmax - xmin) / cell_size)), 1)
+        n_rows = max(int(np.ceil((ymax - ymin) / cell_size)), 1)
+
+        # size the grid before building it: a statewide layer at the default
+        # cell size would otherwise mean tens of millions of cell boxes
+        if n_cols * n_rows > max_cells:
+            requested_cells = n_cols * n_rows
+            while n_cols * n_rows > max_cells:
+                cell_size *= max(np.sqrt(n_cols * n_rows / max_cells), 1.01)
+                n_cols = max(int(np.ceil((xmax - xmin) / cell_size)), 1)
+                n_rows = max(int(np.ceil((ymax - ymin) / cell_size)), 1)
+            warnings.warn(
+                f"Zone grid would have {requested_cells:,} cells; coarsened to "
+                f"{n_cols * n_rows:,} cells of {cell_size:.6g} CRS units "
+                f"(raise max_cells or pass a larger cell_size to change this)",
+                stacklevel=2,
+            )
+
+        # cell boxes in row-major order (row = y index, col = x index)
+        col_idx, row_idx = np.meshgrid(np.arange(n_cols), np.arange(n_rows))
+        cell_x0 = xmin + col_idx.ravel() * cell_size
+        cell_y0 = ymin + row_idx.ravel() * cell_size
+        cells = shapely.box(cell_x0, cell_y0, cell_x0 + cell_size, cell_y0 + cell_size)
+
+        cell_hit, zone_hit = zones_gdf.sindex.query(cells, predicate="intersects")
+        hits_per_cell = np.bincount(cell_hit, minlength=len(cells))
+
+        grid = np.full(len(cells), EMPTY_CELL, dtype=np.int32)
+        grid[hits_per_cell > 0] = BOUNDARY_CELL
+
+        # a cell belongs to a zone only if it intersects one polygon that
+        # properly contains it; everything else needs an exact test
+        single = hits_per_cell[cell_hit] == 1
+        cell_single, zone_single = cell_hit[single], zone_hit[single]
+        interior = shapely.contains_properly(
+            zones_gdf.geometry.values[zone_single], cells[cell_single]
+        )
+        grid[cell_single[interior]] = zone_single[interior]
+
+        return cls(
+            zones_gdf=zones_gdf,
+            zone_id_col=zone_id_col,
+            grid=grid.reshape(n_rows, n_cols),
+            origin=(float(xmin), float(ymin)),
+            cell_size=float(cell_size),
+        )
+
+    def lookup_positions(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        source_crs: str = "EPSG:4326",
+    ) -> np.ndarray:
+        """Return the position of the zone containing each point, or -1.
+
+        Parameters:
+        -----------
+        lat, lon : np.ndarray
+            Point coordinates in source_crs
+        source_crs : str
+            Source coordinate reference system (default: 'EPSG:4326' for WGS84)
+
+        Returns:
+        --------
+        np.ndarray
+            Positional index into the zone layer for each point
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if self.crs is None:
+            x, y = lon, lat
+        else:
+            if source_crs not in self._transformers:
+                self._transformers[source_crs] = Transformer.from_crs(
+                    source_crs, self.crs, always_xy=True
+                )
+            x, y = self._transformers[source_crs].transform(lon, lat)
+
+        n_rows, n_cols = self.grid.shape
+        col = np.floor((x - self.origin[0]) / self.cell_size)
+        row = np.floor((y - self.origin[1]) / self.cell_size)
+        in_grid = (
+            np.isfinite(col) & np.isfinite(row)
+            & (col >= 0) & (col < n_cols) & (row >= 0) & (row < n_rows)
+        )
+
+        result = np.full(len(x), EMPTY_CELL, dtype=np.int64)
+        result[in_grid] = self.grid[row[in_grid].astype(np.int64), col[in_grid].astype(np.int64)]
+
+        # exact polygon test for points in boundary cells
+        boundary = np.flatnonzero(result == BOUNDARY_CELL)
+        if len(boundary) > 0:
+            points = shapely.points(x[boundary], y[boundary])
+            result[boundary] = first_containing_polygon(points, self.zones_gdf)
+
+        return np.where(result >= 0, result, -1)
+
+    def lookup(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        source_crs: str = "EPSG:4326",
+    ) -> pl.Series:
+        """Return the zone ID containing each point (null where none).
+
+        Parameters:
+        -----------
+        lat, lon : np.ndarray
+            Point coordinates in source_crs
+        source_crs : str
+            Source coordinate reference system (default: 'EPSG:4326' for WGS84)
+
+        Returns:
+        --------
+        pl.Series
+            Zone IDs aligned with the input points
+        """
+        positions = self.lookup_positions(lat, lon, source_crs).astype(np.float64)
+        positions[positions < 0] = np.nan
+        gather_idx = pl.Series(positions, nan_to_null=True).cast(pl.UInt32)
+        return self.zone_ids.gather(gather_idx)
+
+    def save(self, index_dir: str | Path) -> None:
+        """Write the index (grid + zone polygons) to a directory."""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        np.save(index_dir / "grid.npy", self.grid)
+        self.zones_gdf.to_parquet(index_dir / "zones.parquet")
+        (index_dir / "index.json").write_text(
+            json.dumps(
+                {
+                    "version": INDEX_VERSION,
+                    "zone_id_col": self.zone_id_col,
+                    "origin": list(self.origin),
+                    "cell_size": self.cell_size,
+                    "source": self.source_info,
+                },
+                indent=2,
+            )
+        )
+
+    @classmethod
+    def load(cls, index_dir: str | Path) -> "ZoneGridIndex":
+        """Read an index written by save()."""
+        index_dir = Path(index_dir)
+        metadata = json.loads((index_dir / "index.json").read_text())
+        return cls(
+            zones_gdf=gpd.read_parquet(index_dir / "zones.parquet"),
+            zone_id_col=metadata["zone_id_col"],
+            grid=np.load(index_dir / "grid.npy"),
+            origin=tuple(metadata["origin"]),
+            cell_size=metadata["cell_size"],
+            source_info=metadata["source"],
+        )
+
+    @classmethod
+    def from_file(
+        cls,
+        zone_path: str | Path,
+        zone_id_col: str,
+        index_dir: str | Path,
+        cell_size: float = DEFAULT_CELL_SIZE,
+    ) -> "ZoneGridIndex":
+        """Load a saved index for a zone file, (re)building it if the file changed.
+
+        Parameters:
+        -----------
+        zone_path : str | Path
+            Zone layer readable by geopandas (shapefile, zipped shapefile, ...)
+        zone_id_col : str
+            Name of the zone ID column
+        index_dir : str | Path
+            Directory to store the index in
+        cell_size : float
+            Cell edge length in meters (default: 250)
+
+        Returns:
+        --------
+        ZoneGridIndex
+        """
+        stat = Path(zone_path).stat()
+        source_info = {
+            "path": str(zone_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "zone_id_col": zone_id_col,
+            "cell_size": cell_size,
+        }
+
+        index_dir = Path(index_dir)
+        if (index_dir / "index.json").exists():
+            metadata = json.loads((index_dir / "index.json").read_text())
+            if metadata.get("version") == INDEX_VERSION and metadata.get("source") == source_info:
+                return cls.load(index_dir)
+
+        index = cls.build(gpd.read_file(zone_path), zone_id_col, cell_size)
+        index.source_info = source_info
+        index.save(index_dir)
+        return index